@@ -2,7 +2,24 @@
 
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from django.db.models import Q
+from .models import CustomUser, normalize_identifier
 
-# Django の既定の UserAdmin をそのまま使って登録
-admin.site.register(CustomUser, UserAdmin)
+
+# Django の既定の UserAdmin に、件数が多い場合の検索だけを置き換えて登録
+class CustomUserAdmin(UserAdmin):
+    # 既定の search_fields（icontains）は全件走査になるため、正規化した列（索引あり）の前方一致で検索する
+    # 進捗の管理画面のオートコンプリート（ユーザーの選択）もこの検索を使う
+    def get_search_results(self, request, queryset, search_term):
+        term = normalize_identifier(search_term)
+        if not term:
+            return queryset, False
+        # LIKE 'term%' は DB・照合順序によって索引を使えないため、範囲（term <= 値 < term + 最大の文字）で比較する
+        upper = term + '\U0010ffff'
+        return queryset.filter(
+            Q(username_normalized__gte=term, username_normalized__lt=upper)
+            | Q(email_normalized__gte=term, email_normalized__lt=upper)
+        ), False
+
+
+admin.site.register(CustomUser, CustomUserAdmin)
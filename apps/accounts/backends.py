@@ -5,6 +5,9 @@ from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.db.models import Q
 
+from .models import normalize_identifier
+from .throttling import check_login_attempt, login_succeeded
+
 
 class FlexibleAuthBackend(ModelBackend):
     """
@@ -16,6 +19,10 @@ class FlexibleAuthBackend(ModelBackend):
     - 'both'    : メールアドレスまたはユーザー名どちらでもログインを許可
 
     認証処理では、対象ユーザーの照合後にパスワード検証とアクティブ判定も行う。
+
+    パスワードのハッシュ検証は重いため、その前にログインID・接続元IPごとの試行回数を確認し、
+    上限を超えた試行は照合せずに失敗させる（request.login_throttled に再試行までの秒数を設定）。
+    ログインIDは正規化して、インデックス付きの検索用の列（email_normalized / username_normalized）と比較する。
     """
 
     def authenticate(self, request, username=None, password=None, **kwargs):
@@ -28,19 +35,31 @@ class FlexibleAuthBackend(ModelBackend):
         # 認証方式を設定から取得。デフォルトは 'email'
         auth_method = getattr(settings, "AUTH_METHOD", "email")
 
+        # 大文字小文字・前後の空白の違いを無視するため、ログインIDを正規化して扱う
+        identifier = normalize_identifier(username)
+
+        # 試行回数の上限に達していれば、DB照合もパスワード検証も行わずに失敗させる
+        retry_after = check_login_attempt(request, identifier)
+        if retry_after:
+            if request is not None:
+                request.login_throttled = retry_after
+            return None
+
         # 検索クエリの初期化
         query = Q()
 
         # 認証方式に応じてクエリを構築
+        # （iexact は UPPER() での比較となりインデックスが使えないため、
+        #   正規化済みの列に対して完全一致で比較する）
         if auth_method == 'email':
             # email で完全一致（大文字小文字を無視）
-            query = Q(email__iexact=username)
+            query = Q(email_normalized=identifier)
         elif auth_method == 'username':
             # username で完全一致（大文字小文字を無視）
-            query = Q(username__iexact=username)
+            query = Q(username_normalized=identifier)
         elif auth_method == 'both':
-            # email または username のどちらか一致
-            query = Q(email__iexact=username) | Q(username__iexact=username)
+            # email または username のどちらか一致（それぞれのインデックスを使って OR 検索）
+            query = Q(email_normalized=identifier) | Q(username_normalized=identifier)
         else:
             # 想定外の認証モードが設定されていた場合は明示的に例外を発生
             raise ValueError(f"無効な認証方式: {auth_method}")
@@ -54,6 +73,7 @@ class FlexibleAuthBackend(ModelBackend):
 
         # パスワードとユーザーの有効性（例：is_active）をチェック
         if user.check_password(password) and self.user_can_authenticate(user):
+            login_succeeded(request, identifier)
             return user
 
         return None
@@ -6,7 +6,7 @@ PoCであるため頻繁な設計変更を考慮して、統合したモジュ
 
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from .models import CustomUser
+from .models import CustomUser, normalize_identifier
 from django.contrib.auth import authenticate, get_user_model
 from django.conf import settings
 
@@ -54,7 +54,8 @@ class CustomUserCreationForm(UserCreationForm):
 
     def clean_email(self):
         email = self.cleaned_data.get('email')
-        if CustomUser.objects.filter(email=email).exists():
+        # 大文字小文字だけが異なるアドレスも重複とみなす（検索用の列の一意インデックスで判定）
+        if CustomUser.objects.filter(email_normalized=normalize_identifier(email)).exists():
             raise forms.ValidationError("このメールアドレスは既に使用されています。")
         return email
 
@@ -76,7 +77,8 @@ class CustomLoginForm(AuthenticationForm):
         self.user_cache = None
 
         # 親クラスの初期化（フィールド定義などをセットアップ）
-        super().__init__(*args, **kwargs)
+        # request も渡さないと親クラス側で self.request が None に上書きされ、認証バックエンドに届かない
+        super().__init__(request, *args, **kwargs)
 
         # settings.py の AUTH_METHOD の値を取得（未設定なら 'email' をデフォルトとする）
         auth_method = getattr(settings, 'AUTH_METHOD', 'email')
@@ -151,6 +153,14 @@ class CustomLoginForm(AuthenticationForm):
                 self.request, username=username, password=password
             )
             if self.user_cache is None:
+                # 試行回数の上限による失敗（backends.py で request.login_throttled が設定される）
+                retry_after = getattr(self.request, 'login_throttled', None)
+                if retry_after:
+                    raise forms.ValidationError(
+                        "ログインの試行回数が多すぎます。%(minutes)d 分ほど待ってから再度お試しください。",
+                        code='throttled',
+                        params={'minutes': max(1, round(retry_after / 60))},
+                    )
                 # 認証失敗時のエラー
                 raise forms.ValidationError("ログインID または パスワードが正しくありません。")
 
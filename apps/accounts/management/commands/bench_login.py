@@ -0,0 +1,117 @@
+# apps/accounts/management/commands/bench_login.py
+
+'''
+攻撃的な負荷（特定アカウントへの連続した誤パスワード試行）の下でのログイン処理性能を計測するベンチマーク。
+
+一時DBにユーザーを投入し、試行回数の制限を無効にした状態（before）と有効にした状態（after）で
+  - 攻撃リクエストの処理件数/秒と、実際にパスワードのハッシュ検証まで進んだ件数
+  - 攻撃中に別のIPから正規ユーザーがログインした際の応答時間
+を比較する。あわせてログインIDの検索クエリの実行計画（インデックスの利用有無）を表示する。
+
+    python manage.py bench_login
+    python manage.py bench_login --users 100000 --attempts 300 --targets 20 --ips 5
+'''
+
+import time
+from itertools import cycle
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from apps.accounts import throttling
+from apps.accounts.models import normalize_identifier
+from apps.lessons.benchmarking import percentile, scratch_database
+
+PASSWORD = 'correct-password'
+
+
+class Command(BaseCommand):
+    help = 'ログイン試行回数の制限の有無による、攻撃時のログイン処理性能を比較します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000, help='投入するユーザー数')
+        parser.add_argument('--attempts', type=int, default=100, help='攻撃として送る誤パスワードの試行回数')
+        parser.add_argument('--targets', type=int, default=10, help='攻撃対象のアカウント数')
+        parser.add_argument('--ips', type=int, default=3, help='攻撃元のIPアドレス数')
+        parser.add_argument('--legit', type=int, default=5, help='攻撃中に行う正規ログインの回数')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            users = self.seed(options['users'])
+            self.explain(users[0].email.upper())
+
+            results = {}
+            for label, enabled in (('before', False), ('after', True)):
+                # フェーズごとに試行記録をリセットする（専用のストアを使う）
+                throttling._stores.clear()
+                with override_settings(LOGIN_THROTTLE_ENABLED=enabled):
+                    results[label] = self.run_phase(label, users, options)
+
+        self.stdout.write('\n=== 比較 ===')
+        for label, result in results.items():
+            self.stdout.write(
+                f"{label:<7} 攻撃 {result['rate']:9.1f} 件/秒（ハッシュ検証 {result['hashed']:>5} 件 / 拒否 {result['throttled']:>5} 件）"
+                f"  正規ログイン p50 {result['legit_p50']:7.1f} ms / p95 {result['legit_p95']:7.1f} ms"
+                f"（成功 {result['legit_ok']} / {options['legit']}）"
+            )
+
+    def seed(self, count):
+        User = get_user_model()
+        hashed = make_password(PASSWORD)  # ハッシュ計算は1回だけ行い全ユーザーで共有する
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f'Learner{i}', email=f'Learner{i}@Example.com', password=hashed,
+                    username_normalized=normalize_identifier(f'Learner{i}'),
+                    email_normalized=normalize_identifier(f'Learner{i}@Example.com'),
+                )
+                for i in range(count)
+            ],
+            batch_size=5_000,
+        )
+        return list(User.objects.order_by('pk')[:max(1, count)])
+
+    def explain(self, identifier):
+        User = get_user_model()
+        query = User.objects.filter(email_normalized=normalize_identifier(identifier))
+        self.stdout.write(f'=== ログインIDの検索クエリの実行計画 ===\n{query.explain()}')
+
+    def run_phase(self, label, users, options):
+        factory = RequestFactory()
+        targets = cycle(users[:options['targets']])
+        ips = cycle([f'203.0.113.{i + 1}' for i in range(options['ips'])])
+        legit_user = users[-1]
+        legit_every = max(1, options['attempts'] // max(1, options['legit']))
+
+        self.stdout.write(f'\n=== {label}: 攻撃 {options["attempts"]} 件を実行中... ===')
+        throttled = 0
+        legit_timings = []
+        legit_ok = 0
+        attack_elapsed = 0.0
+        for i in range(options['attempts']):
+            request = factory.post('/accounts/login/', REMOTE_ADDR=next(ips))
+            started = time.perf_counter()
+            authenticate(request, username=next(targets).email, password='wrong-password')
+            attack_elapsed += time.perf_counter() - started
+            if getattr(request, 'login_throttled', None):
+                throttled += 1
+
+            if (i + 1) % legit_every == 0 and len(legit_timings) < options['legit']:
+                # 攻撃とは別のIPからの正規ユーザーのログイン
+                request = factory.post('/accounts/login/', REMOTE_ADDR='198.51.100.1')
+                started = time.perf_counter()
+                user = authenticate(request, username=legit_user.email.lower(), password=PASSWORD)
+                legit_timings.append((time.perf_counter() - started) * 1000)
+                legit_ok += user is not None
+
+        return {
+            'rate': options['attempts'] / attack_elapsed if attack_elapsed else 0.0,
+            'hashed': options['attempts'] - throttled,
+            'throttled': throttled,
+            'legit_p50': percentile(legit_timings, 50),
+            'legit_p95': percentile(legit_timings, 95),
+            'legit_ok': legit_ok,
+        }
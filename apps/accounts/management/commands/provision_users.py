@@ -0,0 +1,216 @@
+# apps/accounts/management/commands/provision_users.py
+
+'''
+クラス単位の受講者をまとめて登録する管理コマンド。
+
+    python manage.py provision_users cohort.csv
+    python manage.py provision_users cohort.jsonl --material 3 --material 5 --workers 8
+
+入力の列（CSV のヘッダー / JSONL のキー）:
+  email          必須。大文字小文字を区別せず、既存ユーザー・ファイル内で重複していればスキップ
+  username       省略時は email をそのまま使用
+  password       平文のパスワード（プロセスプールで並列にハッシュ化する）
+  password_hash  他システムから移行する場合のハッシュ済みパスワード（Django 形式。password より優先）
+  nickname       任意
+  materials      受講させる教材IDのセミコロン区切り（例: "3;5"。--material と併用可）
+password も password_hash もない行は、パスワード未設定（ログイン不可、再設定が必要）で登録する。
+
+chunk-size 件ごとに
+「既存のメールアドレス・ユーザー名をまとめて照合 → パスワードを並列にハッシュ化 → bulk_create → 受講登録」
+を1トランザクションで行うため、ファイルサイズに関係なくメモリ使用量は一定です。
+所要時間の大半はパスワードのハッシュ計算（1件あたり数百ミリ秒）のため、--workers で CPU コア数に合わせて並列化します。
+'''
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Count
+
+from apps.accounts.models import normalize_identifier
+from apps.lessons.exports import FORMATS, chunked, guess_format, read_rows
+from apps.lessons.models import Lesson, Material, ProgressSummary
+from apps.shards.routers import by_shard
+
+# 不正な行の内容を表示する上限（大量エラー時に出力が溢れないように）
+MAX_REPORTED_ERRORS = 20
+
+
+def _init_worker(settings_module):
+    # ワーカープロセスでもパスワードハッシュの設定（PASSWORD_HASHERS 等）を読み込む
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'CSV / JSONL からユーザーを一括登録し、必要に応じて教材へ受講登録します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="入力ファイルのパス（'-' で標準入力）")
+        parser.add_argument('--format', choices=FORMATS, help='入力形式（省略時は拡張子から判定）')
+        parser.add_argument('--chunk-size', type=int, default=5_000, help='1トランザクションで登録する件数')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='パスワードをハッシュ化するプロセス数')
+        parser.add_argument(
+            '--material', type=int, action='append', default=[], dest='materials',
+            help='全員を受講登録する教材ID（複数指定可）',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if path == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(path, newline='', encoding='utf-8')
+            except OSError as exc:
+                raise CommandError(f'ファイルを開けません: {exc}')
+
+        # 受講登録に使う教材ごとのレッスン数（サマリの初期値）は最初にまとめて取得しておく
+        self.lesson_counts = dict(
+            Lesson.objects.order_by().values('material_id').annotate(count=Count('pk')).values_list('material_id', 'count')
+        )
+        self.material_ids = set(Material.objects.values_list('id', flat=True))
+        missing = set(options['materials']) - self.material_ids
+        if missing:
+            raise CommandError(f'教材が見つかりません: {sorted(missing)}')
+        self.default_materials = options['materials']
+        self.workers = max(1, options['workers'])
+
+        self.errors = 0
+        self.seen_emails = set()     # ファイル内の重複検出用（正規化済み）
+        self.seen_usernames = set()
+        created = 0
+        enrolled = 0
+        started = time.perf_counter()
+        with stream, ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'learning_task_tracker.settings'),),
+        ) as pool:
+            for chunk in chunked(read_rows(stream, fmt), options['chunk_size']):
+                users, enrollments = self.provision_chunk(chunk, pool, offset=created + self.errors)
+                created += users
+                enrolled += enrollments
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'  {created:,} 人登録（{created / elapsed:,.0f} 人/秒）, 受講登録 {enrolled:,} 件, スキップ {self.errors:,} 件'
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{created:,} 人を登録しました（{elapsed:.2f} 秒, {created / max(elapsed, 1e-9):,.0f} 人/秒）'
+        ))
+
+    def provision_chunk(self, chunk, pool, offset):
+        User = get_user_model()
+
+        # チャンク内のメールアドレス・ユーザー名の既存登録を1クエリずつでまとめて照合する
+        emails = {normalize_identifier(row.get('email')) for row in chunk}
+        usernames = {normalize_identifier(row.get('username') or row.get('email')) for row in chunk}
+        taken_emails = set(User.objects.filter(email_normalized__in=emails).values_list('email_normalized', flat=True))
+        taken_usernames = set(
+            User.objects.filter(username_normalized__in=usernames).values_list('username_normalized', flat=True)
+        )
+
+        users = []
+        materials = []   # users と同じ並びの、受講させる教材IDのリスト
+        passwords = []   # ハッシュ化が必要な (users 内の位置, 平文) の組
+        for number, row in enumerate(chunk, start=offset + 1):
+            try:
+                user, user_materials, password = self.build(row, taken_emails, taken_usernames)
+            except ValueError as exc:
+                self.report(number, exc)
+                continue
+            if password is not None:
+                passwords.append((len(users), password))
+            users.append(user)
+            materials.append(user_materials)
+
+        # パスワードのハッシュ化（CPU 負荷が高い）をプロセスプールで並列に行う
+        if passwords:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            hashed = pool.map(make_password, [password for _, password in passwords], chunksize=chunksize)
+            for (index, _), value in zip(passwords, hashed):
+                users[index].password = value
+
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            summaries = [
+                ProgressSummary(user_id=user.pk, material_id=material_id, lesson_count=self.lesson_counts.get(material_id, 0))
+                for user, user_materials in zip(users, materials)
+                for material_id in user_materials
+            ]
+            # 進捗サマリはユーザーのシャードに登録する（シャード化していなければ全て default）
+            for alias, shard_summaries in by_shard(summaries, key=attrgetter('user_id')).items():
+                ProgressSummary.objects.using(alias).bulk_create(shard_summaries)
+        return len(users), len(summaries)
+
+    def build(self, row, taken_emails, taken_usernames):
+        User = get_user_model()
+        email = (row.get('email') or '').strip()
+        if not email:
+            raise ValueError('email がありません')
+        try:
+            validate_email(email)
+        except ValidationError:
+            raise ValueError(f'メールアドレスの形式が不正です: {email!r}')
+        email_normalized = normalize_identifier(email)
+        if email_normalized in taken_emails or email_normalized in self.seen_emails:
+            raise ValueError(f'メールアドレスは既に使用されています: {email!r}')
+        username = (row.get('username') or '').strip() or email
+        if len(username) > User._meta.get_field('username').max_length:
+            raise ValueError(f'ユーザー名が長すぎます: {username!r}')
+        username_normalized = normalize_identifier(username)
+        if username_normalized in taken_usernames or username_normalized in self.seen_usernames:
+            raise ValueError(f'ユーザー名は既に使用されています: {username!r}')
+
+        user_materials = list(self.default_materials)
+        for value in filter(None, (row.get('materials') or '').split(';')):
+            try:
+                material_id = int(value)
+            except ValueError:
+                raise ValueError(f'教材IDが不正です: {value!r}')
+            if material_id not in self.material_ids:
+                raise ValueError(f'教材が見つかりません: {material_id}')
+            if material_id not in user_materials:
+                user_materials.append(material_id)
+
+        password = None
+        password_hash = row.get('password_hash')
+        if password_hash:
+            try:
+                identify_hasher(password_hash)
+            except ValueError:
+                raise ValueError('password_hash の形式が不正です')
+        elif row.get('password'):
+            password = row['password']
+        else:
+            password_hash = make_password(None)  # パスワード未設定（ハッシュ計算は行わない）
+
+        self.seen_emails.add(email_normalized)
+        self.seen_usernames.add(username_normalized)
+        user = User(
+            email=email,
+            username=username,
+            nickname=(row.get('nickname') or '').strip(),
+            password=password_hash or '',
+            # bulk_create では save() が呼ばれないため検索用の列も設定する
+            email_normalized=email_normalized,
+            username_normalized=username_normalized,
+        )
+        return user, user_materials, password
+
+    def report(self, number, exc):
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f'  {number} 件目をスキップ: {exc}')
@@ -0,0 +1,87 @@
+# apps/accounts/migrations/0003_user_normalized_identifiers.py
+
+'''
+ログインIDの検索用の列（email_normalized / username_normalized）を追加し、
+既存ユーザーの値を埋めてから NOT NULL にしてインデックス（email は一意制約）を付ける。
+
+既存ユーザーの値は、ユーザー数が多くてもメモリ使用量とロック時間が一定になるよう、主キー順に BATCH_SIZE 件ずつ
+読み出して主キー指定の UPDATE を executemany で実行し、バッチごとにトランザクションを確定する。
+（bulk_update の CASE 式は件数に対して二乗で遅くなるため使わない。
+  SQL の LOWER() は非 ASCII 文字を小文字化しない DB があるため、正規化は Python 側で行う）
+'''
+
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 5000
+
+
+def normalize(value):
+    # マイグレーションは当時のモデル定義で動くため、models.normalize_identifier は import せず同じ処理を持つ
+    return (value or '').strip().lower()
+
+
+def backfill(apps, schema_editor):
+    User = apps.get_model('accounts', 'CustomUser')
+    connection = schema_editor.connection
+    db_alias = connection.alias
+    users = User.objects.using(db_alias).order_by('pk').values_list('pk', 'email', 'username')
+
+    quote = connection.ops.quote_name
+    sql = (
+        f'UPDATE {quote(User._meta.db_table)} '
+        f'SET {quote("email_normalized")} = %s, {quote("username_normalized")} = %s WHERE {quote(User._meta.pk.column)} = %s'
+    )
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        with transaction.atomic(using=db_alias), connection.cursor() as cursor:
+            cursor.executemany(sql, [(normalize(email), normalize(username), pk) for pk, email, username in batch])
+        last_pk = batch[-1][0]
+
+    # 続く AlterField で email_normalized に一意制約を付けるため、大文字小文字違いの重複を先に検出する
+    duplicates = list(
+        User.objects.using(db_alias).values('email_normalized')
+        .annotate(count=models.Count('pk')).filter(count__gt=1)
+        .values_list('email_normalized', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            '大文字小文字のみが異なるメールアドレスのユーザーが存在します。統合してから再実行してください: '
+            + ', '.join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+    # バックフィルはバッチごとにコミットするため、マイグレーション全体を1つのトランザクションにしない
+    # （全体を1つにすると、ユーザー数に比例する時間ユーザー表への書き込み（ログイン・登録）を止めてしまう）
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0002_alter_customuser_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='email_normalized',
+            field=models.CharField(editable=False, max_length=254, null=True, verbose_name='メールアドレス（検索用）'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='username_normalized',
+            field=models.CharField(editable=False, max_length=150, null=True, verbose_name='ユーザー名（検索用）'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customuser',
+            name='email_normalized',
+            field=models.CharField(editable=False, max_length=254, unique=True, verbose_name='メールアドレス（検索用）'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='username_normalized',
+            field=models.CharField(db_index=True, editable=False, max_length=150, verbose_name='ユーザー名（検索用）'),
+        ),
+    ]
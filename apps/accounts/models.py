@@ -3,10 +3,37 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+
+def normalize_identifier(value):
+    """
+    ログインID（メールアドレス/ユーザー名）の比較用の正規化（前後の空白を除き小文字化）。
+    """
+    return (value or '').strip().lower()
+
+
 class CustomUser(AbstractUser):
     # 任意の追加フィールド（必要なければ何も追加しなくてもOK）
     email = models.EmailField("メールアドレス", unique=True)
     nickname = models.CharField("ニックネーム", max_length=30, blank=True)
-    
+
+    # ログイン時の大文字小文字を区別しない検索用に、正規化した値を別の列に保持する（save() で同期）
+    # bulk_create() / QuerySet.update() では同期されないため、呼び出し側で normalize_identifier() の値を設定すること
+    email_normalized = models.CharField("メールアドレス（検索用）", max_length=254, unique=True, editable=False)
+    username_normalized = models.CharField("ユーザー名（検索用）", max_length=150, db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.email_normalized = normalize_identifier(self.email)
+        self.username_normalized = normalize_identifier(self.username)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # email / username だけを保存する場合も検索用の列を一緒に更新する
+            update_fields = set(update_fields)
+            if 'email' in update_fields:
+                update_fields.add('email_normalized')
+            if 'username' in update_fields:
+                update_fields.add('username_normalized')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.username
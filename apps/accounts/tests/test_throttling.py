@@ -0,0 +1,57 @@
+# apps/accounts/tests/test_throttling.py
+
+'''
+ログイン試行回数の制限（throttling.py）：失敗した試行だけが接続元IP・ログインIDの回数に残ることを確認する。
+'''
+
+from django.contrib.auth import authenticate, get_user_model
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, override_settings
+
+from apps.accounts import throttling
+
+STORES = ['apps.accounts.throttling.MemoryThrottleStore', 'apps.accounts.throttling.CacheThrottleStore']
+
+
+@override_settings(LOGIN_THROTTLE_ENABLED=True, LOGIN_THROTTLE_IP_LIMIT=3, LOGIN_THROTTLE_IDENTIFIER_LIMIT=2)
+class LoginThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        for i in range(5):
+            User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='password')
+
+    def setUp(self):
+        # 前のテストの試行記録を残さない
+        throttling._stores.clear()
+        caches['default'].clear()
+
+    def login(self, index, password='password'):
+        request = RequestFactory().post('/accounts/login/', REMOTE_ADDR='192.0.2.1')
+        user = authenticate(request, username=f'user{index}@example.com', password=password)
+        return user, getattr(request, 'login_throttled', 0)
+
+    def test_successful_logins_do_not_use_up_ip_limit(self):
+        for store in STORES:
+            with self.subTest(store), override_settings(LOGIN_THROTTLE_STORE=store):
+                for index in range(5):
+                    user, throttled = self.login(index)
+                    self.assertIsNotNone(user)
+                    self.assertEqual(throttled, 0)
+
+    def test_failures_are_limited_per_ip(self):
+        for store in STORES:
+            with self.subTest(store), override_settings(LOGIN_THROTTLE_STORE=store):
+                for index in range(3):
+                    self.assertEqual(self.login(index, password='wrong'), (None, 0))
+                # 成功しても IP の失敗回数はリセットされない
+                user, throttled = self.login(4)
+                self.assertIsNone(user)
+                self.assertGreater(throttled, 0)
+
+    def test_failures_are_limited_per_identifier(self):
+        for _ in range(2):
+            self.assertEqual(self.login(0, password='wrong'), (None, 0))
+        user, throttled = self.login(0)
+        self.assertIsNone(user)
+        self.assertGreater(throttled, 0)
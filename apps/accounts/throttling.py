@@ -0,0 +1,158 @@
+# apps/accounts/throttling.py
+
+'''
+ログイン試行回数の制限（スライディングウィンドウ方式）。
+
+ログインID（正規化したメールアドレス/ユーザー名）ごとと接続元IPごとに、
+直近 LOGIN_THROTTLE_WINDOW 秒間の試行回数を数え、上限を超えた試行は
+パスワードのハッシュ検証を行う前に拒否する（総当たり・リスト型攻撃で CPU を使い切らないため）。
+試行は検証の前に数え、成功したログインの分は後から取り消す（結果として失敗した試行だけが数えられる）。
+IP ごとの回数は、同じ IP（社内のプロキシ・NAT など）から多くの利用者が正しくログインしても上限に達しない。
+
+試行記録の保存先は settings.LOGIN_THROTTLE_STORE で差し替えられる。
+  - MemoryThrottleStore（既定）: プロセス内メモリ。ワーカープロセスごとに独立して数える
+  - CacheThrottleStore        : Django のキャッシュ（Redis 等）。複数プロセス・複数サーバーで共有する
+'''
+
+import hashlib
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+class MemoryThrottleStore:
+    """
+    プロセス内メモリに試行時刻を保持するストア。
+    """
+
+    # 期限切れのキーをまとめて掃除する間隔（秒）
+    sweep_interval = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._attempts = {}  # {key: deque[試行時刻]}
+        self._last_sweep = time.monotonic()
+
+    def attempt(self, key, limit, window):
+        """
+        試行を1回記録する。上限に達していれば記録せず、再試行できるまでの秒数を返す（許可時は 0）。
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep(now, window)
+            attempts = self._attempts.setdefault(key, deque())
+            while attempts and attempts[0] <= now - window:
+                attempts.popleft()
+            if len(attempts) >= limit:
+                return attempts[0] + window - now
+            attempts.append(now)
+            return 0
+
+    def refund(self, key):
+        # 最後に記録した試行を1回分取り消す
+        with self._lock:
+            attempts = self._attempts.get(key)
+            if attempts:
+                attempts.pop()
+
+    def reset(self, key):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+    def _sweep(self, now, window):
+        # 大量の異なるIDで試行されてもメモリが増え続けないよう、窓の外に出たキーを削除する
+        expired = [key for key, attempts in self._attempts.items() if not attempts or attempts[-1] <= now - window]
+        for key in expired:
+            del self._attempts[key]
+        self._last_sweep = now
+
+
+class CacheThrottleStore:
+    """
+    Django のキャッシュに試行時刻のリストを保持するストア（settings.LOGIN_THROTTLE_CACHE_ALIAS）。
+    読み込み→書き込みの間に他プロセスの試行が割り込むと数回分ずれることがあるが、
+    流量制限の用途では許容する。
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'LOGIN_THROTTLE_CACHE_ALIAS', 'default')]
+
+    def _cache_key(self, key):
+        # メールアドレス等をそのままキーにしないよう（長さ・使用文字の制限もあるため）ハッシュ化する
+        return 'login-throttle:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def attempt(self, key, limit, window):
+        cache_key = self._cache_key(key)
+        now = time.time()
+        attempts = [t for t in self.cache.get(cache_key, []) if t > now - window]
+        if len(attempts) >= limit:
+            return attempts[0] + window - now
+        attempts.append(now)
+        self.cache.set(cache_key, attempts, timeout=int(window) + 1)
+        return 0
+
+    def refund(self, key):
+        cache_key = self._cache_key(key)
+        attempts = self.cache.get(cache_key)
+        if attempts:
+            # 残りの有効期限は分からないため、窓の長さで保存し直す（古い試行は attempt() で除かれる）
+            self.cache.set(cache_key, attempts[:-1], timeout=int(getattr(settings, 'LOGIN_THROTTLE_WINDOW', 300)) + 1)
+
+    def reset(self, key):
+        self.cache.delete(self._cache_key(key))
+
+
+_stores = {}  # {ストアのクラスのパス: インスタンス}
+
+
+def get_store():
+    """
+    settings.LOGIN_THROTTLE_STORE のストアを返す（プロセス内でクラスごとに1つだけ生成する）。
+    """
+    path = getattr(settings, 'LOGIN_THROTTLE_STORE', 'apps.accounts.throttling.MemoryThrottleStore')
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = import_string(path)()
+    return store
+
+
+def client_ip(request):
+    # リバースプロキシ配下で X-Forwarded-For を使う場合は、プロキシ側で REMOTE_ADDR を書き換えること
+    return request.META.get('REMOTE_ADDR') if request is not None else None
+
+
+def check_login_attempt(request, identifier):
+    """
+    ログイン試行を記録し、制限に掛かった場合は再試行できるまでの秒数を返す（許可時は 0）。
+    IP の制限に掛かった試行は、ログインID側の回数には数えない。
+    """
+    if not getattr(settings, 'LOGIN_THROTTLE_ENABLED', True):
+        return 0
+    store = get_store()
+    window = getattr(settings, 'LOGIN_THROTTLE_WINDOW', 300)
+
+    ip = client_ip(request)
+    if ip:
+        retry_after = store.attempt(f'ip:{ip}', getattr(settings, 'LOGIN_THROTTLE_IP_LIMIT', 30), window)
+        if retry_after:
+            return retry_after
+    return store.attempt(f'id:{identifier}', getattr(settings, 'LOGIN_THROTTLE_IDENTIFIER_LIMIT', 5), window)
+
+
+def login_succeeded(request, identifier):
+    """
+    ログイン成功時に、そのログインIDの試行回数をリセットし、接続元IPの回数から今回の試行を取り消す。
+    （IP の回数はリセットしない。有効なアカウントを1つ持つだけで、同じ IP からの他のIDへの試行を続けられないように）
+    """
+    if not getattr(settings, 'LOGIN_THROTTLE_ENABLED', True):
+        return
+    store = get_store()
+    store.reset(f'id:{identifier}')
+    ip = client_ip(request)
+    if ip:
+        store.refund(f'ip:{ip}')
@@ -0,0 +1,31 @@
+# apps/jobs/admin.py
+
+from django.contrib import admin, messages
+
+from . import queue
+from .models import Job
+from .registry import task_label
+
+
+# --- Job管理画面カスタマイズ ---
+# ジョブはワーカーが更新するため、管理画面では閲覧と、失敗したジョブの再実行・削除だけを行う
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'label', 'status', 'progress', 'attempts', 'user', 'created_at', 'finished_at')
+    list_select_related = ('user',)
+    list_filter = ('status', 'task')
+    ordering = ('-id',)
+    readonly_fields = [field.name for field in Job._meta.fields]
+    actions = ['retry_jobs']
+
+    @admin.display(description='処理')
+    def label(self, obj):
+        return task_label(obj.task)
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='選択した失敗ジョブを再実行する')
+    def retry_jobs(self, request, queryset):
+        count = queue.retry(queryset)
+        self.message_user(request, f'{count} 件のジョブを再実行の待機中に戻しました。', messages.SUCCESS)
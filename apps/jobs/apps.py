@@ -0,0 +1,14 @@
+# apps/jobs/apps.py
+
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.jobs'
+    verbose_name = 'バックグラウンドジョブ'
+
+    def ready(self):
+        # 各アプリの tasks.py を読み込み、@task で定義したタスクを登録する（ワーカーは名前でタスクを探す）
+        autodiscover_modules('tasks')
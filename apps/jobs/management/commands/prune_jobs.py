@@ -0,0 +1,30 @@
+# apps/jobs/management/commands/prune_jobs.py
+
+'''
+終了してから保存期間を過ぎたバックグラウンドジョブを、結果ファイル（エクスポートなど）とともに削除する管理コマンド。
+cron 等で1日1回程度実行する想定。
+
+    python manage.py prune_jobs              # JOB_RETENTION_DAYS 日より前に終了したジョブを削除
+    python manage.py prune_jobs --days 1
+'''
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.jobs import queue
+
+
+class Command(BaseCommand):
+    help = '保存期間を過ぎた終了済みのバックグラウンドジョブを削除します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='保存日数（省略時は JOB_RETENTION_DAYS）')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days には0以上を指定してください。')
+        started = time.perf_counter()
+        deleted = queue.prune(options['days'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'{deleted:,} 件のジョブを削除しました（{elapsed:.2f} 秒）'))
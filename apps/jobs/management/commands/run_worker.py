@@ -0,0 +1,115 @@
+# apps/jobs/management/commands/run_worker.py
+
+'''
+バックグラウンドジョブ（apps.jobs）を実行するワーカーの管理コマンド。
+
+待機中のジョブを DB から取得し、スレッド（--pool thread）またはプロセス（--pool process）のプールで並行に実行する。
+空きのある分だけ取得するため、複数のワーカー（別のサーバーを含む）を同時に起動しても同じジョブを重複して実行しない。
+SIGTERM / Ctrl+C を受け取ると新しいジョブの取得をやめ、実行中のジョブの終了を待ってから終了する。
+
+    python manage.py run_worker                          # JOB_WORKER_CONCURRENCY 個のスレッドで実行
+    python manage.py run_worker --pool process --concurrency 4
+    python manage.py run_worker --once                   # 実行できるジョブがなくなったら終了する（cron・確認用）
+
+I/O 待ちの多いタスク（DB への一括書き込み・ファイルの書き出し）はスレッドで十分で、
+CPU を使い続けるタスクが多い場合はプロセスを使う（プロセスごとに DB 接続と Django の初期化が必要になる）。
+'''
+
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+
+from apps.jobs import queue
+from apps.jobs.pool import init_process
+
+# 応答のない実行中のジョブを確認する間隔（秒）
+STALE_CHECK_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = 'DB に登録されたバックグラウンドジョブを取得して実行します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=getattr(settings, 'JOB_WORKER_CONCURRENCY', 2),
+            help='同時に実行するジョブの数（スレッド・プロセス数）',
+        )
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread', help='ジョブを実行するプールの種類')
+        parser.add_argument(
+            '--poll-interval', type=float, default=getattr(settings, 'JOB_POLL_INTERVAL', 1.0),
+            help='待機中のジョブがないときに、次に DB を確認するまでの秒数',
+        )
+        parser.add_argument('--once', action='store_true', help='実行できるジョブがなくなったら終了する')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        if concurrency < 1:
+            raise CommandError('--concurrency には1以上を指定してください。')
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        worker = queue.worker_name()
+        self.stdout.write(f'ワーカー {worker} を開始しました（{options["pool"]} × {concurrency}）')
+        with self.executor(options['pool'], concurrency) as executor:
+            running = {}          # {Future: ジョブの主キー}
+            last_stale_check = 0.0
+            while not self.stopping:
+                if time.monotonic() - last_stale_check >= STALE_CHECK_INTERVAL:
+                    requeued = queue.requeue_stale()
+                    if requeued:
+                        self.stdout.write(self.style.WARNING(f'応答のない {requeued} 件のジョブを再実行に戻しました'))
+                    last_stale_check = time.monotonic()
+
+                close_old_connections()
+                free = concurrency - len(running)
+                job_ids = queue.claim(worker, free) if free else []
+                for job_id in job_ids:
+                    self.stdout.write(f'ジョブ #{job_id} を開始しました')
+                    running[executor.submit(queue.execute, job_id, worker)] = job_id
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                # 取得したジョブで空きが埋まっていれば、どれかが終わるまで待つ（空きがあれば次の確認まで待つ）
+                done, _ = wait(running, timeout=None if len(running) >= concurrency else options['poll_interval'],
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.finished(running.pop(future), future)
+
+            if running:
+                self.stdout.write(f'実行中の {len(running)} 件のジョブの終了を待っています...')
+            for future in list(running):
+                future.exception()  # 終了を待つ（結果は DB に記録済み）
+                self.finished(running.pop(future), future)
+        self.stdout.write(f'ワーカー {worker} を終了しました')
+
+    def executor(self, pool, concurrency):
+        if pool == 'thread':
+            return ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job')
+        # 親プロセスの DB 接続を子プロセスへ引き継がないよう、fork ではなく spawn で起動する
+        connections.close_all()
+        return ProcessPoolExecutor(
+            max_workers=concurrency,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_process,
+            initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'learning_task_tracker.settings'),),
+        )
+
+    def finished(self, job_id, future):
+        error = future.exception()
+        if error is not None:
+            # execute() はタスクの例外を DB に記録するため、ここに来るのは記録自体の失敗（DB の障害など）
+            self.stderr.write(f'ジョブ #{job_id} の実行結果を記録できませんでした: {error!r}')
+        else:
+            self.stdout.write(f'ジョブ #{job_id} が終了しました')
+
+    def stop(self, signum, frame):
+        self.stopping = True
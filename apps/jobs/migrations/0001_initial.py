@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=100, verbose_name='タスク')),
+                ('kwargs', models.JSONField(blank=True, default=dict, verbose_name='引数')),
+                ('status', models.CharField(choices=[('queued', '待機中'), ('running', '実行中'), ('succeeded', '完了'), ('failed', '失敗')], default='queued', max_length=10, verbose_name='状態')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='実行予定日時')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='試行回数')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='最大試行回数')),
+                ('progress', models.PositiveBigIntegerField(default=0, verbose_name='処理済み件数')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='結果')),
+                ('last_error', models.TextField(blank=True, verbose_name='直近のエラー')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='実行中のワーカー')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='実行開始・最終応答日時')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='登録日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to=settings.AUTH_USER_MODEL, verbose_name='登録したユーザー')),
+            ],
+            options={
+                'verbose_name': 'ジョブ',
+                'verbose_name_plural': 'ジョブ一覧',
+                'indexes': [models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'), models.Index(fields=['user', '-id'], name='job_user_id_idx')],
+            },
+        ),
+    ]
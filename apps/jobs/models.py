@@ -0,0 +1,72 @@
+# apps/jobs/models.py
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+#
+# ジョブモデル：バックグラウンドで実行する処理の待ち行列（外部のブローカーを使わず、アプリのDBに保存する）
+# ------------------------------------------------------------------------------
+# queue.enqueue() で「待機中」として登録し、run_worker コマンドのワーカーが1件ずつ「実行中」に切り替えて（取得して）実行する。
+# 失敗したジョブは試行回数が max_attempts に達するまで、間隔を広げながら（run_at を先に延ばして）再実行する。
+class Job(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, '待機中'),
+        (STATUS_RUNNING, '実行中'),
+        (STATUS_SUCCEEDED, '完了'),
+        (STATUS_FAILED, '失敗'),
+    ]
+
+    task = models.CharField("タスク", max_length=100)         # registry に登録したタスク名
+    kwargs = models.JSONField("引数", default=dict, blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,   # ユーザーが削除されてもジョブの記録は残す
+        null=True, blank=True,       # コマンドなどから登録したジョブは NULL
+        related_name="jobs",
+        verbose_name="登録したユーザー"
+    )
+    status = models.CharField("状態", max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    run_at = models.DateTimeField("実行予定日時", default=timezone.now)   # 再実行の待ち時間もここで表す
+    attempts = models.PositiveIntegerField("試行回数", default=0)
+    max_attempts = models.PositiveIntegerField("最大試行回数", default=3)
+    progress = models.PositiveBigIntegerField("処理済み件数", default=0)
+    result = models.JSONField("結果", null=True, blank=True)
+    last_error = models.TextField("直近のエラー", blank=True)
+    locked_by = models.CharField("実行中のワーカー", max_length=100, blank=True)
+    locked_at = models.DateTimeField("実行開始・最終応答日時", null=True, blank=True)
+    created_at = models.DateTimeField("登録日時", auto_now_add=True)
+    finished_at = models.DateTimeField("終了日時", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "ジョブ"
+        verbose_name_plural = "ジョブ一覧"
+        indexes = [
+            # ワーカーの取得（待機中で実行予定日時を過ぎたものを古い順）と、応答のない実行中ジョブの検出
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+            # 状態ページ（ユーザーのジョブを新しい順）
+            models.Index(fields=['user', '-id'], name='job_user_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.task}（{self.get_status_display()}）"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    def report_progress(self, count):
+        """
+        処理済みの件数を記録する（タスクの処理中に呼び出す）。
+        実行中であることの応答も兼ねる（ワーカーは別スレッドでも JOB_HEARTBEAT_INTERVAL 秒ごとに応答を記録する）。
+        他のワーカーに引き継がれた後の古い試行からは記録しない。
+        """
+        self.progress = count
+        Job.objects.filter(pk=self.pk, status=self.STATUS_RUNNING, locked_by=self.locked_by).update(
+            progress=count, locked_at=timezone.now(),
+        )
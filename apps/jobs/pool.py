@@ -0,0 +1,21 @@
+# apps/jobs/pool.py
+
+'''
+run_worker のプロセスのプール（--pool process）で、子プロセスの起動時に実行する初期化処理。
+
+子プロセスは spawn で起動するため（親プロセスの DB 接続を引き継がないように）、Django の初期化前に
+このモジュールが読み込まれる。モデルを読み込むモジュール（queue.py など）をここで import しないこと。
+'''
+
+import os
+import signal
+
+import django
+
+
+def init_process(settings_module):
+    # 各プロセスで Django を初期化する（tasks.py のタスクの登録を含む）
+    # Ctrl+C は親プロセスだけが受け取り、実行中のジョブを終えてから終了する
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
@@ -0,0 +1,305 @@
+# apps/jobs/queue.py
+
+'''
+DB に保存するジョブの待ち行列の操作（登録・取得・実行・再実行・削除）。
+
+- 登録：enqueue() で Job を「待機中」として保存する。呼び出し側のトランザクション内で登録すれば、
+  コミットされるまでワーカーからは見えない（ロールバックされればジョブも残らない）
+- 取得：claim() で待機中のジョブを「実行中」に切り替えて自分のものにする。
+  SELECT ... FOR UPDATE SKIP LOCKED が使える DB（PostgreSQL）では、他のワーカーが取得中の行を待たずに読み飛ばす。
+  使えない DB（SQLite）では「待機中なら実行中にする」条件付きの UPDATE で取得し、更新できた行だけを自分のものとする
+- 実行：execute() でタスクを呼び出し、例外が発生したら max_attempts に達するまで間隔を広げて再実行を予約する
+- 実行中は heartbeat() が JOB_HEARTBEAT_INTERVAL 秒ごとに locked_at を更新し、ワーカーが動いていることを示す。
+  応答のない実行中のジョブ（ワーカーの異常終了など）は requeue_stale() で失敗した試行として扱う
+- 結果の記録は、ジョブを取得したワーカーが実行中のままの場合だけ行う（再実行に回された古い試行が、
+  引き継いだワーカーの結果を上書きしないように）
+'''
+
+import logging
+import os
+import socket
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models import F, Max
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_task
+
+logger = logging.getLogger(__name__)
+
+
+def worker_name():
+    # ジョブを取得したワーカーの識別子（ホスト名:プロセスID）
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def default_max_attempts():
+    return getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+
+
+def retry_delay(attempts):
+    """
+    attempts 回目の試行が失敗した後、次の試行までの待ち時間（秒）。
+    JOB_RETRY_BACKOFF 秒から試行ごとに2倍にし、JOB_RETRY_BACKOFF_MAX 秒で頭打ちにする。
+    """
+    base = getattr(settings, 'JOB_RETRY_BACKOFF', 10)
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'JOB_RETRY_BACKOFF_MAX', 3600))
+
+
+def result_dir():
+    # ファイルを作成するタスク（エクスポートなど）の保存先
+    return Path(getattr(settings, 'JOB_RESULT_DIR', settings.BASE_DIR / 'job_results'))
+
+
+def result_path(job, extension):
+    # job の結果ファイルのパス（ファイル名はジョブの主キーから決めるため、再実行時は同じファイルを上書きする）
+    directory = result_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f'job-{job.pk}.{extension}'
+
+
+# ----------------------------------------
+# 登録
+# ----------------------------------------
+def enqueue(name, *, user=None, delay=None, **kwargs):
+    """
+    タスク name のジョブを登録して返す。kwargs はタスクに渡す引数（JSON に変換できる値）。
+    settings.JOBS_RUN_INLINE が True なら、ワーカーを待たずにその場で実行する（ワーカーを起動しない開発環境用）。
+    """
+    registered = get_task(name)
+    if registered is None:
+        raise ValueError(f'タスク {name} は登録されていません。')
+    job = Job.objects.create(
+        task=name,
+        kwargs=kwargs,
+        user=user,
+        run_at=timezone.now() + timedelta(seconds=delay or 0),
+        max_attempts=registered.max_attempts or default_max_attempts(),
+    )
+    if getattr(settings, 'JOBS_RUN_INLINE', False):
+        transaction.on_commit(lambda: _run_inline(job.pk), using=router.db_for_write(Job))
+    return job
+
+
+def _run_inline(job_id):
+    worker = worker_name()
+    if claim_job(job_id, worker):
+        execute(job_id, worker)
+
+
+def freeze_selection(model_admin, request, queryset):
+    """
+    管理画面の一括操作で選択された行を、ジョブの引数として保存できる形（JSON）にする（thaw_selection() で元に戻す）。
+
+    対象の行はここでは読まないため、「すべて選択」で数千万行が対象でも、リクエストの処理時間と保存する大きさは一定。
+    - ページ内の行を選択した場合：選択した主キー（1ページに表示できる件数まで）
+    - 「すべて選択」の場合：一覧の絞り込み条件（クエリ文字列）と、登録時点の主キーの最大値
+      （登録後に追加された行は、より大きな主キーで採番されるため対象に含まれない）
+    条件（Django の Query）そのものは Django やコードの更新で復元できなくなるため保存せず、
+    実行時に同じ ModelAdmin の一覧から組み立て直す。
+    """
+    opts = queryset.model._meta
+    frozen = {'model': opts.label, 'using': queryset.db}
+    if request.POST.get('select_across') == '1':
+        last = queryset.model._default_manager.using(queryset.db).aggregate(last=Max('pk'))['last']
+        return {**frozen, 'query': request.GET.urlencode(), 'max_pk': last or 0}
+    selected = request.POST.getlist(ACTION_CHECKBOX_NAME)
+    if len(selected) > max(model_admin.list_per_page, model_admin.list_max_show_all):
+        raise ValueError('選択した行が1ページに表示できる件数を超えています。')
+    return {**frozen, 'pks': [opts.pk.to_python(pk) for pk in selected]}
+
+
+def thaw_selection(frozen, user=None):
+    """
+    freeze_selection() で保存した対象のクエリセットを返す。
+    「すべて選択」の場合は、登録したユーザー user として ModelAdmin の一覧（ChangeList）を組み立て直し、
+    同じ絞り込み条件に「登録時点の主キーの最大値以下」を加える（行は呼び出し側が主キー順に少しずつ読む）。
+    """
+    model = apps.get_model(frozen['model'])
+    if 'pks' in frozen:
+        return model._default_manager.using(frozen['using']).filter(pk__in=frozen['pks'])
+    request = HttpRequest()
+    request.GET = QueryDict(frozen['query'])
+    request.user = user or AnonymousUser()
+    changelist = admin.site.get_model_admin(model).get_changelist_instance(request)
+    # 一覧の表示用の関連の読み込み・並び順は不要
+    queryset = changelist.queryset.select_related(None).prefetch_related(None).order_by()
+    return queryset.filter(pk__lte=frozen['max_pk'])
+
+
+# ----------------------------------------
+# 取得
+# ----------------------------------------
+def _claim_values(worker):
+    return {
+        'status': Job.STATUS_RUNNING,
+        'locked_by': worker,
+        'locked_at': timezone.now(),
+        'attempts': F('attempts') + 1,
+    }
+
+
+def claim(worker, limit):
+    """
+    実行予定日時を過ぎた待機中のジョブを古い順に最大 limit 件取得し、主キーのリストを返す。
+    """
+    alias = router.db_for_write(Job)
+    candidates = (
+        Job.objects.using(alias)
+        .filter(status=Job.STATUS_QUEUED, run_at__lte=timezone.now())
+        .order_by('run_at', 'pk')
+        .values_list('pk', flat=True)
+    )
+    if connections[alias].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=alias):
+            job_ids = list(candidates.select_for_update(skip_locked=True)[:limit])
+            Job.objects.using(alias).filter(pk__in=job_ids).update(**_claim_values(worker))
+        return job_ids
+    # SQLite は書き込みが1つずつ直列に行われるため、条件付きの UPDATE が成功した行だけを取得したものとする
+    # （同時に他のワーカーが取得した行は status が変わっているため更新されない）
+    return [job_id for job_id in candidates[:limit] if claim_job(job_id, worker)]
+
+
+def claim_job(job_id, worker):
+    # 待機中のジョブ job_id を取得する（取得できたら True）
+    return bool(Job.objects.filter(pk=job_id, status=Job.STATUS_QUEUED).update(**_claim_values(worker)))
+
+
+def owned(job_id, worker):
+    # ワーカー worker が実行中のジョブ job_id（他のワーカーに引き継がれていなければ1件）
+    return Job.objects.filter(pk=job_id, status=Job.STATUS_RUNNING, locked_by=worker)
+
+
+def requeue_stale(timeout=None):
+    """
+    JOB_LOCK_TIMEOUT 秒以上応答のない実行中のジョブを、失敗した試行として再実行の待機中（または失敗）に戻す。
+    戻した件数を返す。
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'JOB_LOCK_TIMEOUT', 600)
+    stale = Job.objects.filter(status=Job.STATUS_RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=timeout))
+    requeued = 0
+    for job in stale.only('pk', 'attempts', 'max_attempts', 'locked_by'):
+        # 一覧を読んだ後に応答があった（locked_by のワーカーが再び取得した場合を含む）ジョブは戻さない
+        requeued += _finish_attempt(
+            job, f'ワーカー {job.locked_by} から {timeout} 秒以上応答がありませんでした。', job.locked_by,
+            locked_at__lt=timezone.now() - timedelta(seconds=timeout),
+        )
+    return requeued
+
+
+# ----------------------------------------
+# 実行
+# ----------------------------------------
+def execute(job_id, worker):
+    """
+    ワーカー worker が取得済みのジョブ job_id のタスクを実行し、結果（または失敗）を記録する。
+    ワーカーのスレッド・プロセスから呼び出すため、前後で古くなったDB接続を閉じる（リクエストの開始・終了時と同じ）。
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id)
+        registered = get_task(job.task)
+        if registered is None:
+            # 再実行しても成功しないため、試行回数に関係なく失敗とする
+            job.attempts = job.max_attempts
+            _finish_attempt(job, f'タスク {job.task} は登録されていません。', worker)
+            return
+        try:
+            with heartbeat(job.pk, worker):
+                result = registered.func(job, **job.kwargs)
+        except Exception:
+            logger.exception('ジョブ #%s（%s）が失敗しました（%s 回目）', job.pk, job.task, job.attempts)
+            _finish_attempt(job, traceback.format_exc(), worker)
+            return
+        recorded = owned(job.pk, worker).update(
+            status=Job.STATUS_SUCCEEDED, result=result, last_error='', locked_by='', locked_at=None,
+            finished_at=timezone.now(),
+        )
+        if not recorded:
+            logger.warning('ジョブ #%s は他のワーカーに引き継がれたため、%s の結果は記録しません', job.pk, worker)
+    finally:
+        close_old_connections()
+
+
+@contextmanager
+def heartbeat(job_id, worker, interval=None):
+    """
+    ブロック内の処理の間、interval 秒（省略時は JOB_HEARTBEAT_INTERVAL）ごとに別スレッドで locked_at を更新する。
+    report_progress() を呼ばない長いタスクも、動いている間は requeue_stale() で再実行に回されない。
+    """
+    if interval is None:
+        interval = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', 60)
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(interval):
+                try:
+                    owned(job_id, worker).update(locked_at=timezone.now())
+                except Exception:
+                    # 一時的な失敗（SQLite のロック待ちのタイムアウトなど）は次の間隔で再び試みる
+                    logger.exception('ジョブ #%s の応答を記録できませんでした', job_id)
+        finally:
+            connections.close_all()  # このスレッドの DB 接続を閉じる
+
+    thread = threading.Thread(target=beat, name=f'job-{job_id}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def _finish_attempt(job, error, worker, **conditions):
+    """
+    ワーカー worker の失敗した試行を記録する。試行回数が残っていれば再実行を予約し、なければ失敗とする。
+    ジョブが worker の実行中のまま（conditions を指定した場合はその条件にも一致する）場合だけ更新し、更新した件数を返す。
+    """
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        values = {'status': Job.STATUS_QUEUED, 'run_at': now + timedelta(seconds=retry_delay(job.attempts))}
+    else:
+        values = {'status': Job.STATUS_FAILED, 'finished_at': now}
+    return owned(job.pk, worker).filter(**conditions).update(last_error=error, locked_by='', locked_at=None, **values)
+
+
+def retry(queryset):
+    # 失敗したジョブを、試行回数を数え直して待機中に戻す（管理画面の操作用）。戻した件数を返す
+    return queryset.filter(status=Job.STATUS_FAILED).update(
+        status=Job.STATUS_QUEUED, attempts=0, run_at=timezone.now(), finished_at=None,
+    )
+
+
+# ----------------------------------------
+# 削除
+# ----------------------------------------
+def prune(days=None):
+    """
+    終了してから days 日（省略時は JOB_RETENTION_DAYS）より前のジョブを、結果ファイルとともに削除する。
+    削除したジョブの件数を返す。
+    """
+    if days is None:
+        days = getattr(settings, 'JOB_RETENTION_DAYS', 7)
+    old = Job.objects.filter(
+        status__in=[Job.STATUS_SUCCEEDED, Job.STATUS_FAILED],
+        finished_at__lt=timezone.now() - timedelta(days=days),
+    )
+    for result in old.filter(result__isnull=False).values_list('result', flat=True).iterator():
+        if isinstance(result, dict) and result.get('file'):
+            (result_dir() / result['file']).unlink(missing_ok=True)
+    deleted, _ = old.delete()
+    return deleted
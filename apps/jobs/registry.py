@@ -0,0 +1,49 @@
+# apps/jobs/registry.py
+
+'''
+バックグラウンドで実行できるタスクの登録。
+
+各アプリの tasks.py で @task を付けて定義すると、JobsConfig.ready() の読み込み時に登録される。
+タスクは実行中のジョブ（Job）と、登録時の引数（JSON に変換できる値）を受け取り、JSON に変換できる結果を返す。
+
+    @task('lessons.rebuild_summaries', label='進捗サマリの再構築')
+    def rebuild(job, user_ids=None):
+        ...
+        return {'summaries': created}
+'''
+
+from collections.abc import Callable
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    func: Callable
+    label: str           # 状態ページに表示する名前
+    max_attempts: int | None  # 失敗時に再実行する回数を含めた、最大の試行回数（None なら JOB_MAX_ATTEMPTS）
+
+
+TASKS = {}
+
+
+def task(name, *, label=None, max_attempts=None):
+    """
+    関数をタスク name として登録するデコレータ。
+    途中で失敗しても結果が変わらない（何度実行してもよい）処理だけを再実行の対象にすること（そうでなければ max_attempts=1）。
+    """
+    def register(func):
+        if name in TASKS:
+            raise ValueError(f'タスク {name} は既に登録されています。')
+        TASKS[name] = Task(name=name, func=func, label=label or name, max_attempts=max_attempts)
+        return func
+    return register
+
+
+def get_task(name):
+    return TASKS.get(name)
+
+
+def task_label(name):
+    registered = TASKS.get(name)
+    return registered.label if registered else name
@@ -0,0 +1,124 @@
+# apps/jobs/tests/test_queue.py
+
+'''
+ジョブの待ち行列（queue.py）の取得・実行・再実行を確認する。
+管理画面で選択した行の保存（freeze_selection / thaw_selection）は apps/lessons/tests/test_admin_actions.py で確認する。
+'''
+
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from apps.jobs import queue
+from apps.jobs.models import Job
+from apps.jobs.registry import TASKS, Task
+
+
+def succeed(job, value=None):
+    return {'value': value}
+
+
+def fail(job):
+    raise RuntimeError('失敗しました')
+
+
+TEST_TASKS = {
+    'tests.succeed': Task(name='tests.succeed', func=succeed, label='成功するタスク', max_attempts=None),
+    'tests.fail': Task(name='tests.fail', func=fail, label='失敗するタスク', max_attempts=2),
+}
+
+
+@override_settings(JOBS_RUN_INLINE=False, JOB_RETRY_BACKOFF=10)
+@mock.patch.dict(TASKS, TEST_TASKS)
+class QueueTests(TestCase):
+    def test_claim_and_execute(self):
+        job = queue.enqueue('tests.succeed', value=1)
+        self.assertEqual(queue.claim('worker-a', 10), [job.pk])
+        # 取得済みのジョブは他のワーカーからは取得できない
+        self.assertEqual(queue.claim('worker-b', 10), [])
+        queue.execute(job.pk, 'worker-a')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.locked_by), (Job.STATUS_SUCCEEDED, {'value': 1}, ''))
+
+    def test_claim_skips_scheduled_jobs(self):
+        queue.enqueue('tests.succeed', delay=60)
+        self.assertEqual(queue.claim('worker-a', 10), [])
+
+    def test_failure_is_retried_until_max_attempts(self):
+        job = queue.enqueue('tests.fail')
+        queue.claim('worker-a', 1)
+        with self.assertLogs('apps.jobs.queue', 'ERROR'):
+            queue.execute(job.pk, 'worker-a')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('RuntimeError', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        queue.claim('worker-a', 1)
+        with self.assertLogs('apps.jobs.queue', 'ERROR'):
+            queue.execute(job.pk, 'worker-a')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
+
+    def test_result_is_recorded_only_by_owner(self):
+        # 応答がないとみなされ、他のワーカーに引き継がれたジョブの古い試行は結果を記録しない
+        job = queue.enqueue('tests.succeed', value=1)
+        queue.claim('worker-a', 1)
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(queue.requeue_stale(timeout=60), 1)
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(queue.claim('worker-b', 1), [job.pk])
+
+        with self.assertLogs('apps.jobs.queue', 'WARNING'):
+            queue.execute(job.pk, 'worker-a')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.STATUS_RUNNING, 'worker-b'))
+        queue.execute(job.pk, 'worker-b')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+
+    def test_requeue_stale_ignores_live_jobs(self):
+        job = queue.enqueue('tests.succeed')
+        queue.claim('worker-a', 1)
+        self.assertEqual(queue.requeue_stale(timeout=60), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_RUNNING)
+
+    def test_unknown_task_fails_immediately(self):
+        job = queue.enqueue('tests.succeed')
+        Job.objects.filter(pk=job.pk).update(task='tests.removed')
+        queue.claim('worker-a', 1)
+        queue.execute(job.pk, 'worker-a')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+
+
+@override_settings(JOBS_RUN_INLINE=False)
+class HeartbeatTests(TransactionTestCase):
+    # 更新は別スレッド（別の DB 接続）から行うため、コミット済みのジョブで確認する
+
+    def test_heartbeat_updates_locked_at(self):
+        with mock.patch.dict(TASKS, TEST_TASKS):
+            job = queue.enqueue('tests.succeed')
+        queue.claim('worker-a', 1)
+        stale = timezone.now() - timedelta(hours=1)
+        Job.objects.filter(pk=job.pk).update(locked_at=stale)
+        with queue.heartbeat(job.pk, 'worker-a', interval=0.05):
+            time.sleep(0.3)
+        job.refresh_from_db()
+        self.assertGreater(job.locked_at, stale)
+
+    def test_heartbeat_ignores_jobs_taken_over(self):
+        with mock.patch.dict(TASKS, TEST_TASKS):
+            job = queue.enqueue('tests.succeed')
+        queue.claim('worker-b', 1)
+        stale = timezone.now() - timedelta(hours=1)
+        Job.objects.filter(pk=job.pk).update(locked_at=stale)
+        with queue.heartbeat(job.pk, 'worker-a', interval=0.05):
+            time.sleep(0.3)
+        job.refresh_from_db()
+        self.assertEqual(job.locked_at, stale)
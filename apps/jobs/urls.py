@@ -0,0 +1,14 @@
+# apps/jobs/urls.py
+
+from django.urls import path
+from . import views
+
+app_name = 'jobs'
+
+urlpatterns = [
+    # ログインユーザーのバックグラウンドジョブの一覧・状態
+    path('', views.job_list_view, name='job_list'),
+    path('<int:pk>/', views.job_detail_view, name='job_detail'),
+    # 結果ファイル（エクスポートなど）のダウンロード
+    path('<int:pk>/download/', views.job_download_view, name='job_download'),
+]
@@ -0,0 +1,85 @@
+# apps/jobs/views.py
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render
+
+from .models import Job
+from .queue import result_dir
+from .registry import task_label
+
+
+def visible_jobs(user):
+    # 管理者は全員のジョブ、それ以外のユーザーは自分が登録したジョブだけを見られる
+    return Job.objects.all() if user.is_staff else Job.objects.filter(user=user)
+
+
+def job_context(job, user):
+    return {
+        'id': job.pk,
+        'task': job.task,
+        'label': task_label(job.task),
+        'status': job.status,
+        'status_label': job.get_status_display(),
+        'progress': job.progress,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'created_at': job.created_at,
+        'run_at': job.run_at,
+        'finished_at': job.finished_at,
+        'finished': job.is_finished,
+        'result': job.result,
+        'downloadable': job.status == Job.STATUS_SUCCEEDED and bool((job.result or {}).get('file')),
+        # エラーの詳細（トレースバック）は管理者にだけ表示する
+        'error': job.last_error if user.is_staff else '',
+    }
+
+
+# ----------------------------------------
+# ジョブの一覧（状態ページ）
+# ----------------------------------------
+# ログインユーザーが登録したジョブを新しい順に表示する（件数は JOB_LIST_LIMIT まで）
+@login_required
+def job_list_view(request):
+    limit = getattr(settings, 'JOB_LIST_LIMIT', 50)
+    jobs = visible_jobs(request.user).order_by('-id').defer('kwargs', 'last_error')[:limit]
+    return render(request, 'jobs/job_list.html', {
+        'jobs': [job_context(job, request.user) for job in jobs],
+        'limit': limit,
+    })
+
+
+# ----------------------------------------
+# ジョブの詳細
+# ----------------------------------------
+# 実行中は画面を自動で更新する（?format=json で状態を JSON で返す。クライアントからの確認用）
+@login_required
+def job_detail_view(request, pk):
+    job = get_object_or_404(visible_jobs(request.user), pk=pk)
+    context = job_context(job, request.user)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            key: context[key]
+            for key in ('id', 'task', 'status', 'progress', 'attempts', 'max_attempts', 'finished', 'result')
+        })
+    return render(request, 'jobs/job_detail.html', {
+        'job': context,
+        'refresh_seconds': getattr(settings, 'JOB_STATUS_REFRESH_SECONDS', 3),
+    })
+
+
+# ----------------------------------------
+# ジョブの結果ファイルのダウンロード
+# ----------------------------------------
+@login_required
+def job_download_view(request, pk):
+    job = get_object_or_404(visible_jobs(request.user), pk=pk, status=Job.STATUS_SUCCEEDED)
+    result = job.result or {}
+    if not result.get('file'):
+        raise Http404('このジョブにはダウンロードできるファイルがありません。')
+    try:
+        stream = open(result_dir() / result['file'], 'rb')
+    except FileNotFoundError:
+        raise Http404('結果ファイルは保存期間を過ぎたため削除されました。')
+    return FileResponse(stream, as_attachment=True, filename=result.get('filename') or result['file'])
@@ -1,31 +1,125 @@
 # apps/lessons/admin.py
 
-from django.contrib import admin
-from .models import Material, Lesson, Progress
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.db.models import Max, Min
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+
+from apps.jobs.queue import enqueue, freeze_selection
+from apps.shards.routers import shard_aliases, sharding_enabled
+
+from .models import Material, Lesson, Progress, ProgressQuerySet
+from .pagination import EstimatedCountPaginator
+from .ordering import rebalance
+from .search import matching_entries
 
 # --- 管理サイト全体のUIテキストをカスタマイズ ---
 admin.site.site_title = "学習管理システム 管理"
 admin.site.site_header = "学習管理システム 管理サイト"
 admin.site.index_title = "ダッシュボード"
 
+# --- 検索設定 ---
+# search_fields の icontains（LIKE '%...%' の全件走査）の代わりに、全文検索インデックス（search.py）で絞り込む
+# search_fields は検索ボックスを表示するために残している
+class IndexedSearchMixin:
+    search_index_field = 'pk'               # 絞り込む列（一覧のモデル側）
+    search_index_column = 'material_id'     # SearchEntry 側の列（material_id / lesson_id）
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        entries = matching_entries(search_term).filter(lesson__isnull=self.search_index_column == 'material_id')
+        matched = entries.values_list(self.search_index_column, flat=True)
+        if queryset.db != matched.db:
+            # 一覧がシャード（別のDB）の場合はサブクエリにできないため、一致したIDを先に読み込む
+            matched = list(matched)
+        return queryset.filter(**{f'{self.search_index_field}__in': matched}), False
+
+# --- 一括操作の設定 ---
+# 一括操作は件数が多いと時間がかかるため、リクエストの中では実行せず、バックグラウンドジョブ（apps.jobs）として登録する
+# （処理済みの件数はジョブの状態ページで確認できる）
+def message_enqueued(model_admin, request, jobs, description):
+    links = format_html_join(
+        '、', '<a href="{}">#{}</a>', ((reverse('jobs:job_detail', args=[job.pk]), job.pk) for job in jobs)
+    )
+    model_admin.message_user(
+        request, format_html('{}をバックグラウンドで実行します（ジョブ {}）。', description, links), messages.SUCCESS,
+    )
+
+
+class ReassignLessonForm(forms.Form):
+    # 付け替え先のレッスン（全件を <select> に展開しないよう、進捗の編集画面と同じオートコンプリートで選ぶ）
+    lesson = forms.ModelChoiceField(
+        Lesson.objects.select_related('material'),
+        label='付け替え先のレッスン',
+        widget=AutocompleteSelect(Progress._meta.get_field('lesson'), admin.site),
+    )
+
 # --- Inline設定 ---
 # Material（教材）の編集画面で、関連するLesson（レッスン）を一緒に編集できるようにする
 class LessonInline(admin.TabularInline):  # 横並びのシンプルな形式
     model = Lesson
     extra = 1  # 空の入力フォームを1行表示（新規追加用）
+    fields = ('drag_handle', 'title', 'order')
+    # 表示順序はドラッグ＆ドロップで変更する（移動したレッスンの1行だけを API で即時更新）
+    # 新しいレッスンは末尾に追加される
+    readonly_fields = ('drag_handle', 'order')
+
+    class Media:
+        js = ('lessons/admin/lesson_reorder.js',)
+
+    @admin.display(description='並べ替え')
+    def drag_handle(self, obj):
+        if obj is None or obj.pk is None:
+            return ''
+        return format_html(
+            '<span class="lesson-drag-handle" data-lesson-id="{}" data-move-url="{}" title="ドラッグして並べ替え" '
+            'style="cursor: move;">☰</span>',
+            obj.pk, reverse('api:lesson_move', args=[obj.pk]),
+        )
 
 # --- Material管理画面カスタマイズ ---
 @admin.register(Material)
-class MaterialAdmin(admin.ModelAdmin):
+class MaterialAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'description')  # 一覧で表示される列
     search_fields = ('title', 'description')  # タイトルや説明で検索可能に
     inlines = [LessonInline]  # インラインでLessonを表示・編集
+    actions = ['rebalance_lessons', 'duplicate_materials']
+
+    @admin.action(description='選択した教材のレッスンの表示順序を振り直す')
+    def rebalance_lessons(self, request, queryset):
+        # 並び順は変えずに、間隔（LESSON_ORDER_GAP）を空けた値へ振り直す
+        count = sum(rebalance(material_id) for material_id in queryset.values_list('pk', flat=True))
+        self.message_user(request, f'{count} 件のレッスンの表示順序を振り直しました。', messages.SUCCESS)
+
+    @admin.action(description='選択した教材をレッスンとともに複製する')
+    def duplicate_materials(self, request, queryset):
+        # レッスンは bulk_create でまとめて登録する（進捗は複製しない）。教材ごとにバックグラウンドジョブで実行する
+        jobs = [
+            enqueue('lessons.duplicate_material', user=request.user, material_id=material_id)
+            for material_id in queryset.order_by('pk').values_list('pk', flat=True)
+        ]
+        message_enqueued(self, request, jobs, f'{len(jobs)} 件の教材の複製')
 
 # --- Lesson管理画面カスタマイズ ---
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'material', 'order')  # 一覧で表示される列
     list_filter = ('material',)  # 教材（Material）で絞り込みが可能に
+    search_fields = ('title',)  # レッスンタイトルで検索可能に
+    search_index_column = 'lesson_id'
+    # 教材は全件を <select> に展開せず、教材の検索（MaterialAdmin の検索）で候補を読み込む
+    autocomplete_fields = ('material',)
+
+    def get_queryset(self, request):
+        # 表示名（__str__）に教材名を使うため、一覧・進捗画面のオートコンプリートで教材を JOIN して読み込む
+        return super().get_queryset(request).select_related('material')
 
     # 編集画面のレイアウトを分かりやすくセクション分け
     fieldsets = (
@@ -41,8 +135,153 @@ class LessonAdmin(admin.ModelAdmin):
     readonly_fields = ('order',)  # 表示順を読み取り専用に（誤操作防止）
 
 # --- Progress管理画面カスタマイズ ---
+class ProgressAdminQuerySet(ProgressQuerySet):
+    # 日付階層の表示範囲（MIN / MAX を同時に求める集計）は、索引の端を読むだけで済むよう1つずつ求める
+    # （MIN と MAX を1つのクエリにまとめると、SQLite は索引全体を走査する）
+    def aggregate(self, *args, **kwargs):
+        if args or len(kwargs) < 2 or not all(isinstance(value, (Min, Max)) for value in kwargs.values()):
+            return super().aggregate(*args, **kwargs)
+        result = {}
+        for name, value in kwargs.items():
+            result.update(super().aggregate(**{name: value}))
+        return result
+
+    # 日付階層（date_hierarchy）の年・月・日の一覧を、DISTINCT の全件走査ではなくインデックスで求める
+    def dates(self, field_name, kind, order='ASC'):
+        buckets = self.date_buckets(field_name, kind)
+        return buckets if order == 'ASC' else buckets[::-1]
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    # シャーディングが有効な場合に、一覧に表示するシャードを選ぶ（既定は最初のシャード。全シャードを混ぜた一覧は作らない）
+    title = 'シャード'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shard_aliases()]
+
+    def queryset(self, request, queryset):
+        if self.value() in shard_aliases():
+            return queryset.using(self.value())
+        return queryset
+
+    def choices(self, changelist):
+        # 「すべて」は選べないため、各シャードだけを並べる
+        current = self.value() if self.value() in shard_aliases() else shard_aliases()[0]
+        for alias, label in self.lookup_choices:
+            yield {
+                'selected': alias == current,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': label,
+            }
+
+
 @admin.register(Progress)
-class ProgressAdmin(admin.ModelAdmin):
-    list_display = ('lesson', 'status', 'date')  # 一覧で表示される列
+class ProgressAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ('lesson', 'user', 'status', 'date')  # 一覧で表示される列
+    list_select_related = ('lesson__material', 'user')  # 表示名に使う関連を JOIN で読み込む（行ごとのクエリを防ぐ）
     search_fields = ('lesson__title',)  # レッスンタイトルで検索可能に
+    search_index_field = 'lesson_id'
+    search_index_column = 'lesson_id'
     list_filter = ('status', 'date')  # ステータスや日付で絞り込み
+    date_hierarchy = 'date'
+    # 日付の新しい順（progress_date_idx / progress_status_date_idx の順に読むだけで先頭ページが求まる）
+    ordering = ('-date', '-id')
+    # 件数は推定値・上限付きで数え、絞り込み時の全件数（COUNT(*)）も表示しない
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # 数万件の選択肢を <select> に展開しない
+    autocomplete_fields = ('user', 'lesson')
+    # 一括操作は1件ずつ保存せず、バックグラウンドジョブでまとめて UPDATE する（bulk.update_progress）
+    actions = ['mark_done', 'reset_progress', 'reassign_lesson']
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        queryset = ProgressAdminQuerySet(model=queryset.model, query=queryset.query, using=queryset._db)
+        if sharding_enabled():
+            # 一覧は1つのシャードずつ表示する（ShardListFilter で切り替え）
+            # シャード上の進捗からはレッスン・ユーザーを JOIN できないため、表示名に使う関連は別のクエリで読み込む
+            return queryset.using(shard_aliases()[0]).prefetch_related('lesson__material', 'user')
+        return queryset
+
+    def get_list_select_related(self, request):
+        return () if sharding_enabled() else self.list_select_related
+
+    def get_list_filter(self, request):
+        return (*self.list_filter, ShardListFilter) if sharding_enabled() else self.list_filter
+
+    def get_object(self, request, object_id, from_field=None):
+        if not sharding_enabled():
+            return super().get_object(request, object_id, from_field)
+        # 主キーはシャードごとに重ならない範囲で採番されるため、各シャードを順に探す
+        field = self.model._meta.pk if from_field is None else self.model._meta.get_field(from_field)
+        try:
+            object_id = field.to_python(object_id)
+        except ValidationError:
+            return None
+        queryset = self.get_queryset(request)
+        for alias in shard_aliases():
+            obj = queryset.using(alias).filter(**{field.name: object_id}).first()
+            if obj is not None:
+                return obj
+        return None
+
+    @admin.action(description='選択した進捗を「完了」にする')
+    def mark_done(self, request, queryset):
+        self.update_status(request, queryset, 'done')
+
+    @admin.action(description='選択した進捗を「未開始」に戻す')
+    def reset_progress(self, request, queryset):
+        self.update_status(request, queryset, 'not_started')
+
+    def update_status(self, request, queryset, status):
+        label = dict(Progress.STATUS_CHOICES)[status]
+        # 既に同じステータスの行は、ジョブの実行時に除外する（bulk.update_progress）
+        self.enqueue_update(request, queryset, {'status': status}, f'選択した進捗の「{label}」への変更')
+
+    def enqueue_update(self, request, queryset, values, description):
+        # 選択した進捗を values の内容に変更するジョブを登録する
+        # 対象の行はリクエストの中では読まず、ジョブの実行時に主キー順に少しずつ読む（jobs.queue.freeze_selection）
+        count = None
+        if request.POST.get('select_across') == '1':
+            # 「すべて選択」の件数は一覧と同じく推定値・上限付きで数える（絞り込みありは ADMIN_EXACT_COUNT_LIMIT + 1 件まで）
+            count = self.get_paginator(request, queryset, 1).count
+            limit = getattr(settings, 'ADMIN_BULK_SELECT_ACROSS_LIMIT', 1_000_000)
+            if not queryset.query.where and count > limit:
+                self.message_user(
+                    request, f'約 {count:,} 件（上限 {limit:,} 件）が対象になるため実行できません。絞り込んでから実行してください。',
+                    messages.ERROR,
+                )
+                return
+        try:
+            selection = freeze_selection(self, request, queryset)
+        except ValueError as exc:
+            self.message_user(request, str(exc), messages.ERROR)
+            return
+        job = enqueue('lessons.update_progress', user=request.user, selection=selection, values=values)
+        message_enqueued(self, request, [job], description)
+        exact_limit = getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10_000)
+        if count is not None and count > exact_limit:
+            self.message_user(
+                request, f'{exact_limit:,} 件を超える進捗が対象のため、完了まで時間がかかります（進み具合はジョブの状態ページで確認できます）。',
+                messages.WARNING,
+            )
+
+    @admin.action(description='選択した進捗を別のレッスンに付け替える')
+    def reassign_lesson(self, request, queryset):
+        # 1回目は付け替え先を選ぶ画面を表示し、その画面から送信（apply）されたときに更新する
+        form = ReassignLessonForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            lesson = form.cleaned_data['lesson']
+            self.enqueue_update(request, queryset, {'lesson_id': lesson.pk}, f'選択した進捗の「{lesson}」への付け替え')
+            return None
+        return TemplateResponse(request, 'admin/lessons/progress/reassign_lesson.html', {
+            **self.admin_site.each_context(request),
+            'title': '進捗の付け替え',
+            'opts': self.model._meta,
+            'form': form,
+            'media': self.media + form.media,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
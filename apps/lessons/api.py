@@ -0,0 +1,475 @@
+# apps/lessons/api.py
+
+'''
+教材・レッスン・進捗の JSON API（モバイルアプリ等のクライアント向け）。
+
+  GET   /api/materials/              教材一覧（?fields= ?after= ?before= ?size= ?q=）
+  POST  /api/materials/              教材の登録
+  GET   /api/materials/<pk>/         教材の取得
+  PATCH /api/materials/<pk>/         教材の更新（If-Match で更新競合を検出）
+  GET   /api/lessons/                レッスン一覧（?material= で教材を指定）
+  POST  /api/lessons/                レッスンの登録
+  GET   /api/lessons/<pk>/           レッスンの取得
+  PATCH /api/lessons/<pk>/           レッスンの更新
+  POST  /api/lessons/<pk>/move/      レッスンの並べ替え（{"after": <レッスンID>} または {"before": <レッスンID>}）
+  GET   /api/progress/               ログインユーザーの進捗一覧（?lesson= でレッスンを指定）
+  POST  /api/progress/               進捗の一括登録（{"records": [{"lesson": 1, "status": "done"}, ...]}）
+  GET   /api/sync/                   差分同期（?since= に前回の token を指定し、それ以降の変更だけを受け取る）
+
+- ?fields=id,title のように返すフィールドを絞り込める（DB からも該当列だけを読み込む）
+- 教材一覧の ?q= は検索語で絞り込む（全文検索インデックスを使用。フォームの教材選択の候補の取得にも使う）
+- 一覧は id のキーセット方式でページ分割し、レスポンスの next / previous をカーソルとして渡す
+- 応答には行のバージョン（教材・レッスンは保存のたびに進む version 列、進捗は id と内容）から
+  計算した強い ETag を付け、If-None-Match が一致すれば本文を作らずに 304 を返す
+- 更新時の If-Match は行のバージョンだけで比べる（?fields= で取得した応答の ETag でも更新できる）
+- 認証は画面と同じセッション（未ログインは 401）。書き込み系は CSRF トークンが必要
+'''
+
+import hashlib
+import json
+from datetime import date
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
+
+from . import changelog
+from .forms import LessonForm, MaterialForm
+from .models import Lesson, Material, Progress
+from .ordering import OrderingError, move_lesson
+from .pagination import get_page_size, keyset_paginate, parse_cursor
+from .search import matching_entries
+from .summaries import rebuild_learning_stats, rebuild_summaries
+
+# 各リソースで選択できるフィールドと、読み込む DB の列（None は集計値など列を持たないもの）
+MATERIAL_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'description': 'description',
+    'lesson_count': None,
+    'version': 'version',
+}
+LESSON_FIELDS = {
+    'id': 'id',
+    'material': 'material_id',
+    'title': 'title',
+    'order': 'order',
+    'version': 'version',
+}
+PROGRESS_FIELDS = {
+    'id': 'id',
+    'lesson': 'lesson_id',
+    'status': 'status',
+    'date': 'date',
+}
+
+
+# 同時に行われた更新と一意制約で衝突した場合の応答（409）。クライアントは読み直してから再試行する
+CONFLICT_MESSAGE = '他の更新と同時に行われたため保存できませんでした。最新の内容を取得してやり直してください。'
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.payload = {'error': message, **extra}
+
+
+def api_view(*methods):
+    """
+    API ビュー共通の処理：許可メソッドの確認・ログイン確認（401）・エラーの JSON 化。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'error': 'このメソッドは使用できません。'}, status=405, headers={'Allow': ', '.join(methods)})
+            if not request.user.is_authenticated:
+                return JsonResponse({'error': 'ログインが必要です。'}, status=401)
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as exc:
+                return JsonResponse(exc.payload, status=exc.status)
+            except Http404:
+                return JsonResponse({'error': '見つかりません。'}, status=404)
+        return wrapper
+    return decorator
+
+
+# ----------------------------------------
+# 共通処理
+# ----------------------------------------
+def selected_fields(request, available):
+    """
+    ?fields= で指定されたフィールド名のリストを返す（省略時は全フィールド）。
+    """
+    value = request.GET.get('fields')
+    if not value:
+        return list(available)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ApiError(400, '存在しないフィールドが指定されました。', fields=unknown, available=list(available))
+    return fields
+
+
+def load_columns(fields, available, *required):
+    # only() に渡す列（ETag の計算に使う id / version は常に読み込む）
+    columns = {available[name] for name in fields if available[name]}
+    return sorted(columns | set(required))
+
+
+def serialize(obj, fields, available):
+    data = {}
+    for name in fields:
+        value = getattr(obj, available[name] or name)
+        data[name] = value.isoformat() if isinstance(value, date) else value
+    return data
+
+
+def _digest(parts, length=32):
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:length]
+
+
+def make_etag(*parts):
+    # 行のバージョン等から強い ETag を作る（内容が同じなら常に同じ値になる）
+    return quote_etag(_digest(parts))
+
+
+def object_etag(kind, fields, version):
+    """
+    1件のリソースの ETag：行のバージョン（version）から求めた部分と、返すフィールドから求めた部分を '-' でつなぐ。
+    フィールドごとに応答の内容が異なるため ETag も変え、If-Match ではバージョンの部分だけを比べる（check_if_match()）。
+    """
+    return quote_etag(f'{_digest((kind, version), 24)}-{_digest(fields, 8)}')
+
+
+def conditional_json(request, etag, build, status=200):
+    """
+    If-None-Match が ETag と一致すれば 304 を、そうでなければ build() の結果を JSON で返す。
+    """
+    if etag in parse_etags(request.headers.get('If-None-Match', '')) or request.headers.get('If-None-Match') == '*':
+        return HttpResponseNotModified(headers={'ETag': etag})
+    return JsonResponse(build(), status=status, headers={'ETag': etag})
+
+
+def check_if_match(request, kind, version):
+    # If-Match があり、どの ETag も現在のバージョンと異なれば他のクライアントが先に更新している（412）
+    value = request.headers.get('If-Match')
+    if not value or value == '*':
+        return
+    current = _digest((kind, version), 24)
+    if not any(etag.strip('"').split('-')[0] == current for etag in parse_etags(value)):
+        raise ApiError(412, '他のクライアントによって更新されています。最新の内容を取得し直してください。')
+
+
+def is_id(value):
+    # JSON の値が主キーとして使える整数か（true / false は除く）
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def read_json(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ApiError(400, 'リクエスト本文が正しい JSON ではありません。')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'リクエスト本文は JSON オブジェクトで指定してください。')
+    return data
+
+
+def paginate(request, queryset):
+    return keyset_paginate(
+        queryset,
+        page_size=get_page_size(
+            request,
+            default=getattr(settings, 'API_PAGE_SIZE', 50),
+            maximum=getattr(settings, 'API_MAX_PAGE_SIZE', 500),
+        ),
+        after=parse_cursor(request.GET.get('after')),
+        before=parse_cursor(request.GET.get('before')),
+    )
+
+
+def page_payload(page, fields, available):
+    return {
+        'results': [serialize(obj, fields, available) for obj in page.items],
+        'next': page.next_cursor,          # 次ページの ?after= に指定する値
+        'previous': page.previous_cursor,  # 前ページの ?before= に指定する値
+    }
+
+
+def save_form(form_class, data, instance=None):
+    form = form_class(data, instance=instance)
+    if not form.is_valid():
+        raise ApiError(400, '入力内容に誤りがあります。', errors=form.errors.get_json_data())
+    try:
+        return form.save()
+    except IntegrityError:
+        # 検証の後、保存までの間に他のリクエストが同じ値（レッスンの表示順序など）を保存した
+        raise ApiError(409, CONFLICT_MESSAGE)
+
+
+def merged_data(instance, form_class, data):
+    # PATCH では指定されなかった項目を現在の値で補ってからフォームで検証する
+    current = {name: getattr(instance, f'{name}_id' if name == 'material' else name) for name in form_class.Meta.fields}
+    return {**current, **data}
+
+
+# ----------------------------------------
+# 教材
+# ----------------------------------------
+def material_queryset(fields):
+    queryset = Material.objects.only(*load_columns(fields, MATERIAL_FIELDS, 'id', 'version'))
+    # レッスン数は ETag にも含めるため常に付与する（レッスンの増減は教材の version を進めない）
+    return queryset.with_lesson_counts()
+
+
+def material_etag(obj):
+    return (obj.pk, obj.version, obj.lesson_count)
+
+
+@api_view('GET', 'POST')
+def material_list_api(request):
+    if request.method == 'POST':
+        material = save_form(MaterialForm, read_json(request))
+        material = material_queryset(list(MATERIAL_FIELDS)).get(pk=material.pk)
+        return JsonResponse(serialize(material, list(MATERIAL_FIELDS), MATERIAL_FIELDS), status=201)
+
+    fields = selected_fields(request, MATERIAL_FIELDS)
+    queryset = material_queryset(fields)
+    query = request.GET.get('q', '').strip()
+    if query:
+        queryset = queryset.filter(pk__in=matching_entries(query).filter(lesson__isnull=True).values('material_id'))
+    page = paginate(request, queryset)
+    etag = make_etag(
+        'materials', fields, query, page.previous_cursor, page.next_cursor, [material_etag(obj) for obj in page.items],
+    )
+    return conditional_json(request, etag, lambda: page_payload(page, fields, MATERIAL_FIELDS))
+
+
+@api_view('GET', 'PATCH')
+def material_detail_api(request, pk):
+    fields = selected_fields(request, MATERIAL_FIELDS)
+    material = material_queryset(list(MATERIAL_FIELDS) if request.method == 'PATCH' else fields).filter(pk=pk).first()
+    if material is None:
+        raise Http404
+
+    if request.method == 'PATCH':
+        check_if_match(request, 'material', material_etag(material))
+        save_form(MaterialForm, merged_data(material, MaterialForm, read_json(request)), instance=material)
+
+    etag = object_etag('material', fields, material_etag(material))
+    return conditional_json(request, etag, lambda: serialize(material, fields, MATERIAL_FIELDS))
+
+
+# ----------------------------------------
+# レッスン
+# ----------------------------------------
+def lesson_queryset(fields):
+    return Lesson.objects.only(*load_columns(fields, LESSON_FIELDS, 'id', 'version'))
+
+
+@api_view('GET', 'POST')
+def lesson_list_api(request):
+    if request.method == 'POST':
+        lesson = save_form(LessonForm, read_json(request))
+        return JsonResponse(serialize(lesson, list(LESSON_FIELDS), LESSON_FIELDS), status=201)
+
+    fields = selected_fields(request, LESSON_FIELDS)
+    queryset = lesson_queryset(fields)
+    material = request.GET.get('material')
+    if material is not None:
+        material_id = parse_cursor(material)
+        if material_id is None:
+            raise ApiError(400, 'material の指定が正しくありません。')
+        queryset = queryset.filter(material_id=material_id)
+    page = paginate(request, queryset)
+    etag = make_etag(
+        'lessons', fields, material, page.previous_cursor, page.next_cursor, [(obj.pk, obj.version) for obj in page.items],
+    )
+    return conditional_json(request, etag, lambda: page_payload(page, fields, LESSON_FIELDS))
+
+
+@api_view('GET', 'PATCH')
+def lesson_detail_api(request, pk):
+    fields = selected_fields(request, LESSON_FIELDS)
+    lesson = lesson_queryset(list(LESSON_FIELDS) if request.method == 'PATCH' else fields).filter(pk=pk).first()
+    if lesson is None:
+        raise Http404
+
+    if request.method == 'PATCH':
+        check_if_match(request, 'lesson', (lesson.pk, lesson.version))
+        save_form(LessonForm, merged_data(lesson, LessonForm, read_json(request)), instance=lesson)
+
+    etag = object_etag('lesson', fields, (lesson.pk, lesson.version))
+    return conditional_json(request, etag, lambda: serialize(lesson, fields, LESSON_FIELDS))
+
+
+@api_view('POST')
+def lesson_move_api(request, pk):
+    """
+    レッスンを同じ教材内の別のレッスンの直後（after）または直前（before）へ移動する。
+    更新するのは移動したレッスンの1行だけ（ordering.py）。
+    """
+    fields = list(LESSON_FIELDS)
+    lesson = lesson_queryset(fields).filter(pk=pk).first()
+    if lesson is None:
+        raise Http404
+    check_if_match(request, 'lesson', (lesson.pk, lesson.version))
+
+    data = read_json(request)
+    targets = {}
+    for key in ('after', 'before'):
+        if data.get(key) is None:
+            continue
+        # JSON の本文なので整数だけを受け付ける（1.5 などを丸めて別のレッスンの隣へ移動しないように）
+        if not is_id(data[key]):
+            raise ApiError(400, f'{key} にはレッスンの ID（整数）を指定してください: {data[key]!r}')
+        anchor = Lesson.objects.only('id', 'material_id', 'order').filter(pk=data[key]).first()
+        if anchor is None:
+            raise ApiError(400, f'{key} のレッスンが見つかりません。')
+        targets[key] = anchor
+    try:
+        move_lesson(lesson, **targets)
+    except OrderingError as exc:
+        raise ApiError(400, str(exc))
+    except IntegrityError:
+        raise ApiError(409, CONFLICT_MESSAGE)
+
+    etag = object_etag('lesson', fields, (lesson.pk, lesson.version))
+    return JsonResponse(serialize(lesson, fields, LESSON_FIELDS), headers={'ETag': etag})
+
+
+# ----------------------------------------
+# 進捗
+# ----------------------------------------
+@api_view('GET', 'POST')
+def progress_list_api(request):
+    if request.method == 'POST':
+        return progress_batch_create(request)
+
+    fields = selected_fields(request, PROGRESS_FIELDS)
+    # 進捗は管理画面でステータス・記録日が修正されるため、ETag の計算に使う列は常に読み込む
+    queryset = Progress.objects.for_user(request.user).only(
+        *load_columns(fields, PROGRESS_FIELDS, 'id', 'lesson_id', 'status', 'date')
+    )
+    lesson = request.GET.get('lesson')
+    if lesson is not None:
+        lesson_id = parse_cursor(lesson)
+        if lesson_id is None:
+            raise ApiError(400, 'lesson の指定が正しくありません。')
+        queryset = queryset.filter(lesson_id=lesson_id)
+    page = paginate(request, queryset)
+    # 進捗は version 列を持たないため、ページ内の行の内容そのものをバージョンとする
+    etag = make_etag(
+        'progress', request.user.pk, fields, lesson, page.previous_cursor, page.next_cursor,
+        [(obj.pk, obj.lesson_id, obj.status, obj.date) for obj in page.items],
+    )
+    return conditional_json(request, etag, lambda: page_payload(page, fields, PROGRESS_FIELDS))
+
+
+def progress_batch_create(request):
+    """
+    複数レッスンの進捗を1リクエストでまとめて登録する（1件でも不正なら何も登録しない）。
+    """
+    records = read_json(request).get('records')
+    limit = getattr(settings, 'API_PROGRESS_BATCH_LIMIT', 500)
+    if not isinstance(records, list) or not records:
+        raise ApiError(400, 'records に進捗のリストを指定してください。')
+    if len(records) > limit:
+        raise ApiError(400, f'一度に登録できる進捗は {limit} 件までです。')
+
+    # 対象レッスンの存在と教材を1クエリでまとめて確認する（ID が整数でないものは個別にエラーにする）
+    lesson_ids = {record['lesson'] for record in records if isinstance(record, dict) and is_id(record.get('lesson'))}
+    materials = dict(Lesson.objects.filter(pk__in=lesson_ids).values_list('id', 'material_id'))
+    statuses = {value for value, _ in Progress.STATUS_CHOICES}
+    today = timezone.localdate()
+
+    progresses = []
+    errors = {}
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors[index] = '進捗は JSON オブジェクトで指定してください。'
+            continue
+        if not is_id(record.get('lesson')) or record['lesson'] not in materials:
+            errors[index] = f"レッスンが見つかりません: {record.get('lesson')!r}"
+            continue
+        if not isinstance(record.get('status'), str) or record['status'] not in statuses:
+            errors[index] = f"ステータスが不正です: {record.get('status')!r}"
+            continue
+        try:
+            # オフラインで記録した進捗を後から送れるよう、記録日の指定を受け付ける（未来日は不可）
+            recorded = date.fromisoformat(record['date']) if record.get('date') else today
+        except (TypeError, ValueError):
+            errors[index] = f"date が不正です: {record.get('date')!r}"
+            continue
+        if recorded > today:
+            errors[index] = f'date に未来の日付は指定できません: {recorded.isoformat()}'
+            continue
+        progresses.append(Progress(user=request.user, lesson_id=record['lesson'], status=record['status'], date=recorded))
+    if errors:
+        raise ApiError(400, '登録できない進捗があります。', errors=errors)
+
+    # シャード化している場合、進捗はユーザーのシャードに登録する（変更履歴は default に記録する）
+    shard = Progress.objects.in_shard_of(request.user)
+    with transaction.atomic(using=shard.db):
+        created = shard.bulk_create(progresses)
+        changelog.record_progress(created, using=shard.db)
+        # 一括登録はシグナルを発行しないため、このユーザーの該当教材分のサマリと学習統計を作り直す
+        rebuild_summaries(user_ids=[request.user.pk], material_ids=set(materials[p.lesson_id] for p in progresses))
+        rebuild_learning_stats(user_ids=[request.user.pk])
+
+    return JsonResponse({
+        'created': len(created),
+        'results': [serialize(progress, list(PROGRESS_FIELDS), PROGRESS_FIELDS) for progress in created],
+    }, status=201)
+
+
+# ----------------------------------------
+# 差分同期
+# ----------------------------------------
+@api_view('GET')
+def sync_api(request):
+    """
+    前回の同期（?since=<token>）以降に変更された教材・レッスン・自分の進捗と、削除された行の ID を返す。
+
+    初回（since なし）や、履歴の保存期間を過ぎた token の場合は reset: true と現在の token だけを返す。
+    クライアントはこの token を控えてから一覧 API で全件を取得し直し、以降は token で差分を取得する。
+    has_more が true の間は、返された token で続けて取得する。
+    """
+    since = request.GET.get('since')
+    if since is None:
+        return JsonResponse({'reset': True, 'token': changelog.safe_token()})
+    token = parse_cursor(since)
+    if token is None:
+        raise ApiError(400, 'since の指定が正しくありません。')
+    if changelog.is_expired(token):
+        return JsonResponse({'reset': True, 'token': changelog.safe_token()})
+
+    limit = get_page_size(
+        request,
+        default=getattr(settings, 'SYNC_PAGE_SIZE', 1000),
+        maximum=getattr(settings, 'SYNC_MAX_PAGE_SIZE', 5000),
+        param='limit',
+    )
+    next_token, has_more, latest = changelog.changes_since(request.user, token, limit)
+    sources = (
+        ('materials', changelog.MATERIAL, material_queryset(list(MATERIAL_FIELDS)), MATERIAL_FIELDS),
+        ('lessons', changelog.LESSON, lesson_queryset(list(LESSON_FIELDS)), LESSON_FIELDS),
+        ('progress', changelog.PROGRESS, Progress.objects.for_user(request.user), PROGRESS_FIELDS),
+    )
+    payload = {'reset': False, 'token': next_token, 'has_more': has_more}
+    for name, kind, queryset, available in sources:
+        changed = [pk for pk, deleted in latest[kind].items() if not deleted]
+        # 変更された行の現在の内容を種別ごとに1クエリで読み込む（その後に削除された行は削除として扱う）
+        rows = list(queryset.filter(pk__in=changed).order_by('pk')) if changed else []
+        found = {row.pk for row in rows}
+        payload[name] = {
+            'updated': [serialize(row, list(available), available) for row in rows],
+            'deleted': sorted(pk for pk, deleted in latest[kind].items() if deleted or pk not in found),
+        }
+    return JsonResponse(payload)
@@ -0,0 +1,17 @@
+# apps/lessons/api_urls.py
+
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('materials/', api.material_list_api, name='material_list'),
+    path('materials/<int:pk>/', api.material_detail_api, name='material_detail'),
+    path('lessons/', api.lesson_list_api, name='lesson_list'),
+    path('lessons/<int:pk>/', api.lesson_detail_api, name='lesson_detail'),
+    path('lessons/<int:pk>/move/', api.lesson_move_api, name='lesson_move'),
+    path('progress/', api.progress_list_api, name='progress_list'),
+    path('sync/', api.sync_api, name='sync'),
+]
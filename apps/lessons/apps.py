@@ -6,4 +6,8 @@ from django.utils.translation import gettext_lazy as _  # 翻訳対応可能に
 class LessonsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.lessons'
-    verbose_name = _("レッスン管理")  # ← ここが管理画面に表示されるアプリ名になります
\ No newline at end of file
+    verbose_name = _("レッスン管理")  # ← ここが管理画面に表示されるアプリ名になります
+
+    def ready(self):
+        # シグナルハンドラ（進捗サマリの差分更新など）を登録
+        from . import signals  # noqa: F401
@@ -0,0 +1,91 @@
+# apps/lessons/async_views.py
+
+'''
+閲覧系ビュー（教材一覧・教材詳細・レッスン詳細・ホーム）の非同期版。
+
+ASGI（uvicorn 等）で動かす場合、同期ビューはリクエストごとにスレッドへ受け渡されるため、
+同時接続数が多いとスレッドの切り替えが律速になる。ここでは Django の非同期 ORM / キャッシュ API を使い、
+イベントループ上でそのまま処理する。settings.LESSONS_ASYNC_VIEWS = True で urls.py から切り替わる。
+クエリの内容・件数と表示内容は views.py の同期版と同じ。
+'''
+
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+
+from .caching import alesson_snapshot, amaterial_snapshot
+from .models import LearningStats
+from .pagination import akeyset_paginate, parse_cursor
+from .views import (
+    apply_done_counts,
+    dashboard_context,
+    dashboard_summaries,
+    done_count_rows,
+    material_detail_context,
+    material_list_page_size,
+    material_list_queryset,
+    material_progress,
+)
+
+
+async def _resolve_user(request):
+    # request.user は参照時に同期的にDBへアクセスするため、非同期に取得した値で置き換えておく
+    # （テンプレートのヘッダーで user を参照しても、イベントループ上で同期クエリが走らないようにする）
+    request.user = await request.auser()
+    return request.user
+
+
+# ----------------------------------------
+# 教材一覧（非同期版）
+# ----------------------------------------
+@login_required
+async def material_list_view(request):
+    user = await _resolve_user(request)
+    page_size = material_list_page_size(request)
+    page = await akeyset_paginate(
+        material_list_queryset(user),
+        page_size=page_size,
+        after=parse_cursor(request.GET.get('after')),    # 「次へ」のカーソル
+        before=parse_cursor(request.GET.get('before')),  # 「前へ」のカーソル
+    )
+    done_counts = done_count_rows(user, page.items)
+    if done_counts is not None:
+        apply_done_counts(page.items, [row async for row in done_counts])
+    return render(request, 'material_list.html', {
+        'materials': page.items,
+        'page': page,
+        'page_size': page_size,
+    })
+
+
+# ----------------------------------------
+# 教材詳細（非同期版）
+# ----------------------------------------
+@login_required
+async def material_detail_view(request, pk):
+    user = await _resolve_user(request)
+    snapshot = await amaterial_snapshot(pk)  # 教材が存在しなければ404
+    statuses = await material_progress(user, snapshot).alatest_statuses()
+    return render(request, 'material_detail.html', material_detail_context(snapshot, statuses))
+
+
+# ----------------------------------------
+# レッスン詳細（非同期版）
+# ----------------------------------------
+@login_required
+async def lesson_detail_view(request, pk):
+    await _resolve_user(request)
+    lesson = await alesson_snapshot(pk)  # レッスンが存在しなければ404
+    return render(request, 'lesson_detail.html', {
+        'lesson': lesson
+    })
+
+
+# ----------------------------------------
+# ホーム画面（非同期版）
+# ----------------------------------------
+@login_required
+async def home(request):
+    user = await _resolve_user(request)
+    stats = await LearningStats.objects.for_user(user).afirst()  # 未記録のユーザーは None
+    summaries = [summary async for summary in dashboard_summaries(user)]
+    return render(request, 'home.html', dashboard_context(stats, summaries))
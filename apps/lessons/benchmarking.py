@@ -0,0 +1,136 @@
+# apps/lessons/benchmarking.py
+
+'''
+ベンチマーク用の共通処理（管理コマンドから利用）。
+
+開発用DBを汚さないよう、テスト用DB（マイグレーション適用済み）を一時的に作成して計測し、
+終了後に破棄する。SQLite の場合は既定でメモリ上に作成される。
+'''
+
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from operator import attrgetter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+from django.utils import timezone
+
+from apps.shards.routers import by_shard
+
+from .models import Lesson, Material, Progress
+from .search import rebuild_index
+from .summaries import rebuild_learning_stats, rebuild_summaries
+
+
+@contextmanager
+def scratch_database(alias='default', name=None, verbosity=0):
+    """
+    計測用の一時DBを作成し、with ブロックの間だけ接続先を切り替える。
+    name を指定すると SQLite でもファイルとして作成する（大量データ・複数プロセス用）。
+    シャーディングが有効な場合は、各シャードの一時DBも作成する。
+    """
+    connection = connections[alias]
+    old_name = connection.settings_dict['NAME']
+    if name:
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = name
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    shards = {
+        shard: connections[shard].settings_dict['NAME'] for shard in getattr(settings, 'DB_SHARDS', []) if shard != alias
+    }
+    for shard in shards:
+        connections[shard].creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    # レプリカ（TEST.MIRROR が alias の接続）も一時DBを読むように切り替える
+    mirrors = {
+        other.alias: other.settings_dict['NAME'] for other in connections.all()
+        if other.settings_dict.get('TEST', {}).get('MIRROR') == alias
+    }
+    for mirror in mirrors:
+        connections[mirror].close()
+        connections[mirror].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        yield connection
+    finally:
+        for mirror, mirror_name in mirrors.items():
+            connections[mirror].close()
+            connections[mirror].settings_dict['NAME'] = mirror_name
+        for shard, shard_name in shards.items():
+            connections[shard].creation.destroy_test_db(shard_name, verbosity=verbosity)
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def measure(func, repeat):
+    """
+    func を repeat 回実行し、所要時間（ミリ秒）の中央値と p95 を返す。
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'median': statistics.median(samples),
+        'p95': percentile(samples, 95),
+    }
+
+
+def percentile(samples, pct):
+    """
+    最近傍法によるパーセンタイル（サンプル数が少なくても必ず実測値を返す）。
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def seed_dataset(users=50, materials=20, lessons_per_material=20, progress_per_user=100, password='password', seed=1):
+    """
+    計測用のユーザー・教材・レッスン・進捗を一括投入し、サマリ・学習統計・検索インデックスも作成する。
+    全ユーザーのパスワードは password（ハッシュ計算は1回だけ行う）。
+    戻り値は作成したユーザーのリスト。
+    """
+    rng = random.Random(seed)
+    User = get_user_model()
+    hashed = make_password(password)
+    created_users = User.objects.bulk_create([
+        User(
+            username=f'learner{i}', email=f'learner{i}@example.com', password=hashed,
+            # bulk_create では save() が呼ばれないため検索用の列も設定する
+            username_normalized=f'learner{i}', email_normalized=f'learner{i}@example.com',
+        )
+        for i in range(users)
+    ])
+    created_materials = Material.objects.bulk_create([
+        Material(title=f'教材{i}', description=f'教材{i}の説明') for i in range(materials)
+    ])
+    Lesson.objects.bulk_create([
+        Lesson(material=material, title=f'{material.title} レッスン{j}', order=j)
+        for material in created_materials
+        for j in range(lessons_per_material)
+    ])
+    lesson_ids = list(Lesson.objects.values_list('id', flat=True))
+    statuses = [value for value, _ in Progress.STATUS_CHOICES]
+    today = timezone.localdate()
+    progresses = [
+        Progress(
+            user=user,
+            lesson_id=rng.choice(lesson_ids),
+            status=rng.choice(statuses),
+            date=today - timedelta(days=rng.randrange(60)),
+        )
+        for user in created_users
+        for _ in range(progress_per_user)
+    ]
+    # 進捗はユーザーのシャードに登録する（シャード化していなければ全て default）
+    for shard, shard_progresses in by_shard(progresses, key=attrgetter('user_id')).items():
+        Progress.objects.using(shard).bulk_create(shard_progresses, batch_size=5000)
+    rebuild_summaries()
+    rebuild_learning_stats()
+    rebuild_index()
+    return created_users
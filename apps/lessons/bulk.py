@@ -0,0 +1,121 @@
+# apps/lessons/bulk.py
+
+'''
+管理画面の一括操作（進捗のステータス変更・レッスンの付け替え・削除、教材の複製）。
+削除以外はバックグラウンドジョブ（tasks.py）から実行する。
+
+1件ずつ save() すると行数分のクエリとシグナル処理が走るため、
+主キー順に chunk_size 件ずつ QuerySet.update() / bulk_create() でまとめて書き込み、チャンクごとにコミットする
+（数十万件の対象でも1つの長いトランザクションで表をロックし続けないように）。
+シグナルを経由しないため、変更履歴・検索インデックス・進捗サマリ・学習統計はここで更新する。
+progress には処理済みの件数を受け取る関数を渡せる（ジョブの状態ページでの進み具合の表示用）。
+'''
+
+from django.conf import settings
+from django.db import transaction
+
+from . import caching, changelog, search
+from .exports import chunked
+from .models import Lesson, Material, Progress
+from .summaries import apply_status_changes, latest_statuses, rebuild_learning_stats, rebuild_summaries
+
+# 複製した教材のタイトルに付ける接尾辞
+COPY_SUFFIX = '（コピー）'
+
+
+def get_chunk_size():
+    # 1トランザクションで書き込む件数
+    return getattr(settings, 'ADMIN_BULK_CHUNK_SIZE', 5000)
+
+
+def update_progress(queryset, *, progress=None, chunk_size=None, **values):
+    """
+    queryset の進捗を values の内容で更新し、更新した件数を返す。
+
+    対象の主キーを chunk_size 件ずつ読み出して QuerySet.update() で更新する（既に values のとおりの行は書き込まない）。
+    更新した行が queryset の条件から外れても、主キーの続きから読むため取りこぼしや重複はない。
+    最後に、対象のユーザーの進捗サマリ・学習統計を作り直す（更新後の最新ステータスを反映する）。
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    updated = 0
+    user_ids = set()
+    rows = queryset.exclude(**values).order_by('pk').values_list('pk', 'user_id')
+    # queryset と同じ DB（管理画面で選んだシャード）の行を更新する
+    progresses = Progress.objects.using(rows.db)
+    last_id = 0
+    while chunk := list(rows.filter(pk__gt=last_id)[:chunk_size]):
+        last_id = chunk[-1][0]
+        with transaction.atomic(using=rows.db):
+            updated += progresses.filter(pk__in=[pk for pk, _ in chunk]).update(**values)
+            changelog.record_progress_rows(chunk, using=rows.db)
+        user_ids.update(user_id for _, user_id in chunk)
+        if progress:
+            progress(updated)
+
+    for chunk in chunked(sorted(user_ids), 500):
+        rebuild_summaries(user_ids=chunk)
+        rebuild_learning_stats(user_ids=chunk)
+    return updated
+
+
+def delete_progress(queryset, *, chunk_size=None):
+    """
+    queryset の進捗を削除し、QuerySet.delete() と同じ形の (削除した件数, {モデル: 件数}) を返す。
+
+    主キー順に chunk_size 件ずつ削除し、チャンクごとに、削除した行のユーザー×レッスンについて
+    削除前後の最新ステータスを読み比べ、変わった分だけをサマリへまとめて反映する（行ごとの再構築はしない）。
+    学習統計（連続学習日数など）は差分では戻せないため、最後に対象のユーザーの分だけを作り直す。
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    rows = queryset.order_by('pk').values_list('pk', 'user_id', 'lesson_id')
+    alias = rows.db
+    deleted = 0
+    user_ids = set()
+    last_id = 0
+    while chunk := list(rows.filter(pk__gt=last_id)[:chunk_size]):
+        last_id = chunk[-1][0]
+        pairs = {(user_id, lesson_id) for _, user_id, lesson_id in chunk}
+        lesson_materials = dict(
+            Lesson.objects.filter(pk__in={lesson_id for _, lesson_id in pairs}).values_list('pk', 'material_id')
+        )
+        with transaction.atomic(using=alias):
+            before = latest_statuses(alias, pairs)
+            deleted += Progress.objects.using(alias).filter(pk__in=[pk for pk, _, _ in chunk])._raw_delete(alias)
+            after = latest_statuses(alias, pairs)
+            apply_status_changes(alias, [
+                (user_id, lesson_materials[lesson_id], before.get((user_id, lesson_id)), after.get((user_id, lesson_id)))
+                for user_id, lesson_id in pairs
+                if lesson_id in lesson_materials
+            ])
+            changelog.record_progress_rows([(pk, user_id) for pk, user_id, _ in chunk], deleted=True, using=alias)
+        user_ids.update(user_id for _, user_id in pairs)
+
+    for chunk in chunked(sorted(user_ids), 500):
+        rebuild_learning_stats(user_ids=chunk)
+    return deleted, {Progress._meta.label: deleted}
+
+
+def duplicate_material(material, *, progress=None, chunk_size=None):
+    """
+    教材を全てのレッスンとともに複製し、(複製した教材, 複製したレッスン数) を返す。
+
+    途中で失敗した場合に中途半端な教材が残らないよう、1つの教材の複製は1トランザクションで行い、
+    レッスンは表示順序を保ったまま chunk_size 件ずつ bulk_create() で登録する。進捗は複製しない。
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    title = material.title[:Material._meta.get_field('title').max_length - len(COPY_SUFFIX)] + COPY_SUFFIX
+    rows = Lesson.objects.filter(material=material).order_by('order').values_list('title', 'order')
+    created = 0
+    with transaction.atomic():
+        # 教材の変更履歴・検索インデックスは保存時のシグナルで登録される
+        copy = Material.objects.create(title=title, description=material.description)
+        for chunk in chunked(rows.iterator(chunk_size=chunk_size), chunk_size):
+            lessons = Lesson.objects.bulk_create([Lesson(material=copy, title=t, order=order) for t, order in chunk])
+            changelog.record_many(changelog.LESSON, [lesson.pk for lesson in lessons])
+            search.index_new_lessons(lessons)
+            created += len(lessons)
+            if progress:
+                progress(created)
+    # コミット前の（レッスンのない）状態がキャッシュされないよう、登録後にキャッシュを無効化する
+    caching.bump_material_version(copy.pk)
+    return copy, created
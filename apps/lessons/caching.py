@@ -0,0 +1,233 @@
+# apps/lessons/caching.py
+
+'''
+教材詳細・レッスン詳細ページの共通部分（全ユーザーで同じ内容）のキャッシュ。
+
+キャッシュキーには教材ごとのバージョン番号を含め、教材・レッスンの保存/削除時に
+シグナルからバージョンを進めることで、古いキャッシュを削除せずに即時無効化する。
+バージョンはトランザクションのコミット後に進める（コミット前に進めると、同時に表示したリクエストが
+コミット前の内容を新しいバージョンでキャッシュし、タイムアウトまで古い内容が表示され続けるため）。
+同じ理由で、キャッシュに保存する内容は必ずバージョンを読んだ後に DB から読む。
+利用するキャッシュは settings.LESSONS_CACHE_ALIAS（既定は 'default'）で切り替えられる。
+非同期ビュー用に、a で始まる同じ処理の非同期版（amaterial_snapshot など）も用意している。
+'''
+
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from .models import Lesson, Material
+
+
+def get_cache():
+    return caches[getattr(settings, 'LESSONS_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'LESSONS_CACHE_TIMEOUT', 60 * 60)
+
+
+def _version_key(material_id):
+    return f'lessons:material:{material_id}:version'
+
+
+def _lesson_material_key(lesson_id):
+    return f'lessons:lesson:{lesson_id}:material'
+
+
+def _material_snapshot_key(material_id, version):
+    return f'lessons:material:{material_id}:v{version}'
+
+
+def _lesson_snapshot_key(lesson_id, version):
+    return f'lessons:lesson:{lesson_id}:v{version}'
+
+
+def _initial_version():
+    # 初期値は現在時刻（ミリ秒）。バージョンのキーがキャッシュから追い出されても
+    # 作り直した値は以前の値より大きくなるため、古い内容を参照することはない
+    return time.time_ns() // 1_000_000
+
+
+# ----------------------------------------
+# バージョン管理
+# ----------------------------------------
+def material_version(material_id):
+    """
+    教材の現在のキャッシュバージョンを返す（未登録なら初期化する）。
+    """
+    cache = get_cache()
+    key = _version_key(material_id)
+    version = cache.get(key)
+    if version is None:
+        version = _initial_version()
+        if not cache.add(key, version, timeout=None):
+            # 同時に他のリクエストが初期化した場合はその値を使う
+            version = cache.get(key, version)
+    return version
+
+
+def bump_material_version(material_id, using=DEFAULT_DB_ALIAS):
+    """
+    教材のバージョンを進め、その教材に属するキャッシュをまとめて無効化する。
+    using の DB のトランザクション中に呼ばれた場合はコミット後に進める（ロールバックされた場合は進めない）。
+    """
+    transaction.on_commit(partial(_bump_material_version, material_id), using=using)
+
+
+def _bump_material_version(material_id):
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(material_id))
+    except ValueError:
+        # キーが存在しない（未使用・追い出し済み）場合は新しい初期値を設定
+        cache.set(_version_key(material_id), _initial_version(), timeout=None)
+
+
+def forget_lesson(lesson_id, using=DEFAULT_DB_ALIAS):
+    """
+    レッスン → 教材の対応のキャッシュを削除する（レッスンの移動・削除時。bump_material_version() と同じくコミット後）。
+    """
+    transaction.on_commit(partial(get_cache().delete, _lesson_material_key(lesson_id)), using=using)
+
+
+# ----------------------------------------
+# ページ共通部分のスナップショット
+# ----------------------------------------
+def material_snapshot(material_id):
+    """
+    教材とレッスン一覧（ユーザーに依存しない部分）を dict で返す。
+    キャッシュにあればDBにはアクセスしない。教材が存在しなければ Http404。
+    """
+    cache = get_cache()
+    key = _material_snapshot_key(material_id, material_version(material_id))
+    snapshot = cache.get(key)
+    if snapshot is None:
+        material = get_object_or_404(_material_queryset(), pk=material_id)
+        snapshot = _build_material_snapshot(material, _lesson_rows(material))
+        cache.set(key, snapshot, get_timeout())
+    return snapshot
+
+
+def lesson_snapshot(lesson_id):
+    """
+    レッスンと所属教材のタイトルを dict で返す。
+    レッスン → 教材の対応もキャッシュし、教材のバージョンで内容の鮮度を判定する。
+    """
+    cache = get_cache()
+    material_id = cache.get(_lesson_material_key(lesson_id))
+    if material_id is None:
+        # 教材が分からなければ、先に教材のIDだけを読む
+        material_id = _lesson_material_ids(lesson_id).first()
+        if material_id is None:
+            raise Http404('レッスンが見つかりません。')
+        cache.set(_lesson_material_key(lesson_id), material_id, get_timeout())
+    # material_snapshot() と同じく、バージョンは DB から内容を読む前に読む
+    # （読んだ後に読むと、その間にコミットされた変更の前の内容を新しいバージョンで保存してしまう）
+    key = _lesson_snapshot_key(lesson_id, material_version(material_id))
+    snapshot = cache.get(key)
+    if snapshot is None:
+        lesson = get_object_or_404(_lesson_queryset(), pk=lesson_id)
+        snapshot = _build_lesson_snapshot(lesson)
+        if lesson.material_id == material_id:
+            # 教材のIDを読んだ後に別の教材へ移動していれば、移動先のバージョンで保存されるよう次回に任せる
+            cache.set(key, snapshot, get_timeout())
+    return snapshot
+
+
+# キャッシュは全員で共有するため、レプリカへの反映の遅れで古い内容を新しいバージョンで保存しないよう primary から読む
+# （読み込むのはキャッシュがない時だけ。教材のレッスンはインスタンスと同じ DB から読まれる）
+def _material_queryset():
+    return Material.objects.using(DEFAULT_DB_ALIAS).only('id', 'title', 'description')
+
+
+def _lesson_rows(material):
+    return material.lessons.values_list('id', 'title', 'order')
+
+
+def _lesson_material_ids(lesson_id):
+    return Lesson.objects.using(DEFAULT_DB_ALIAS).filter(pk=lesson_id).values_list('material_id', flat=True)
+
+
+def _lesson_queryset():
+    return Lesson.objects.using(DEFAULT_DB_ALIAS).select_related('material').only('id', 'title', 'order', 'material__id', 'material__title')
+
+
+def _build_material_snapshot(material, lesson_rows):
+    return {
+        'material': {'pk': material.pk, 'title': material.title, 'description': material.description},
+        'lessons': [{'pk': pk, 'title': title, 'order': order} for pk, title, order in lesson_rows],
+    }
+
+
+def _build_lesson_snapshot(lesson):
+    return {
+        'pk': lesson.pk,
+        'title': lesson.title,
+        'order': lesson.order,
+        'material_id': lesson.material_id,
+        'material_title': lesson.material.title,
+    }
+
+
+# ----------------------------------------
+# 非同期版（非同期ビュー用）
+# ----------------------------------------
+async def amaterial_version(material_id):
+    """
+    material_version() の非同期版。
+    """
+    cache = get_cache()
+    key = _version_key(material_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = _initial_version()
+        if not await cache.aadd(key, version, timeout=None):
+            version = await cache.aget(key, version)
+    return version
+
+
+async def amaterial_snapshot(material_id):
+    """
+    material_snapshot() の非同期版。
+    """
+    cache = get_cache()
+    key = _material_snapshot_key(material_id, await amaterial_version(material_id))
+    snapshot = await cache.aget(key)
+    if snapshot is None:
+        try:
+            material = await _material_queryset().aget(pk=material_id)
+        except Material.DoesNotExist:
+            raise Http404('教材が見つかりません。')
+        snapshot = _build_material_snapshot(material, [row async for row in _lesson_rows(material)])
+        await cache.aset(key, snapshot, get_timeout())
+    return snapshot
+
+
+async def alesson_snapshot(lesson_id):
+    """
+    lesson_snapshot() の非同期版。
+    """
+    cache = get_cache()
+    material_id = await cache.aget(_lesson_material_key(lesson_id))
+    if material_id is None:
+        material_id = await _lesson_material_ids(lesson_id).afirst()
+        if material_id is None:
+            raise Http404('レッスンが見つかりません。')
+        await cache.aset(_lesson_material_key(lesson_id), material_id, get_timeout())
+    key = _lesson_snapshot_key(lesson_id, await amaterial_version(material_id))
+    snapshot = await cache.aget(key)
+    if snapshot is None:
+        try:
+            lesson = await _lesson_queryset().aget(pk=lesson_id)
+        except Lesson.DoesNotExist:
+            raise Http404('レッスンが見つかりません。')
+        snapshot = _build_lesson_snapshot(lesson)
+        if lesson.material_id == material_id:
+            await cache.aset(key, snapshot, get_timeout())
+    return snapshot
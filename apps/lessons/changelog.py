@@ -0,0 +1,160 @@
+# apps/lessons/changelog.py
+
+'''
+差分同期（/api/sync/）用の変更履歴（ChangeLogEntry）の記録と読み出し。
+
+- 1件ずつの保存・削除は signals.py から record() / record_many() で記録する
+- bulk_create や executemany による一括登録はシグナルを発行しないため、
+  呼び出し側で record_progress() / record_progress_since() などを呼び出すこと
+- どの関数も、変更した行のトランザクション（using の DB）のコミット後に、履歴だけを短いトランザクションで登録する
+  （一括登録の長いトランザクションの中で採番すると、コミットまでの間に後の番号が先に見え、
+  safe_token() の前提（採番から CHANGELOG_SYNC_DELAY 秒以内にコミットされる）が崩れるため）。
+  ロールバックされた変更は記録されない（コミット直後にプロセスが停止した場合は、その変更の記録も失われる）。
+  履歴より先に変更が見えても、後から登録される履歴の番号はそれまでに渡した番号より大きいため、次の同期で受け取れる
+- 教材の削除に伴うレッスン・進捗の削除、レッスンの削除に伴う進捗の削除（CASCADE）は個別に記録しない。
+  クライアントは削除された教材・レッスンに属する行をあわせて削除する（大量の連鎖削除で履歴が膨らまないように）
+- 変更番号（主キー）は INSERT 時に採番されるため、コミットの順とは一致しない（PostgreSQL では番号 N のコミット前に
+  N + 1 が見えることがある）。クライアントに渡す変更番号は CHANGELOG_SYNC_DELAY 秒より前に記録した履歴までとし、
+  まだコミットされていない履歴を通り過ぎないようにする（safe_token()）
+'''
+
+import heapq
+from datetime import timedelta
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import ChangeLogEntry, Progress
+
+MATERIAL = ChangeLogEntry.KIND_MATERIAL
+LESSON = ChangeLogEntry.KIND_LESSON
+PROGRESS = ChangeLogEntry.KIND_PROGRESS
+
+
+def _after_commit(using, func, *args, **kwargs):
+    # using の DB のトランザクション中ならコミット後に、そうでなければその場で実行する
+    transaction.on_commit(partial(func, *args, **kwargs), using=using)
+
+
+def _insert(entries, chunk_size=None):
+    # 変更履歴は常に default に記録する（using は変更した行の DB）
+    ChangeLogEntry.objects.bulk_create(entries, batch_size=chunk_size)
+
+
+def record(kind, object_id, user_id=None, deleted=False, using=DEFAULT_DB_ALIAS):
+    _after_commit(using, _insert, [ChangeLogEntry(kind=kind, object_id=object_id, user_id=user_id, deleted=deleted)])
+
+
+def record_many(kind, object_ids, deleted=False, using=DEFAULT_DB_ALIAS):
+    # 教材・レッスン（全員に共通）の変更をまとめて記録する
+    entries = [ChangeLogEntry(kind=kind, object_id=object_id, deleted=deleted) for object_id in object_ids]
+    _after_commit(using, _insert, entries)
+
+
+def record_progress(progresses, chunk_size=5000, using=DEFAULT_DB_ALIAS):
+    # bulk_create した進捗（主キー設定済み）の登録を記録する
+    entries = [ChangeLogEntry(kind=PROGRESS, object_id=p.pk, user_id=p.user_id) for p in progresses]
+    _after_commit(using, _insert, entries, chunk_size)
+
+
+def record_progress_rows(rows, chunk_size=5000, deleted=False, using=DEFAULT_DB_ALIAS):
+    # QuerySet.update() で更新した（deleted なら削除した）進捗（(主キー, ユーザーID) の組）の変更を記録する
+    entries = [ChangeLogEntry(kind=PROGRESS, object_id=pk, user_id=user_id, deleted=deleted) for pk, user_id in rows]
+    _after_commit(using, _insert, entries, chunk_size)
+
+
+def record_progress_since(last_id, chunk_size=5000, using=DEFAULT_DB_ALIAS):
+    """
+    主キーが last_id より大きい進捗の登録を記録する（主キーを返さない一括INSERTの後に使用）。
+    同時に他の処理が登録した進捗が含まれても、同期時に重複はまとめられるため問題ない。
+    using は進捗を登録したシャード。登録した進捗は、そのトランザクションのコミット後に読み出して記録する。
+    """
+    _after_commit(using, _record_progress_since, last_id, chunk_size, using)
+
+
+def _record_progress_since(last_id, chunk_size, using):
+    rows = Progress.objects.using(using).filter(pk__gt=last_id).order_by('pk').values_list('pk', 'user_id')
+    batch = []
+    for pk, user_id in rows.iterator(chunk_size=chunk_size):
+        batch.append(ChangeLogEntry(kind=PROGRESS, object_id=pk, user_id=user_id))
+        if len(batch) >= chunk_size:
+            ChangeLogEntry.objects.bulk_create(batch)
+            batch = []
+    ChangeLogEntry.objects.bulk_create(batch)
+
+
+def current_token():
+    # 現在の最新の変更番号（変更が1件もなければ 0）
+    return ChangeLogEntry.objects.aggregate(token=Max('pk'))['token'] or 0
+
+
+def safe_token():
+    """
+    クライアントに渡せる最新の変更番号：CHANGELOG_SYNC_DELAY 秒より前に記録した履歴の最大の番号（なければ 0）。
+    履歴は変更のコミット後に短いトランザクションで登録する（変更の処理時間に関係なく、採番からすぐにコミットされる）ため、
+    CHANGELOG_SYNC_DELAY 秒より前に採番された履歴は、この番号を渡す時点で必ず見えている。
+    新しい順に主キーを読み、直近 CHANGELOG_SYNC_DELAY 秒の分を読み飛ばすだけで求まる。
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'CHANGELOG_SYNC_DELAY', 10))
+    return (
+        ChangeLogEntry.objects.filter(recorded_at__lt=cutoff).order_by('-pk').values_list('pk', flat=True).first()
+        or 0
+    )
+
+
+def is_expired(token):
+    """
+    token の直後の履歴が prune() で削除済みかどうか。
+    削除済みなら差分では追いつけないため、クライアントは全件を取得し直す必要がある。
+    （prune() は最新の1件を必ず残すため、残っている最小の番号より前は削除済みと判断できる）
+    """
+    oldest = ChangeLogEntry.objects.aggregate(oldest=Min('pk'))['oldest']
+    return oldest is not None and token < oldest - 1
+
+
+def changes_since(user, token, limit):
+    """
+    token より後、safe_token() までの変更を最大 limit 件（履歴の行数）読み出し、
+    (次回の変更番号, 続きがあるか, {種別: {ID: 削除されたか}}) を返す。
+
+    同じ行への複数回の変更は最後の1件にまとめる。進捗はログインユーザー自身のものだけを対象とする。
+    全員に共通の履歴（user IS NULL）と自分の履歴を (user, id) のインデックスで別々に読み、番号順に併合する
+    （OR の条件では他のユーザーの履歴まで走査するため）。
+    """
+    horizon = safe_token()
+    if token >= horizon:
+        return token, False, {MATERIAL: {}, LESSON: {}, PROGRESS: {}}
+    entries = ChangeLogEntry.objects.filter(pk__gt=token, pk__lte=horizon).order_by('pk')
+    columns = ('pk', 'kind', 'object_id', 'deleted')
+    shared = list(entries.filter(user__isnull=True).values_list(*columns)[:limit + 1])
+    own = list(entries.filter(user=user).values_list(*columns)[:limit + 1])
+    entries = list(islice(heapq.merge(shared, own), limit + 1))
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    # 続きがなければ、自分に関係のない履歴の分も含めて safe_token() まで進める
+    next_token = entries[-1][0] if has_more else horizon
+
+    latest = {MATERIAL: {}, LESSON: {}, PROGRESS: {}}
+    for _, kind, object_id, deleted in entries:
+        latest[kind][object_id] = deleted
+    return next_token, has_more, latest
+
+
+def prune(days=None):
+    """
+    days 日（省略時は CHANGELOG_RETENTION_DAYS）より前の変更履歴を削除し、削除した件数を返す。
+    """
+    if days is None:
+        days = getattr(settings, 'CHANGELOG_RETENTION_DAYS', 30)
+    cutoff = timezone.now() - timedelta(days=days)
+    last = ChangeLogEntry.objects.filter(recorded_at__lt=cutoff).aggregate(last=Max('pk'))['last']
+    if last is None:
+        return 0
+    # 最新の1件は残す（is_expired() が削除済みの範囲を判断できるように）
+    last = min(last, current_token() - 1)
+    deleted, _ = ChangeLogEntry.objects.filter(pk__lte=last).delete()
+    return deleted
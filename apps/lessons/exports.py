@@ -0,0 +1,180 @@
+# apps/lessons/exports.py
+
+'''
+進捗（Progress）の CSV / JSONL 形式での入出力。
+
+行はすべてジェネレータで1件ずつ受け渡すため、件数に関係なくメモリ使用量は一定に保たれる。
+エクスポートは管理コマンド（export_progress）とダウンロード用ビュー（progress_export_view）から利用する。
+'''
+
+import csv
+import io
+import json
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+
+from apps.shards.routers import sharding_enabled
+
+from .models import Lesson
+
+# 出力する列（インポート時は user_email / lesson_id / status / date を使用し、他は参考情報として無視する）
+EXPORT_FIELDS = ['user_email', 'lesson_id', 'lesson_title', 'material_title', 'status', 'date']
+
+FORMATS = ('csv', 'jsonl')
+
+# ダウンロード時の形式ごとの Content-Type と拡張子
+CONTENT_TYPES = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+}
+
+
+def guess_format(path, default='csv'):
+    """
+    ファイル名の拡張子から形式を推測する（.jsonl / .ndjson → jsonl）。
+    """
+    if path and path.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return default
+
+
+# ----------------------------------------
+# エクスポート
+# ----------------------------------------
+def progress_rows(queryset, chunk_size=2000):
+    """
+    進捗をレッスン・教材のタイトル付きの dict として1件ずつ返す。
+    関連テーブルは JOIN で同時に取得し、.iterator() でサーバー側から分割して読み出す。
+    """
+    if sharding_enabled():
+        yield from _sharded_progress_rows(queryset, chunk_size)
+        return
+    values = queryset.order_by('id').values_list(
+        'user__email', 'lesson_id', 'lesson__title', 'lesson__material__title', 'status', 'date'
+    )
+    for row in values.iterator(chunk_size=chunk_size):
+        record = dict(zip(EXPORT_FIELDS, row))
+        record['date'] = record['date'].isoformat()
+        yield record
+
+
+def _sharded_progress_rows(queryset, chunk_size):
+    # シャード上の進捗からはユーザー・レッスンを JOIN できないため、chunk_size 件ごとにまとめて読み込んで対応付ける
+    values = queryset.order_by('id').values_list('user_id', 'lesson_id', 'status', 'date')
+    for chunk in chunked(values.iterator(chunk_size=chunk_size), chunk_size):
+        emails = dict(
+            get_user_model().objects.filter(pk__in={row[0] for row in chunk}).values_list('pk', 'email')
+        )
+        lessons = {
+            pk: (title, material_title)
+            for pk, title, material_title in Lesson.objects.filter(pk__in={row[1] for row in chunk}).values_list(
+                'pk', 'title', 'material__title'
+            )
+        }
+        for user_id, lesson_id, status, date in chunk:
+            if user_id not in emails or lesson_id not in lessons:
+                continue  # 削除済みのユーザー・レッスンの行（JOIN と同様に出力しない）
+            yield dict(zip(EXPORT_FIELDS, (emails[user_id], lesson_id, *lessons[lesson_id], status, date.isoformat())))
+
+
+def iter_csv(rows):
+    """
+    dict の行をヘッダー付き CSV の文字列（1行ずつ）に変換する。
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value
+
+    writer.writeheader()
+    yield flush()
+    for row in rows:
+        writer.writerow(row)
+        yield flush()
+
+
+def iter_jsonl(rows):
+    """
+    dict の行を JSON Lines（1行1オブジェクト）の文字列に変換する。
+    """
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def serialize(rows, fmt):
+    """
+    形式名（csv / jsonl）に応じたシリアライザで行を文字列化する。
+    """
+    if fmt == 'jsonl':
+        return iter_jsonl(rows)
+    return iter_csv(rows)
+
+
+def buffered(chunks, size=64 * 1024):
+    """
+    細かい文字列をおよそ size バイト単位にまとめて返す。
+    1行ごとにソケットへ書き込むとシステムコールが増えるため、レスポンス送信時に利用する。
+    """
+    parts = []
+    length = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(parts)
+            parts = []
+            length = 0
+    if parts:
+        yield ''.join(parts)
+
+
+# ----------------------------------------
+# インポート
+# ----------------------------------------
+def chunked(iterable, size):
+    """
+    イテラブルを size 件ずつのリストに区切って返す（最後のリストは size 未満の場合あり）。
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def read_rows(stream, fmt, on_error=None):
+    """
+    テキストストリームから dict の行を1件ずつ読み出す（on_error は numbered_rows() と同じ）。
+    """
+    for _, row in numbered_rows(stream, fmt, on_error):
+        yield row
+
+
+def numbered_rows(stream, fmt, on_error=None):
+    """
+    テキストストリームから (行番号, dict の行) を1件ずつ読み出す（行番号は1始まり。CSV はヘッダーを1行目と数える）。
+    JSONL で JSON オブジェクトとして読めない行は、on_error が指定されていれば on_error(行番号, 例外) を呼んで読み飛ばし、
+    指定がなければ行番号を含む ValueError を送出する。
+    """
+    if fmt == 'jsonl':
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError(f'JSON オブジェクトではありません: {line[:50]!r}')
+            except ValueError as exc:  # json.JSONDecodeError も ValueError のサブクラス
+                if on_error is None:
+                    raise ValueError(f'{number} 行目を読み込めません: {exc}') from exc
+                on_error(number, exc)
+                continue
+            yield number, row
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
@@ -2,6 +2,7 @@
 
 from django import forms
 from .models import Material, Lesson, Progress  # 各モデルをインポート
+from .widgets import MaterialPicker
 
 # ----------------------------------------
 # 教材（Material）用フォーム
@@ -12,6 +13,13 @@ class MaterialForm(forms.ModelForm):
         fields = ['title', 'description']  # フォームに表示・入力するフィールド
 
 
+# ----------------------------------------
+# 教材の選択項目
+# 選択肢の一覧は描画せず（MaterialPicker で検索して選ぶ）、検証では送信された主キーの1件だけを読み込む
+class MaterialChoiceField(forms.ModelChoiceField):
+    widget = MaterialPicker
+
+
 # ----------------------------------------
 # レッスン（Lesson）用フォーム
 # Lessonモデルのmaterial(外部キー)、title、orderフィールドをフォームに使用
@@ -19,6 +27,13 @@ class LessonForm(forms.ModelForm):
     class Meta:
         model = Lesson
         fields = ['material', 'title', 'order'] 
+        help_texts = {'order': '空欄の場合は教材の末尾に追加します。'}
+        field_classes = {'material': MaterialChoiceField}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 表示順序は省略可能（Lesson.save() で末尾の値を採番する）
+        self.fields['order'].required = False
 
 
 # ----------------------------------------
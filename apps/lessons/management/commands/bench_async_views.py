@@ -0,0 +1,148 @@
+# apps/lessons/management/commands/bench_async_views.py
+
+'''
+閲覧系ビューの同期版（WSGI）と非同期版（ASGI）のスループットを比較するベンチマーク。
+
+一時DBに計測用データを投入し、同じURL群に対して
+  - sync : 同期ビューを WSGI ハンドラ経由で、concurrency 個のスレッドから同時に呼び出す
+  - async: 非同期ビューを ASGI ハンドラ経由で、concurrency 個のタスクから同時に呼び出す
+の処理件数/秒と応答時間（p50 / p95）を比較する。
+テストクライアントを使ったプロセス内の計測のため、ネットワークやサーバーのオーバーヘッドは含まない
+（実サーバーでの計測は uvicorn learning_task_tracker.asgi:application 等に外部の負荷ツールを当てること）。
+
+    python manage.py bench_async_views
+    python manage.py bench_async_views --requests 5000 --concurrency 200
+'''
+
+import asyncio
+import importlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import clear_url_caches, reverse
+
+from apps.lessons.benchmarking import percentile, scratch_database, seed_dataset
+from apps.lessons.models import Lesson, Material
+
+
+def reload_urlconf(**overrides):
+    # urls.py は読み込み時に LESSONS_ASYNC_VIEWS を見てビューを選ぶため、設定を変えて読み込み直す
+    from apps.lessons import urls as lessons_urls
+    from learning_task_tracker import urls as root_urls
+
+    with override_settings(**overrides):
+        importlib.reload(lessons_urls)
+        importlib.reload(root_urls)
+    clear_url_caches()
+
+
+class Command(BaseCommand):
+    help = '閲覧系ビューの同期版（WSGI）と非同期版（ASGI）のスループットを比較します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='各モードで送るリクエスト数')
+        parser.add_argument('--concurrency', type=int, default=50, help='同時に処理するリクエスト数')
+        parser.add_argument('--users', type=int, default=100, help='計測用ユーザー数')
+        parser.add_argument('--materials', type=int, default=50, help='教材数')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--requests と --concurrency には1以上を指定してください。')
+
+        results = {}
+        with scratch_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+            self.stdout.write('計測用データを投入しています...')
+            users = seed_dataset(users=options['users'], materials=options['materials'])
+            material = Material.objects.order_by('pk').first()
+            lesson = Lesson.objects.filter(material=material).order_by('order').first()
+            try:
+                for mode, enabled in (('sync', False), ('async', True)):
+                    reload_urlconf(LESSONS_ASYNC_VIEWS=enabled)
+                    urls = [
+                        reverse('lessons:home'),
+                        reverse('lessons:material_list'),
+                        reverse('lessons:material_detail', kwargs={'pk': material.pk}),
+                        reverse('lessons:lesson_detail', kwargs={'pk': lesson.pk}),
+                    ]
+                    run = self.run_sync if mode == 'sync' else self.run_async
+                    self.stdout.write(f'{mode}: {options["requests"]:,} リクエストを同時 {options["concurrency"]} 件で実行中...')
+                    results[mode] = run(users, urls, options)
+            finally:
+                # 設定どおりのビューに戻す
+                reload_urlconf()
+
+        self.stdout.write('\n=== 比較 ===')
+        for mode, (rate, timings, errors) in results.items():
+            self.stdout.write(
+                f'{mode:<6} {rate:9.1f} 件/秒   p50 {percentile(timings, 50):8.1f} ms   '
+                f'p95 {percentile(timings, 95):8.1f} ms   エラー {errors}'
+            )
+
+    def login_cookies(self, users):
+        # ユーザーごとにログイン済みのセッションCookieを用意し、各リクエストで使い回す
+        cookies = {}
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            cookies[user.pk] = client.cookies
+        return cookies
+
+    def requests_for(self, users, urls, count):
+        # (ユーザー, URL) の組を count 件、ユーザーとURLを巡回させて作る
+        return list(islice(zip(cycle(users), cycle(urls)), count))
+
+    # ----------------------------------------
+    # 同期ビュー（WSGI・スレッド並列）
+    # ----------------------------------------
+    def run_sync(self, users, urls, options):
+        cookies = self.login_cookies(users)
+
+        def fetch(item):
+            user, url = item
+            client = Client()
+            client.cookies = cookies[user.pk]
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+            # スレッドごとのDB接続を閉じる（スレッドプールの終了後に接続が残らないように）
+            connections.close_all()
+            return elapsed, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            outcomes = list(pool.map(fetch, self.requests_for(users, urls, options['requests'])))
+        return self.summarize(outcomes, time.perf_counter() - started)
+
+    # ----------------------------------------
+    # 非同期ビュー（ASGI・タスク並列）
+    # ----------------------------------------
+    def run_async(self, users, urls, options):
+        cookies = self.login_cookies(users)
+
+        async def main():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def fetch(item):
+                user, url = item
+                client = AsyncClient()
+                client.cookies = cookies[user.pk]
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(url)
+                    return (time.perf_counter() - started) * 1000, response.status_code
+
+            return await asyncio.gather(*(fetch(item) for item in self.requests_for(users, urls, options['requests'])))
+
+        started = time.perf_counter()
+        outcomes = asyncio.run(main())
+        return self.summarize(outcomes, time.perf_counter() - started)
+
+    def summarize(self, outcomes, elapsed):
+        timings = [ms for ms, _ in outcomes]
+        errors = sum(status != 200 for _, status in outcomes)
+        return len(outcomes) / elapsed, timings, errors
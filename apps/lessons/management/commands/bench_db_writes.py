@@ -0,0 +1,128 @@
+# apps/lessons/management/commands/bench_db_writes.py
+
+'''
+複数ワーカーからの同時書き込み（進捗の登録）のスループットを、DB プロファイルごとに比較するベンチマーク。
+
+一時DB（SQLite のファイル）に計測用データを投入し、gunicorn の複数ワーカーを模して
+workers 個のプロセスから同時に進捗の登録画面（lessons:progress_create）へ POST し続け、
+  - development: SQLite の既定設定（ロールバックジャーナル・DEFERRED トランザクション・リクエストごとに接続）
+  - production : settings.SQLITE_PRODUCTION_OPTIONS（WAL・synchronous=NORMAL・IMMEDIATE・接続の使い回し）
+の書き込み件数/秒、応答時間（p50 / p95）、"database is locked" 等で失敗した件数を表示する。
+
+    python manage.py bench_db_writes
+    python manage.py bench_db_writes --workers 1 2 4 8 --seconds 10
+'''
+
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from apps.lessons.benchmarking import percentile, scratch_database, seed_dataset
+from apps.lessons.models import Lesson
+
+PROFILES = {
+    'development': {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'journal_mode': 'DELETE'},
+    'production': {
+        'OPTIONS': getattr(settings, 'SQLITE_PRODUCTION_OPTIONS', {}),
+        'CONN_MAX_AGE': getattr(settings, 'DB_CONN_MAX_AGE', 600),
+        'journal_mode': 'WAL',
+    },
+}
+
+
+def write_worker(profile, user_id, lesson_ids, seconds, barrier, results):
+    """
+    子プロセスで実行する：指定のプロファイルで接続し、seconds 秒間、進捗の登録を繰り返す。
+    """
+    from django.contrib.auth import get_user_model
+
+    # 失敗した書き込みは件数だけを数える（django.request のエラーログでトレースバックを出力しない）
+    logging.disable(logging.ERROR)
+    connection = connections['default']
+    connection.settings_dict['OPTIONS'] = dict(PROFILES[profile]['OPTIONS'])
+    connection.settings_dict['CONN_MAX_AGE'] = PROFILES[profile]['CONN_MAX_AGE']
+
+    client = Client()
+    client.force_login(get_user_model().objects.get(pk=user_id))
+    connection.close()
+    urls = [reverse('lessons:progress_create', args=[pk]) for pk in lesson_ids]
+
+    timings = []
+    errors = 0
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = client.post(urls[len(timings) % len(urls)], {'status': 'in_progress'})
+            ok = response.status_code == 302
+        except OperationalError:
+            # "database is locked" などの書き込みの競合
+            ok = False
+        if ok:
+            timings.append((time.perf_counter() - started) * 1000)
+        else:
+            errors += 1
+    connections.close_all()
+    results.put((timings, errors))
+
+
+class Command(BaseCommand):
+    help = '複数ワーカーからの進捗の同時登録のスループットを、DB プロファイルごとに比較します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8], help='同時に書き込むワーカー（プロセス）数')
+        parser.add_argument('--seconds', type=float, default=5.0, help='各計測で書き込みを続ける秒数')
+        parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES), help='比較するプロファイル')
+
+    def handle(self, *args, **options):
+        # 複数プロセスから同じDBを開くため、メモリ上ではなく一時ファイルに作成する
+        with tempfile.TemporaryDirectory() as directory, \
+                scratch_database(name=os.path.join(directory, 'bench_db_writes.sqlite3')) as connection, \
+                override_settings(ALLOWED_HOSTS=['testserver']):
+            self.stdout.write('計測用データを投入しています...')
+            users = seed_dataset(users=max(options['workers']), materials=5, lessons_per_material=20, progress_per_user=10)
+            lesson_ids = list(Lesson.objects.values_list('pk', flat=True))
+
+            self.stdout.write(f'\n=== 進捗の同時登録（{options["seconds"]:g} 秒間） ===')
+            for profile in options['profiles']:
+                with connection.cursor() as cursor:
+                    # ジャーナルモードはDBファイルに保存されるため、プロファイルごとに切り替える
+                    cursor.execute(f'PRAGMA journal_mode = {PROFILES[profile]["journal_mode"]}')
+                for workers in options['workers']:
+                    self.report(profile, workers, self.run(profile, users[:workers], lesson_ids, options['seconds']), options['seconds'])
+
+    def run(self, profile, users, lesson_ids, seconds):
+        # 子プロセスへ接続を引き継がないよう、fork の前に閉じる
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(len(users))
+        results = context.Queue()
+        processes = [
+            context.Process(target=write_worker, args=(profile, user.pk, lesson_ids, seconds, barrier, results))
+            for user in users
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        timings = [timing for worker_timings, _ in collected for timing in worker_timings]
+        errors = sum(worker_errors for _, worker_errors in collected)
+        return timings, errors
+
+    def report(self, profile, workers, result, seconds):
+        timings, errors = result
+        style = self.style.ERROR if errors else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{profile:<12} workers {workers:3d}   {len(timings) / seconds:8.1f} 件/秒   '
+            f'p50 {percentile(timings, 50):7.1f} ms / p95 {percentile(timings, 95):8.1f} ms   失敗 {errors} 件'
+        ))
@@ -0,0 +1,160 @@
+# apps/lessons/management/commands/bench_progress_indexes.py
+
+'''
+Progress テーブルの複合インデックスの効果を計測するベンチマーク。
+
+一時DBに大量の進捗データを投入し、インデックスを外した状態（before）と
+付与した状態（after）で、代表的なクエリの実行計画とレイテンシを比較する。
+
+    python manage.py bench_progress_indexes --rows 10000000
+'''
+
+import random
+from datetime import date, timedelta
+from itertools import cycle
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models import Count
+
+from apps.lessons.benchmarking import measure, scratch_database
+from apps.lessons.models import Lesson, Material, Progress
+
+# 複合インデックス導入前のインデックス構成（外部キーごとの単一列インデックス）
+FK_ONLY_INDEXES = [
+    models.Index(fields=['user'], name='bench_progress_user_idx'),
+    models.Index(fields=['lesson'], name='bench_progress_lesson_idx'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Progress の複合インデックス有無によるクエリ計画・レイテンシを比較します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='投入する進捗の件数')
+        parser.add_argument('--users', type=int, default=10_000, help='ユーザー数')
+        parser.add_argument('--lessons', type=int, default=5_000, help='レッスン数')
+        parser.add_argument('--repeat', type=int, default=50, help='各クエリの実行回数')
+        parser.add_argument('--db-name', default=None, help='一時DBのファイル名（省略時はメモリ上）')
+        parser.add_argument('--seed', type=int, default=1, help='乱数シード')
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with scratch_database(name=options['db_name']) as connection:
+            self.seed(connection, options)
+            samples = self.sample_keys(options)
+
+            # 複合インデックス導入前（外部キー単体のインデックスのみ）の状態を「before」として計測
+            with connection.schema_editor() as editor:
+                for index in Progress._meta.indexes:
+                    editor.remove_index(Progress, index)
+                for index in FK_ONLY_INDEXES:
+                    editor.add_index(Progress, index)
+            self.analyze(connection)
+            before = self.run_queries('before', samples, options['repeat'])
+
+            # マイグレーションと同じインデックス構成に戻して「after」を計測
+            with connection.schema_editor() as editor:
+                for index in FK_ONLY_INDEXES:
+                    editor.remove_index(Progress, index)
+                for index in Progress._meta.indexes:
+                    editor.add_index(Progress, index)
+            self.analyze(connection)
+            after = self.run_queries('after', samples, options['repeat'])
+
+        self.stdout.write('\n=== レイテンシ比較（ミリ秒, median / p95） ===')
+        for name in before:
+            self.stdout.write(
+                f"{name:<24} before {before[name]['median']:9.3f} / {before[name]['p95']:9.3f}"
+                f"   after {after[name]['median']:9.3f} / {after[name]['p95']:9.3f}"
+            )
+
+    # ----------------------------------------
+    # データ投入
+    # ----------------------------------------
+    def seed(self, connection, options):
+        User = get_user_model()
+        User.objects.bulk_create(
+            [User(username=f'bench{i}', email=f'bench{i}@example.com',
+                  username_normalized=f'bench{i}', email_normalized=f'bench{i}@example.com')
+             for i in range(options['users'])],
+            batch_size=5_000,
+        )
+        material_count = max(1, options['lessons'] // 50)
+        Material.objects.bulk_create([Material(title=f'教材{i}') for i in range(material_count)])
+        material_ids = list(Material.objects.values_list('id', flat=True))
+        Lesson.objects.bulk_create(
+            [Lesson(material_id=material_ids[i % material_count], title=f'レッスン{i}', order=i)
+             for i in range(options['lessons'])],
+            batch_size=5_000,
+        )
+
+        user_ids = list(User.objects.values_list('id', flat=True))
+        lesson_ids = list(Lesson.objects.values_list('id', flat=True))
+        statuses = [value for value, _ in Progress.STATUS_CHOICES]
+        today = date.today()
+
+        # 件数が多いため ORM を経由せず executemany で直接投入する
+        table = connection.ops.quote_name(Progress._meta.db_table)
+        sql = f'INSERT INTO {table} (user_id, lesson_id, date, status) VALUES (%s, %s, %s, %s)'
+        batch = 50_000
+        with connection.cursor() as cursor:
+            for start in range(0, options['rows'], batch):
+                size = min(batch, options['rows'] - start)
+                cursor.executemany(sql, [
+                    (
+                        random.choice(user_ids),
+                        random.choice(lesson_ids),
+                        today - timedelta(days=random.randrange(365)),
+                        random.choice(statuses),
+                    )
+                    for _ in range(size)
+                ])
+                self.stdout.write(f'  seeded {start + size:,} / {options["rows"]:,} rows')
+
+    def sample_keys(self, options):
+        # 実在する (user, lesson) の組を計測対象として抜き出す
+        return list(Progress.objects.values_list('user_id', 'lesson_id', 'lesson__material_id')[:options['repeat']])
+
+    def analyze(self, connection):
+        # 統計情報を更新してプランナがインデックスを正しく評価できるようにする
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    # ----------------------------------------
+    # 計測対象のクエリ
+    # ----------------------------------------
+    def queries(self, samples):
+        today = date.today()
+        keys = cycle(samples)  # 毎回異なる組を順番に使う
+
+        def latest_status():
+            user_id, lesson_id, _ = next(keys)
+            return Progress.objects.filter(user_id=user_id, lesson_id=lesson_id).order_by('-date', '-id').values('status')[:1]
+
+        def material_overlay():
+            user_id, _, material_id = next(keys)
+            return Lesson.objects.filter(material_id=material_id).with_latest_status(user_id)
+
+        def lesson_status_counts():
+            _, lesson_id, _ = next(keys)
+            return Progress.objects.filter(lesson_id=lesson_id).values('status').annotate(count=Count('id'))
+
+        def admin_status_filter():
+            return Progress.objects.filter(status='done', date__gte=today - timedelta(days=7)).order_by('-date')[:100]
+
+        return {
+            'latest_status': latest_status,
+            'material_overlay': material_overlay,
+            'lesson_status_counts': lesson_status_counts,
+            'admin_status_filter': admin_status_filter,
+        }
+
+    def run_queries(self, label, samples, repeat):
+        self.stdout.write(f'\n=== {label}: 実行計画 ===')
+        results = {}
+        for name, build in self.queries(samples).items():
+            self.stdout.write(f'[{name}]\n{build().explain()}')
+            results[name] = measure(lambda: list(build()), repeat)
+        return results
@@ -0,0 +1,88 @@
+# apps/lessons/management/commands/bench_search.py
+
+'''
+教材・レッスン検索の応答時間を、全文検索インデックスと icontains（LIKE '%...%'）で比較するベンチマーク。
+
+一時DBに計測用の教材・レッスンを投入してインデックスを構築し、検索語ごとに
+  - index    : search.search()（関連度順の先頭ページ）
+  - icontains: Lesson.objects.filter(title__icontains=...)（管理画面と同じく件数 + 先頭ページ）
+の応答時間（p50 / p95）を表示する。
+icontains は件数を数えるために全行を走査するため、レッスン数に比例して遅くなる。
+
+    python manage.py bench_search
+    python manage.py bench_search --lessons 1000000 --repeat 20
+'''
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.lessons.benchmarking import percentile, scratch_database
+from apps.lessons.models import Lesson, Material
+from apps.lessons.search import rebuild_index, search
+
+# タイトルを組み立てる語（検索語の一致件数に差が出るよう、出現頻度の異なる語を混ぜる）
+WORDS = [
+    '入門', '基礎', '応用', '条件分岐', 'ループ', '関数', 'クラス', '例外処理', 'データ構造', 'アルゴリズム',
+    'Python', 'Django', 'SQL', 'テスト', 'デバッグ', '正規表現', '非同期処理', 'ファイル操作', '演習', 'まとめ',
+]
+QUERIES = ['条件分岐', 'データ構造 演習', 'Django', '非同期', '存在しない語句']
+
+
+class Command(BaseCommand):
+    help = '全文検索インデックスと icontains による教材・レッスン検索の応答時間を比較します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lessons', type=int, default=100_000, help='投入するレッスン数')
+        parser.add_argument('--lessons-per-material', type=int, default=500, help='教材あたりのレッスン数')
+        parser.add_argument('--repeat', type=int, default=10, help='検索語ごとの計測回数')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.seed(options['lessons'], options['lessons_per_material'])
+            started = time.perf_counter()
+            count = rebuild_index(chunk_size=20_000)
+            self.stdout.write(f'インデックス構築: {count:,} 件（{time.perf_counter() - started:.1f} 秒）\n')
+
+            for query in QUERIES:
+                indexed = self.measure(lambda: search(query, limit=20), options['repeat'])
+                scanned = self.measure(lambda: self.scan(query), options['repeat'])
+                hits = len(search(query, limit=20)[0])
+                self.stdout.write(
+                    f'{query:<16} index p50 {percentile(indexed, 50):8.2f} ms / p95 {percentile(indexed, 95):8.2f} ms   '
+                    f'icontains p50 {percentile(scanned, 50):8.2f} ms / p95 {percentile(scanned, 95):8.2f} ms   '
+                    f'（先頭ページ {hits} 件）'
+                )
+
+    def seed(self, lesson_count, per_material):
+        rng = random.Random(1)
+        material_count = max(1, lesson_count // per_material)
+        self.stdout.write(f'計測用データを投入しています（教材 {material_count:,} 件, レッスン {lesson_count:,} 件）...')
+        materials = Material.objects.bulk_create(
+            [Material(title=f'{rng.choice(WORDS)}講座 {i}', description='') for i in range(material_count)],
+            batch_size=5000,
+        )
+        batch = []
+        for i in range(lesson_count):
+            material = materials[i % material_count]
+            title = f'{rng.choice(WORDS)}と{rng.choice(WORDS)} 第{i // material_count + 1}回'
+            batch.append(Lesson(material=material, title=title, order=i // material_count + 1))
+            if len(batch) >= 20_000:
+                Lesson.objects.bulk_create(batch)
+                batch = []
+        Lesson.objects.bulk_create(batch)
+
+    def scan(self, query):
+        lessons = Lesson.objects.all()
+        for word in query.split():
+            lessons = lessons.filter(title__icontains=word)
+        return lessons.count(), list(lessons.order_by('pk')[:20])
+
+    def measure(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
@@ -0,0 +1,217 @@
+# apps/lessons/management/commands/check_query_budgets.py
+
+'''
+画面ごとのクエリ数・応答時間の上限（パフォーマンス予算）を検証する管理コマンド。
+
+一時DBに実運用に近い量のデータ（ユーザー・教材・レッスン・進捗）を投入し、
+apps/lessons/urls.py・apps/lessons/api_urls.py・apps/accounts/urls.py の全URLへリクエストを送って
+発行されたクエリ数と p95 応答時間を計測する。
+予算を超えた画面や、予算が定義されていないURLがあればエラー終了するため、
+CI などで N+1 や重い処理の混入を検知できる。
+クエリ数の予算は apps/lessons/tests/test_query_budgets.py でも同じ定義（BUDGETS）を使って検証する。
+
+    python manage.py check_query_budgets
+    python manage.py check_query_budgets --users 1000 --materials 500 --repeat 50
+'''
+
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from apps.accounts import urls as accounts_urls
+from apps.lessons import api_urls
+from apps.lessons import urls as lessons_urls
+from apps.lessons.benchmarking import percentile, scratch_database, seed_dataset
+from apps.lessons.models import Lesson, Material
+
+# ログイン済みリクエストで必ず発生するクエリ（セッションの読み込み + ユーザーの取得）
+AUTH_QUERIES = 2
+
+# API に送るリクエスト本文の形式
+JSON = 'application/json'
+
+# 計測用ユーザーのパスワード（seed_dataset で全ユーザーに設定される）
+PASSWORD = 'password'
+
+
+#
+# 1画面分の予算定義
+# ------------------------------------------------------------------------------
+class Budget:
+    def __init__(self, name, queries, p95_ms, *, kwargs=None, method='get', data=None, content_type=None, login=True,
+                 status=200):
+        self.name = name          # URL名（名前空間付き）
+        self.queries = queries    # ビュー自身が発行してよいクエリ数の上限（ログイン時の AUTH_QUERIES を除く）
+        self.p95_ms = p95_ms      # 応答時間の p95 の上限（ミリ秒）
+        self.kwargs = kwargs      # URL引数を計測用データから組み立てる関数
+        self.method = method
+        self.data = data          # POST するデータ（計測用データから組み立てる関数）
+        self.content_type = content_type  # 'application/json' なら data を JSON にして送る（API）
+        self.login = login        # ログイン済みユーザーとしてアクセスするか
+        self.status = status      # 期待するステータスコード
+
+    @property
+    def label(self):
+        return f'{self.method.upper()} {self.name}'
+
+    def request(self, client, url, data):
+        payload = self.data(data) if self.data else None
+        if self.content_type:
+            return getattr(client, self.method)(url, payload, content_type=self.content_type)
+        return getattr(client, self.method)(url, payload)
+
+
+# 各画面の予算。キャッシュが空の初回リクエストも含めた最大値で判定する
+BUDGETS = [
+    # --- lessons ---
+    Budget('lessons:home', 2, 100),                   # 学習統計 + 進捗サマリ一覧
+    Budget('lessons:material_list', 1, 100),          # 教材1ページ（件数はサブクエリで同時に集計）
+    Budget('lessons:material_create', 0, 100),
+    Budget('lessons:material_detail', 3, 100,         # 教材 + レッスン一覧（キャッシュ未作成時のみ）+ 進捗
+           kwargs=lambda data: {'pk': data['material'].pk}),
+    Budget('lessons:lesson_create', 0, 200),          # 教材未指定時は案内のみ表示
+    Budget('lessons:lesson_create_with_material', 2, 200,
+           kwargs=lambda data: {'material_pk': data['material'].pk}),
+    Budget('lessons:lesson_detail', 2, 100,           # レッスンの教材ID + レッスン（キャッシュ未作成時のみ）
+           kwargs=lambda data: {'pk': data['lesson'].pk}),
+    Budget('lessons:progress_create', 1, 100,
+           kwargs=lambda data: {'lesson_pk': data['lesson'].pk}),
+    # レッスン取得・制約検証・保存・変更履歴・直前ステータス + サマリ更新（5、BEGIN/COMMIT 含む）
+    # + 初回のみサマリ作成（3、SAVEPOINT 含む）+ 学習統計更新（4、BEGIN/COMMIT 含む）
+    Budget('lessons:progress_create', 17, 200,
+           kwargs=lambda data: {'lesson_pk': data['lesson'].pk},
+           method='post', data=lambda data: {'status': 'done'}, status=302),
+    Budget('lessons:progress_export', 1, 500),        # 進捗をサーバー側で分割読み出し
+    Budget('lessons:progress_export_job', 1, 100,     # ジョブの登録のみ（ファイルの作成はワーカーが行う）
+           method='post', data=lambda data: {'format': 'csv'}, status=302),
+    Budget('lessons:search', 3, 200,                   # 全文検索 + 教材・レッスンの読み込み
+           data=lambda data: {'q': 'レッスン'}),
+    # --- api ---
+    Budget('api:material_list', 1, 100),               # 教材1ページ（レッスン数はサブクエリ）
+    # 保存・変更履歴・検索インデックス（5、BEGIN/COMMIT/SAVEPOINT 含む）・件数付きの再読み込み
+    Budget('api:material_list', 9, 200, method='post', status=201, content_type=JSON,
+           data=lambda data: {'title': '計測用の教材'}),
+    Budget('api:material_detail', 1, 100, kwargs=lambda data: {'pk': data['material'].pk}),
+    # 教材・保存・変更履歴・検索インデックス（4、BEGIN/COMMIT 含む）
+    Budget('api:material_detail', 7, 200, method='patch', content_type=JSON,
+           kwargs=lambda data: {'pk': data['material'].pk}, data=lambda data: {'description': '更新'}),
+    Budget('api:lesson_list', 1, 100, data=lambda data: {'material': data['material'].pk}),
+    # 教材の検証・教材のロックと表示順の採番・保存（BEGIN/COMMIT 含む）・検索インデックス（4）・変更履歴（レッスン + 教材）
+    # ・サマリのレッスン数
+    Budget('api:lesson_list', 16, 200, method='post', status=201, content_type=JSON,
+           data=lambda data: {'material': data['material'].pk, 'title': '計測用のレッスン'}),
+    Budget('api:lesson_detail', 1, 100, kwargs=lambda data: {'pk': data['lesson'].pk}),
+    # レッスン・教材と表示順の検証（3）・移動元の教材・保存・検索インデックス（4）・変更履歴
+    Budget('api:lesson_detail', 11, 200, method='patch', content_type=JSON,
+           kwargs=lambda data: {'pk': data['lesson'].pk}, data=lambda data: {'title': '更新したレッスン'}),
+    # レッスン・移動先・教材のロックと移動先の読み直し・隣の表示順・移動元の教材・保存（BEGIN/COMMIT 含む）・変更履歴
+    # （更新するのは1行だけ）
+    Budget('api:lesson_move', 10, 200, method='post', content_type=JSON,
+           kwargs=lambda data: {'pk': data['lesson'].pk}, data=lambda data: {'after': data['last_lesson'].pk}),
+    Budget('api:progress_list', 1, 100),
+    # レッスンの確認・一括登録・変更履歴・対象教材のサマリ（6）・学習統計（6）（BEGIN/COMMIT 含む）
+    Budget('api:progress_list', 18, 300, method='post', status=201, content_type=JSON,
+           data=lambda data: {'records': [{'lesson': data['lesson'].pk, 'status': 'done'}]}),
+    Budget('api:sync', 1, 100),                        # 初回は現在の変更番号だけを返す
+    # 保存期間の確認・渡せる変更番号・変更履歴（共通 + 自分）・種別ごとの現在の行（3）
+    Budget('api:sync', 7, 200, data=lambda data: {'since': 0}),
+    # --- accounts ---
+    Budget('login', 0, 100, login=False),
+    # ユーザー取得・セッション作成/更新・last_login 更新（トランザクション含む）。p95 はパスワードのハッシュ検証を含む
+    Budget('login', 9, 2000, login=False, method='post', status=302,
+           data=lambda data: {'username': data['user'].email, 'password': PASSWORD}),
+    Budget('logout', 2, 100, method='post', status=302),  # セッションの再読み込み + 削除
+    Budget('signup', 0, 100, login=False),
+]
+
+
+class Command(BaseCommand):
+    help = '全画面のクエリ数と p95 応答時間が予算内に収まっているかを検証します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='各画面へのリクエスト回数')
+        parser.add_argument('--users', type=int, default=200, help='計測用ユーザー数')
+        parser.add_argument('--materials', type=int, default=100, help='教材数')
+        parser.add_argument('--lessons-per-material', type=int, default=50, help='教材あたりのレッスン数')
+        parser.add_argument('--progress-per-user', type=int, default=200, help='ユーザーあたりの進捗記録数')
+        parser.add_argument('--skip-timing', action='store_true', help='p95 応答時間の判定を省略する（遅い環境向け）')
+
+    def handle(self, *args, **options):
+        failures = self.check_coverage()
+        # ログイン試行回数の制限は計測対象外（同じユーザーで繰り返しログインするため無効にする）
+        # バックグラウンドジョブはリクエストの外で実行されるため、その場で実行する設定でも登録だけを計測する
+        with scratch_database(), override_settings(
+            ALLOWED_HOSTS=['testserver'], LOGIN_THROTTLE_ENABLED=False, JOBS_RUN_INLINE=False,
+        ):
+            self.stdout.write('計測用データを投入しています...')
+            users = seed_dataset(
+                users=options['users'],
+                materials=options['materials'],
+                lessons_per_material=options['lessons_per_material'],
+                progress_per_user=options['progress_per_user'],
+                password=PASSWORD,
+            )
+            material = Material.objects.order_by('-pk').first()
+            data = {
+                'user': users[0],
+                'material': material,
+                'lesson': Lesson.objects.filter(material=material).order_by('order').first(),
+                'last_lesson': Lesson.objects.filter(material=material).order_by('order').last(),
+            }
+            for budget in BUDGETS:
+                failures.extend(self.check_budget(budget, data, options))
+
+        if failures:
+            raise CommandError('予算を超えた画面があります:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('すべての画面が予算内です。'))
+
+    def check_coverage(self):
+        # urls.py に追加された画面の予算の定義漏れを検知する
+        defined = {budget.name for budget in BUDGETS}
+        names = [f'{lessons_urls.app_name}:{p.name}' for p in lessons_urls.urlpatterns]
+        names += [f'{api_urls.app_name}:{p.name}' for p in api_urls.urlpatterns]
+        names += [p.name for p in accounts_urls.urlpatterns]
+        return [f'{name}: 予算が定義されていません' for name in names if name not in defined]
+
+    def check_budget(self, budget, data, options):
+        url = reverse(budget.name, kwargs=budget.kwargs(data) if budget.kwargs else None)
+
+        worst = 0
+        timings = []
+        for _ in range(options['repeat']):
+            client = Client()
+            if budget.login:
+                client.force_login(data['user'])
+            # 記録済みのクエリが上限（9000件）に達すると件数の差が取れなくなるため、計測ごとに消去する
+            reset_queries()
+            with ExitStack() as stack:
+                # 読み取りレプリカ（settings.DB_REPLICAS）へ振り分けられたクエリも含めて数える
+                captured = [stack.enter_context(CaptureQueriesContext(c)) for c in connections.all()]
+                started = time.perf_counter()
+                response = budget.request(client, url, data)
+                if response.streaming:
+                    # ストリーミング応答は最後まで読み切った時点を完了とする
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != budget.status:
+                return [f'{budget.label}: ステータスコード {response.status_code}（期待値 {budget.status}）']
+            queries = sum(len(context) for context in captured)
+            worst = max(worst, queries - (AUTH_QUERIES if budget.login else 0))
+
+        p95 = percentile(timings, 95)
+        problems = []
+        if worst > budget.queries:
+            problems.append(f'{budget.label}: {worst} クエリ（上限 {budget.queries}）')
+        if not options['skip_timing'] and p95 > budget.p95_ms:
+            problems.append(f'{budget.label}: p95 {p95:.1f} ms（上限 {budget.p95_ms} ms）')
+
+        label = self.style.ERROR('NG  ') if problems else self.style.SUCCESS('OK  ')
+        self.stdout.write(
+            f'{label}{budget.label:<48} クエリ {worst:>2} / {budget.queries:<2}  p95 {p95:8.1f} / {budget.p95_ms} ms'
+        )
+        return problems
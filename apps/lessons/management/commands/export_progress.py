@@ -0,0 +1,75 @@
+# apps/lessons/management/commands/export_progress.py
+
+'''
+Progress を CSV / JSONL で書き出す管理コマンド（import_progress と同じ列構成）。
+
+    python manage.py export_progress history.csv
+    python manage.py export_progress - --format jsonl --user 1 > history.jsonl
+
+進捗は .iterator() で分割して読み出し、1行ずつ書き出すためメモリ使用量は一定です。
+シャーディング（apps.shards）が有効な場合は、シャードを順に読み出して続けて書き出します。
+'''
+
+import sys
+import time
+from itertools import chain
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.lessons.exports import FORMATS, guess_format, progress_rows, serialize
+from apps.lessons.models import Progress
+
+# 進捗状況を表示する間隔（件数）
+REPORT_EVERY = 100_000
+
+
+class Command(BaseCommand):
+    help = '進捗を CSV / JSONL 形式でエクスポートします。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="出力ファイルのパス（'-' で標準出力）")
+        parser.add_argument('--format', choices=FORMATS, help='出力形式（省略時は拡張子から判定）')
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='対象ユーザーID（複数指定可）')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='DBから一度に読み出す件数')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        queryset = Progress.objects.all()
+        if options['user_ids']:
+            queryset = queryset.filter(user_id__in=options['user_ids'])
+
+        if path == '-':
+            stream = sys.stdout
+            progress_out = self.stderr  # 標準出力をデータ用に空けておく
+        else:
+            try:
+                stream = open(path, 'w', newline='', encoding='utf-8')
+            except OSError as exc:
+                raise CommandError(f'ファイルを開けません: {exc}')
+            progress_out = self.stdout
+
+        exported = 0
+        started = time.perf_counter()
+
+        def counted(rows):
+            nonlocal exported
+            for row in rows:
+                exported += 1
+                if exported % REPORT_EVERY == 0:
+                    elapsed = time.perf_counter() - started
+                    progress_out.write(f'  {exported:,} 件出力（{exported / elapsed:,.0f} 件/秒）')
+                yield row
+
+        try:
+            rows = chain.from_iterable(
+                progress_rows(shard_queryset, options['chunk_size']) for shard_queryset in queryset.per_shard()
+            )
+            for text in serialize(counted(rows), fmt):
+                stream.write(text)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        progress_out.write(self.style.SUCCESS(f'{exported:,} 件をエクスポートしました（{elapsed:.2f} 秒）'))
@@ -0,0 +1,160 @@
+# apps/lessons/management/commands/import_progress.py
+
+'''
+他システムの学習履歴を Progress へ一括登録する管理コマンド。
+
+    python manage.py import_progress history.csv
+    python manage.py import_progress history.jsonl --chunk-size 20000
+    cat history.csv | python manage.py import_progress - --format csv
+
+入力は1行ずつ読み込み、chunk-size 件ごとに
+「ユーザー・レッスンをまとめて解決 → 一括INSERT → コミット」を繰り返すため、
+ファイルサイズに関係なくメモリ使用量は一定です。
+一括INSERTは bulk_create と同じ列構成の INSERT 文を executemany で実行します
+（行ごとのモデルインスタンス生成を省き、SQLite でも毎秒数万件を登録できるようにするため）。
+必須の列は user_email / lesson_id / status（date は省略時に当日）。
+不正な行（JSON として読めない行を含む）は行番号を表示して読み飛ばします。
+シャーディング（apps.shards）が有効な場合は、チャンク内の行をユーザーのシャードごとに分けて登録します。
+'''
+
+import sys
+import time
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max
+
+from apps.accounts.models import normalize_identifier
+from apps.lessons import changelog
+from apps.lessons.exports import FORMATS, chunked, guess_format, numbered_rows
+from apps.lessons.models import Lesson, Progress
+from apps.lessons.summaries import rebuild_learning_stats, rebuild_summaries
+from apps.shards.routers import by_shard
+
+# 不正な行の内容を表示する上限（大量エラー時に出力が溢れないように）
+MAX_REPORTED_ERRORS = 20
+
+
+def text(row, key):
+    """
+    行の文字列の列の値を返す（値がない場合は None、文字列以外の場合は ValueError）。
+    """
+    value = row.get(key)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f'{key} が不正です: {value!r}')
+    return value
+
+
+class Command(BaseCommand):
+    help = 'CSV / JSONL から進捗を一括インポートします。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="入力ファイルのパス（'-' で標準入力）")
+        parser.add_argument('--format', choices=FORMATS, help='入力形式（省略時は拡張子から判定）')
+        parser.add_argument('--chunk-size', type=int, default=10_000, help='1トランザクションで登録する件数')
+        parser.add_argument('--skip-summaries', action='store_true', help='インポート後の進捗サマリ・学習統計の再構築を省略する')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if path == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(path, newline='', encoding='utf-8')
+            except OSError as exc:
+                raise CommandError(f'ファイルを開けません: {exc}')
+
+        self.errors = 0
+        self.affected_users = set()
+        imported = 0
+        started = time.perf_counter()
+        with stream:
+            for chunk in chunked(numbered_rows(stream, fmt, on_error=self.report), options['chunk_size']):
+                imported += self.import_chunk(chunk)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'  {imported:,} 件登録（{imported / elapsed:,.0f} 件/秒）, スキップ {self.errors:,} 件')
+
+        if not options['skip_summaries'] and self.affected_users:
+            # 一括INSERTはシグナルを発行しないため、影響のあったユーザー分のサマリ・統計を作り直す
+            self.stdout.write('進捗サマリ・学習統計を再構築しています...')
+            for user_ids in chunked(sorted(self.affected_users), 500):
+                rebuild_summaries(user_ids=user_ids)
+                rebuild_learning_stats(user_ids=user_ids)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{imported:,} 件をインポートしました（{elapsed:.2f} 秒, {imported / max(elapsed, 1e-9):,.0f} 件/秒）'
+        ))
+
+    def import_chunk(self, chunk):
+        # chunk は (行番号, 行) のリスト
+        User = get_user_model()
+        statuses = {value for value, _ in Progress.STATUS_CHOICES}
+
+        # チャンク内のユーザー・レッスンを1クエリずつでまとめて解決する
+        # （メールアドレスは大文字小文字を区別せず、正規化済みの列のインデックスで検索）
+        emails = {normalize_identifier(row.get('user_email')) for _, row in chunk if isinstance(row.get('user_email'), str)}
+        users = dict(User.objects.filter(email_normalized__in=emails).values_list('email_normalized', 'id'))
+        lesson_ids = set()
+        for _, row in chunk:
+            try:
+                lesson_ids.add(int(row.get('lesson_id')))
+            except (TypeError, ValueError):
+                pass
+        lessons = set(Lesson.objects.filter(pk__in=lesson_ids).values_list('id', flat=True))
+
+        values = []
+        for number, row in chunk:
+            try:
+                values.append(self.build(row, users, lessons, statuses))
+            except ValueError as exc:
+                self.report(number, exc)
+
+        for alias, shard_values in by_shard(values, key=lambda value: value[0]).items():
+            connection = connections[alias]
+            adapt_date = connection.ops.adapt_datefield_value
+            shard_values = [(user_id, lesson_id, status, adapt_date(day)) for user_id, lesson_id, status, day in shard_values]
+            with transaction.atomic(using=alias), connection.cursor() as cursor:
+                last_id = Progress.objects.using(alias).aggregate(last=Max('pk'))['last'] or 0
+                cursor.executemany(self.insert_sql(connection), shard_values)
+                # executemany は主キーを返さないため、登録前の最大IDより後の行を差分同期用の変更履歴に記録する
+                changelog.record_progress_since(last_id, using=alias)
+        self.affected_users.update(user_id for user_id, *_ in values)
+        return len(values)
+
+    def insert_sql(self, connection):
+        # build() が返すタプルの並びに合わせた INSERT 文（テーブル名・列名はモデル定義から取得）
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(Progress._meta.get_field(name).column) for name in ('user', 'lesson', 'status', 'date'))
+        return f'INSERT INTO {quote(Progress._meta.db_table)} ({columns}) VALUES (%s, %s, %s, %s)'
+
+    def build(self, row, users, lessons, statuses):
+        # JSONL では文字列以外の値も入り得るため、文字列の列は型も確認する
+        email = text(row, 'user_email')
+        user_id = users.get(normalize_identifier(email))
+        if user_id is None:
+            raise ValueError(f'ユーザーが見つかりません: {email!r}')
+        try:
+            lesson_id = int(row.get('lesson_id'))
+        except (TypeError, ValueError):
+            raise ValueError(f"lesson_id が不正です: {row.get('lesson_id')!r}")
+        if lesson_id not in lessons:
+            raise ValueError(f'レッスンが見つかりません: {lesson_id}')
+        status = text(row, 'status')
+        if status not in statuses:
+            raise ValueError(f'ステータスが不正です: {status!r}')
+        value = text(row, 'date')
+        try:
+            recorded = date.fromisoformat(value) if value else date.today()
+        except ValueError:
+            raise ValueError(f'date が不正です: {value!r}')
+        # INSERT 文の列順（user, lesson, status, date）に合わせたタプルを返す（日付は登録先の DB ごとに変換する）
+        return (user_id, lesson_id, status, recorded)
+
+    def report(self, number, exc):
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f'  {number} 行目をスキップ: {exc}')
@@ -0,0 +1,30 @@
+# apps/lessons/management/commands/prune_changelog.py
+
+'''
+差分同期用の変更履歴（ChangeLogEntry）のうち、保存期間を過ぎたものを削除する管理コマンド。
+cron 等で1日1回程度実行する想定。
+
+    python manage.py prune_changelog              # CHANGELOG_RETENTION_DAYS 日より前を削除
+    python manage.py prune_changelog --days 7
+'''
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.lessons import changelog
+
+
+class Command(BaseCommand):
+    help = '保存期間を過ぎた差分同期用の変更履歴を削除します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='保存日数（省略時は CHANGELOG_RETENTION_DAYS）')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days には0以上を指定してください。')
+        started = time.perf_counter()
+        deleted = changelog.prune(options['days'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'{deleted:,} 件の変更履歴を削除しました（{elapsed:.2f} 秒）'))
@@ -0,0 +1,112 @@
+# apps/lessons/management/commands/rebalance_shards.py
+
+'''
+進捗・進捗サマリ・学習統計を、各ユーザーの本来のシャード（shard_for_user）へ移動する管理コマンド。
+
+次の場合に実行する：
+  - シャーディングを導入したとき（default にある既存の行をシャードへ移す）
+  - settings.DB_SHARDS の末尾にシャードを追加したとき（jump consistent hash により約 1 / シャード数 のユーザーが移動する）
+
+進捗は主キーを変えずにコピーしてから元のシャードの行を削除する（シャードごとに採番範囲が分かれているため主キーは衝突せず、
+差分同期の変更履歴も記録し直す必要がない）。サマリは行（進捗のない受講登録を含む）をコピーしてから、
+学習統計とともに移動先で進捗から作り直す。
+途中で中断しても、もう一度実行すれば続きから移動する（コピー済みの行は主キーで読み飛ばす）。
+
+    python manage.py rebalance_shards --dry-run
+    python manage.py rebalance_shards --batch-size 200
+'''
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count
+
+from apps.lessons.exports import chunked
+from apps.lessons.models import LearningStats, Progress, ProgressSummary
+from apps.lessons.summaries import rebuild_learning_stats, rebuild_summaries
+from apps.shards.routers import by_shard, shard_aliases, shard_for_user, sharding_enabled
+
+
+class Command(BaseCommand):
+    help = 'ユーザーの進捗・サマリ・学習統計を、本来のシャードへ移動します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='1回の移動でまとめて処理するユーザー数')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='進捗の読み取り・書き込みの単位件数')
+        parser.add_argument('--dry-run', action='store_true', help='移動せず、移動が必要なユーザー数だけを表示する')
+
+    def handle(self, *args, **options):
+        if not sharding_enabled():
+            raise CommandError('シャーディングが無効です（環境変数 DJANGO_DB_SHARDS にシャードを指定してください）。')
+
+        started = time.perf_counter()
+        moved_users = moved_rows = 0
+        for source in [DEFAULT_DB_ALIAS, *shard_aliases()]:
+            misplaced = self.misplaced_users(source)
+            self.stdout.write(f'{source}: 移動が必要なユーザー {len(misplaced):,} 人')
+            if options['dry_run']:
+                continue
+            for user_ids in chunked(misplaced, options['batch_size']):
+                moved_rows += self.move(source, user_ids, options['chunk_size'])
+                moved_users += len(user_ids)
+
+        if not options['dry_run']:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'{moved_users:,} 人・{moved_rows:,} 件の進捗を移動しました（{elapsed:.2f} 秒）'
+            ))
+        self.report()
+
+    def misplaced_users(self, source):
+        # source にいずれかの行があり、本来のシャードが source ではないユーザー
+        user_ids = set()
+        for model in (Progress, ProgressSummary, LearningStats):
+            user_ids.update(model.objects.using(source).values_list('user_id', flat=True).distinct())
+        return sorted(user_id for user_id in user_ids if shard_for_user(user_id) != source)
+
+    def move(self, source, user_ids, chunk_size):
+        """
+        source にある user_ids の行を、それぞれの本来のシャードへ移動する。戻り値は移動した進捗の件数。
+        コピー（移動先）と削除（source）は別の DB のため1つのトランザクションにはできないが、
+        コピーを先に終えるため、途中で失敗しても行が失われることはない。
+        """
+        moved = 0
+        for target, target_user_ids in by_shard(user_ids).items():
+            rows = Progress.objects.using(source).filter(user_id__in=target_user_ids).order_by('pk')
+            with transaction.atomic(using=target):
+                for progresses in chunked(rows.iterator(chunk_size=chunk_size), chunk_size):
+                    copied = set(
+                        Progress.objects.using(target)
+                        .filter(pk__in=[progress.pk for progress in progresses])
+                        .values_list('pk', flat=True)
+                    )
+                    Progress.objects.using(target).bulk_create(
+                        [progress for progress in progresses if progress.pk not in copied]
+                    )
+                    moved += len(progresses) - len(copied)
+                # 進捗のない受講登録（provision_users が作成する行）は作り直しでは作られないため、行ごと移す
+                # （主キーは移動先の採番範囲で振り直す。コピー済みの行はユーザー×教材の一意制約で読み飛ばす）
+                summaries = ProgressSummary.objects.using(source).filter(user_id__in=target_user_ids).order_by('pk')
+                for batch in chunked(summaries.iterator(chunk_size=chunk_size), chunk_size):
+                    for summary in batch:
+                        summary.pk = None
+                    ProgressSummary.objects.using(target).bulk_create(batch, ignore_conflicts=True)
+
+        with transaction.atomic(using=source):
+            for model in (Progress, ProgressSummary, LearningStats):
+                rows = model.objects.using(source).filter(user_id__in=user_ids)
+                rows._raw_delete(rows.db)
+
+        # 移動先のサマリ（移してきた行を数え直す）・学習統計は、移動してきた進捗から作り直す
+        rebuild_summaries(user_ids=user_ids, chunk_size=chunk_size)
+        rebuild_learning_stats(user_ids=user_ids, chunk_size=chunk_size)
+        return moved
+
+    def report(self):
+        # シャードごとの進捗の件数と、全シャードの合計
+        for alias in [DEFAULT_DB_ALIAS, *shard_aliases()]:
+            rows = Progress.objects.using(alias).count()
+            self.stdout.write(f'  {alias:<10} {rows:12,} 件')
+        total = Progress.objects.aggregate_shards(rows=Count('pk'))['rows'] or 0
+        self.stdout.write(f'  {"合計":<10} {total:12,} 件（シャードのみ）')
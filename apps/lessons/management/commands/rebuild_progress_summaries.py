@@ -0,0 +1,51 @@
+# apps/lessons/management/commands/rebuild_progress_summaries.py
+
+'''
+進捗サマリ（ProgressSummary）と学習統計（LearningStats）を Progress から作り直す管理コマンド。
+
+    python manage.py rebuild_progress_summaries                 # 全件
+    python manage.py rebuild_progress_summaries --user 1 --user 2
+    python manage.py rebuild_progress_summaries --material 10
+    python manage.py rebuild_progress_summaries --background    # ワーカー（run_worker）に任せてすぐに終了する
+'''
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.jobs.queue import enqueue
+from apps.lessons.summaries import rebuild_learning_stats, rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = '進捗サマリと学習統計を Progress テーブルから再構築します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='対象ユーザーID（複数指定可）')
+        parser.add_argument('--material', type=int, action='append', dest='material_ids', help='対象教材ID（複数指定可）')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='読み取り・書き込みの単位件数')
+        parser.add_argument('--background', action='store_true', help='バックグラウンドジョブとして登録だけを行う')
+
+    def handle(self, *args, **options):
+        if options['background']:
+            job = enqueue(
+                'lessons.rebuild_summaries',
+                user_ids=options['user_ids'],
+                material_ids=options['material_ids'],
+                chunk_size=options['chunk_size'],
+            )
+            self.stdout.write(self.style.SUCCESS(f'再構築をジョブ #{job.pk} として登録しました'))
+            return
+        started = time.perf_counter()
+        created = rebuild_summaries(
+            user_ids=options['user_ids'],
+            material_ids=options['material_ids'],
+            chunk_size=options['chunk_size'],
+        )
+        message = f'{created:,} 件のサマリ'
+        if not options['material_ids']:
+            # 学習統計はユーザー単位のため、教材を絞り込んだ場合は対象外
+            stats = rebuild_learning_stats(user_ids=options['user_ids'], chunk_size=options['chunk_size'])
+            message += f'・{stats:,} 件の学習統計'
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'{message}を再構築しました（{elapsed:.2f} 秒）'))
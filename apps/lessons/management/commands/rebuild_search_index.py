@@ -0,0 +1,28 @@
+# apps/lessons/management/commands/rebuild_search_index.py
+
+'''
+教材・レッスンの全文検索インデックス（SearchEntry）を作り直す管理コマンド。
+初回の導入時や、bulk_create 等のシグナルを発行しない一括登録の後に実行する。
+
+    python manage.py rebuild_search_index
+    python manage.py rebuild_search_index --chunk-size 20000
+'''
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.lessons.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = '教材・レッスンの全文検索インデックスを再構築します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='読み取り・書き込みの単位件数')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_index(chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'{count:,} 件の検索用エントリを登録しました（{elapsed:.2f} 秒）'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0002_progress_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lesson_count', models.PositiveIntegerField(default=0, verbose_name='レッスン数')),
+                ('not_started_count', models.PositiveIntegerField(default=0, verbose_name='未開始')),
+                ('in_progress_count', models.PositiveIntegerField(default=0, verbose_name='学習中')),
+                ('done_count', models.PositiveIntegerField(default=0, verbose_name='完了')),
+                ('last_activity', models.DateField(blank=True, null=True, verbose_name='最終学習日')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_summaries', to='lessons.material', verbose_name='教材')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_summaries', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '進捗サマリ',
+                'verbose_name_plural': '進捗サマリ一覧',
+                'constraints': [models.UniqueConstraint(fields=('user', 'material'), name='progress_summary_user_material_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0003_progress_summary'),
+    ]
+
+    # auto_now_add から default への変更はDB上の列定義に影響しないため、
+    # SQLite で大きな進捗テーブルが再作成されないよう状態のみを更新する
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='progress',
+                    name='date',
+                    field=models.DateField(default=django.utils.timezone.localdate, editable=False, verbose_name='記録日'),
+                ),
+            ],
+        ),
+    ]
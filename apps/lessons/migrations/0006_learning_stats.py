@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0005_progress_drop_redundant_fk_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LearningStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_records', models.PositiveIntegerField(default=0, verbose_name='記録数')),
+                ('current_streak', models.PositiveIntegerField(default=0, verbose_name='連続学習日数')),
+                ('longest_streak', models.PositiveIntegerField(default=0, verbose_name='最長連続学習日数')),
+                ('last_study_date', models.DateField(blank=True, null=True, verbose_name='最終学習日')),
+                ('recent_activity', models.JSONField(blank=True, default=list, verbose_name='最近の記録')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='learning_stats', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '学習統計',
+                'verbose_name_plural': '学習統計一覧',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0007_row_versions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('material', '教材'), ('lesson', 'レッスン'), ('progress', '進捗')], max_length=10, verbose_name='対象')),
+                ('object_id', models.BigIntegerField(verbose_name='対象ID')),
+                ('deleted', models.BooleanField(default=False, verbose_name='削除')),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='記録日時')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '変更履歴',
+                'verbose_name_plural': '変更履歴一覧',
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# apps/lessons/migrations/0009_lesson_order_keys.py
+
+'''
+レッスンの表示順序を間隔付きの値に振り直し、(material, order) の一意制約を追加するマイグレーション。
+
+既存の値は手入力のため重複や連番（1, 2, 3...）が混在している。教材ごとに (order, id) の順で並べ、
+GAP, 2 * GAP, ... に振り直してから一意制約を付ける（並び順は変わらない）。
+値が変わったレッスンは version を進め、差分同期の変更履歴にも記録する。
+'''
+
+from django.db import migrations, models
+
+# 振り直しの間隔（settings.LESSON_ORDER_GAP の既定値。マイグレーションは設定の変更に影響されないよう固定値を使う）
+GAP = 1024
+BATCH_SIZE = 5000
+
+
+def renumber(apps, schema_editor):
+    Lesson = apps.get_model('lessons', 'Lesson')
+    ChangeLogEntry = apps.get_model('lessons', 'ChangeLogEntry')
+    connection = schema_editor.connection
+    db_alias = connection.alias
+
+    quote = connection.ops.quote_name
+    sql = (
+        f'UPDATE {quote(Lesson._meta.db_table)} '
+        f'SET {quote("order")} = %s, {quote("version")} = {quote("version")} + 1 WHERE {quote(Lesson._meta.pk.column)} = %s'
+    )
+    rows = Lesson.objects.using(db_alias).order_by('material_id', 'order', 'pk').values_list('pk', 'material_id', 'order')
+
+    changed = []
+    material_id = None
+    position = 0
+    for pk, lesson_material_id, order in rows.iterator(chunk_size=BATCH_SIZE):
+        if lesson_material_id != material_id:
+            material_id = lesson_material_id
+            position = 0
+        position += 1
+        if order != position * GAP:
+            changed.append((position * GAP, pk))
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(changed), BATCH_SIZE):
+            cursor.executemany(sql, changed[start:start + BATCH_SIZE])
+    ChangeLogEntry.objects.using(db_alias).bulk_create(
+        [ChangeLogEntry(kind='lesson', object_id=pk) for _, pk in changed],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0008_changelog'),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='lesson',
+            name='material',
+            field=models.ForeignKey(db_index=False, on_delete=models.CASCADE, related_name='lessons', to='lessons.material', verbose_name='教材'),
+        ),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(fields=('material', 'order'), name='lesson_material_order_uniq', violation_error_message='この教材には同じ表示順序のレッスンが既に存在します。'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# apps/lessons/migrations/0010_search_entries.py
+
+'''
+全文検索用の SearchEntry と、DB ごとの全文検索インデックスを作成するマイグレーション。
+
+  - SQLite     : SearchEntry を外部コンテンツとする FTS5 の仮想テーブルと、同期用のトリガー
+  - PostgreSQL : search.PG_VECTOR と同じ式に対する GIN インデックス
+既存の教材・レッスンは 0013_backfill_search_index で登録する。
+※ SQLite では SearchEntry の列を変更するマイグレーション（テーブルの作り直し）でトリガーが消えるため、
+  その場合はトリガーも作り直すこと。
+'''
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'lessons_searchentry_fts'
+
+SQLITE_CREATE = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "title_terms, body_terms, content='lessons_searchentry', content_rowid='id', tokenize='unicode61')",
+    f"CREATE TRIGGER lessons_searchentry_ai AFTER INSERT ON lessons_searchentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title_terms, body_terms) VALUES (new.id, new.title_terms, new.body_terms); END",
+    f"CREATE TRIGGER lessons_searchentry_ad AFTER DELETE ON lessons_searchentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title_terms, body_terms) "
+    f"VALUES ('delete', old.id, old.title_terms, old.body_terms); END",
+    f"CREATE TRIGGER lessons_searchentry_au AFTER UPDATE ON lessons_searchentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title_terms, body_terms) "
+    f"VALUES ('delete', old.id, old.title_terms, old.body_terms); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title_terms, body_terms) VALUES (new.id, new.title_terms, new.body_terms); END",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS lessons_searchentry_au',
+    'DROP TRIGGER IF EXISTS lessons_searchentry_ad',
+    'DROP TRIGGER IF EXISTS lessons_searchentry_ai',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+POSTGRES_CREATE = [
+    "CREATE INDEX lessons_searchentry_tsv_idx ON lessons_searchentry USING GIN ("
+    "(setweight(to_tsvector('simple', title_terms), 'A') || setweight(to_tsvector('simple', body_terms), 'B')))",
+]
+POSTGRES_DROP = ['DROP INDEX IF EXISTS lessons_searchentry_tsv_idx']
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+create_index = _run({'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE})
+drop_index = _run({'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0009_lesson_order_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title_terms', models.TextField(verbose_name='タイトルの検索語')),
+                ('body_terms', models.TextField(blank=True, verbose_name='本文の検索語')),
+                ('lesson', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='lessons.lesson', verbose_name='レッスン')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='lessons.material', verbose_name='教材')),
+            ],
+            options={
+                'verbose_name': '検索用エントリ',
+                'verbose_name_plural': '検索用エントリ一覧',
+                'constraints': [models.UniqueConstraint(fields=('lesson',), name='search_entry_lesson_uniq'), models.UniqueConstraint(condition=models.Q(('lesson__isnull', True)), fields=('material',), name='search_entry_material_uniq')],
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
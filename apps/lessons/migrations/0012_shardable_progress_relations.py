@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:22
+
+'''
+進捗・進捗サマリ・学習統計のユーザー・レッスン・教材への外部キー制約を外すマイグレーション。
+
+シャード（apps.shards）にはユーザー・レッスン・教材の行がないため、制約があるとシャードへ書き込めない。
+一方、制約は ORM を通さない書き込み（一括インポートの executemany・手作業の SQL）による不整合を防いでいるため、
+シャーディングが有効な（DJANGO_DB_SHARDS を指定した）状態でマイグレーションした DB でだけ外す。
+モデルの状態は常に db_constraint=False とし（設定によって makemigrations の結果が変わらないように）、
+連鎖削除はどちらの場合も ORM と apps/lessons/signals.py が行う。
+
+シャーディングを導入する際は、各シャードを migrate --database で作成する（この時点で制約のない表が作られる）。
+default はユーザー・レッスン・教材を持つため、制約を残したままでも default に置かれる行は制約を満たす。
+'''
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from apps.shards.routers import sharding_enabled
+
+
+class AlterFieldWhenSharded(migrations.AlterField):
+    # モデルの状態は常に変更し、DB の外部キー制約はシャーディングが有効な場合だけ変更する
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if sharding_enabled():
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if sharding_enabled():
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0011_progress_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AlterFieldWhenSharded(
+            model_name='learningstats',
+            name='user',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='learning_stats', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー'),
+        ),
+        AlterFieldWhenSharded(
+            model_name='progress',
+            name='lesson',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='progresses', to='lessons.lesson', verbose_name='レッスン'),
+        ),
+        AlterFieldWhenSharded(
+            model_name='progress',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='progresses', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー'),
+        ),
+        AlterFieldWhenSharded(
+            model_name='progresssummary',
+            name='material',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='progress_summaries', to='lessons.material', verbose_name='教材'),
+        ),
+        AlterFieldWhenSharded(
+            model_name='progresssummary',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='progress_summaries', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー'),
+        ),
+    ]
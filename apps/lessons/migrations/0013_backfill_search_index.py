@@ -0,0 +1,25 @@
+# apps/lessons/migrations/0013_backfill_search_index.py
+
+'''
+0010_search_entries の適用前からある教材・レッスンを、全文検索の検索用エントリに登録するマイグレーション。
+管理画面の検索（IndexedSearchMixin）は検索用エントリだけを引くため、登録するまで既存の行が検索に一致しない。
+登録済みのエントリも作り直す（manage.py rebuild_search_index と同じ処理）。
+'''
+
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    from apps.lessons.search import rebuild_index
+    rebuild_index(using=schema_editor.connection.alias, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0012_shardable_progress_relations'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
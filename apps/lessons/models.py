@@ -1,15 +1,75 @@
 # apps/lessons/models.py
 
+from datetime import date, timedelta
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.shards.routers import shard_aliases, shard_for_user
+
+
+#
+# バージョン付きモデル：保存のたびに version を1つ進める（API の ETag・更新競合の検出に使用）
+# ------------------------------------------------------------------------------
+class VersionedModel(models.Model):
+    version = models.PositiveIntegerField("バージョン", default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # QuerySet.update() / bulk_update() では進まないため、呼び出し側で F('version') + 1 を指定すること
+        if not self._state.adding:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
+
+
+#
+# 教材クエリセット：一覧表示用の集計値を1クエリで付与する
+# ------------------------------------------------------------------------------
+class MaterialQuerySet(models.QuerySet):
+    def with_lesson_counts(self):
+        # 教材ごとのレッスン数を相関サブクエリで付与（JOIN による行の膨張を避ける）
+        lessons = (
+            Lesson.objects.filter(material=OuterRef('pk'))
+            .order_by()
+            .values('material')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return self.annotate(lesson_count=Coalesce(Subquery(lessons), 0))
+
+    def with_done_counts(self, user):
+        # 指定ユーザーの完了レッスン数を、進捗サマリ（ユーザー×教材で1行）から取得する
+        # （進捗テーブルを集計しないため、進捗件数が増えてもコストは変わらない）
+        done = ProgressSummary.objects.filter(user=user, material=OuterRef('pk')).values('done_count')[:1]
+        return self.annotate(done_count=Coalesce(Subquery(done), 0))
+
+    def lock(self, pk):
+        """
+        教材 pk の行をトランザクションの終わりまでロックする（トランザクション内で呼び出すこと）。
+        教材内のレッスンの表示順序を決める処理（末尾への追加・移動・振り直し）は、これで教材ごとに1つずつ実行し、
+        同時に同じ値を採番して一意制約 (material, order) に抵触しないようにする。
+        SELECT ... FOR UPDATE のない SQLite では、書き込みが DB 全体で直列に行われる（抵触した側は IntegrityError）。
+        """
+        return self.select_for_update().filter(pk=pk).values_list('pk', flat=True).first()
+
 
 #
 # 教材モデル：学習のベースとなる書籍やチュートリアルなどを表現
 # ------------------------------------------------------------------------------
-class Material(models.Model):
+class Material(VersionedModel):
     title = models.CharField("タイトル", max_length=100)  # 教材のタイトル
     description = models.TextField("説明", blank=True)     # 教材の説明（省略可能）
 
+    objects = MaterialQuerySet.as_manager()  # 一覧用の集計メソッドを持つマネージャ
+
     def __str__(self):
         # 管理画面などでの表示名
         return f"教材: {self.title}"
@@ -19,28 +79,170 @@ class Material(models.Model):
         verbose_name_plural = '教材一覧'   # 管理画面での複数形表示
 
 
+#
+# レッスンクエリセット：表示順序の採番と、ユーザーごとの進捗状況を1クエリで重ねて取得する
+# ------------------------------------------------------------------------------
+class LessonQuerySet(models.QuerySet):
+    def next_order(self):
+        # 末尾に追加するレッスンの表示順序（現在の最大値 + 間隔）
+        gap = getattr(settings, 'LESSON_ORDER_GAP', 1024)
+        last = self.aggregate(last=models.Max('order'))['last']
+        return gap if last is None else last + gap
+
+    def with_latest_status(self, user):
+        # 各レッスンについて、指定ユーザーの最新の進捗ステータスを相関サブクエリで付与
+        # （記録日が同じ場合は後から登録したものを最新とみなす）
+        latest = (
+            Progress.objects.filter(user=user, lesson=OuterRef('pk'))
+            .order_by('-date', '-id')
+            .values('status')[:1]
+        )
+        return self.annotate(latest_status=Subquery(latest))
+
+
 #
 # レッスンモデル：教材に属する章やステップを表現
 # ------------------------------------------------------------------------------
-class Lesson(models.Model):
+class Lesson(VersionedModel):
     material = models.ForeignKey(
         Material,
         on_delete=models.CASCADE,      # 教材が削除されたら関連レッスンも削除
         related_name="lessons",        # material.lessons で関連レッスンにアクセス可能
-        verbose_name="教材"
+        verbose_name="教材",
+        db_index=False,                # (material, order) の一意制約のインデックスで代用できるため作成しない
     )
     title = models.CharField("レッスンタイトル", max_length=100)  # レッスンのタイトル
-    order = models.IntegerField("表示順序")                     # 教材内での並び順を指定
+    # 教材内での並び順。間隔（LESSON_ORDER_GAP）を空けた値を振り、並べ替えは ordering.py で
+    # 前後のレッスンの中間の値を割り当てる（移動のたびに更新するのは1行だけで済む）
+    order = models.IntegerField("表示順序")
+
+    objects = LessonQuerySet.as_manager()  # 進捗の重ね合わせ用メソッドを持つマネージャ
 
     class Meta:
         ordering = ['order']                  # 表示順は order 昇順に固定
         verbose_name = "レッスン"            # 管理画面での単数形表示
         verbose_name_plural = "レッスン一覧" # 管理画面での複数形表示
+        constraints = [
+            # 教材内で表示順序の重複を禁止（並べ替えの前後関係を一意に定めるため）
+            models.UniqueConstraint(
+                fields=['material', 'order'],
+                name='lesson_material_order_uniq',
+                violation_error_message="この教材には同じ表示順序のレッスンが既に存在します。",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.order is not None:
+            return super().save(*args, **kwargs)
+        # 表示順序が未指定なら教材の末尾に追加する（同時に追加されたレッスンと同じ値にならないよう、教材をロックして採番する）
+        with transaction.atomic():
+            Material.objects.lock(self.material_id)
+            self.order = Lesson.objects.filter(material_id=self.material_id).next_order()
+            super().save(*args, **kwargs)
 
     def __str__(self):
         # 例: 「Python入門 > レッスン: 条件分岐」
         return f"{self.material.title} > レッスン: {self.title}"
 
+#
+# ユーザーごとにシャードへ分割するモデルのクエリセット（進捗・進捗サマリ・学習統計）
+# ------------------------------------------------------------------------------
+# シャーディング（settings.DB_SHARDS）が有効な場合、どのシャードを読むかを明示しないクエリは
+# ShardRouter が ShardKeyError にする。無効な場合は全て default を指す。
+class UserShardedQuerySet(models.QuerySet):
+    # シャードをまたいで合算できる集計（件数・合計は足し合わせ、最小・最大はその最小・最大）
+    SHARD_COMBINERS = {Count: sum, Sum: sum, Min: min, Max: max}
+
+    def in_shard_of(self, user):
+        # user（インスタンスまたは主キー）の行があるシャードを対象にする（一括登録など、絞り込まない処理用）
+        return self.using(shard_for_user(getattr(user, 'pk', user)))
+
+    def for_user(self, user):
+        # user の行だけを、その行があるシャードから読む
+        user_id = getattr(user, 'pk', user)
+        return self.in_shard_of(user_id).filter(user_id=user_id)
+
+    def per_shard(self):
+        # 同じ条件のクエリセットをシャードごとに返す（全ユーザーを対象とする処理のファンアウト用）
+        return [self.using(alias) for alias in shard_aliases()]
+
+    def aggregate_shards(self, **aggregates):
+        """
+        全てのシャードで aggregate() を実行し、結果を合算して返す（シャードが1つなら aggregate() と同じ）。
+        平均などシャードごとの結果から求められない集計は、件数と合計に分けて指定すること。
+        """
+        combiners = {}
+        for name, aggregate in aggregates.items():
+            if type(aggregate) not in self.SHARD_COMBINERS:
+                raise ValueError(f'{name}: {type(aggregate).__name__} はシャードをまたいで合算できません。')
+            combiners[name] = self.SHARD_COMBINERS[type(aggregate)]
+        results = [queryset.aggregate(**aggregates) for queryset in self.per_shard()]
+        combined = {}
+        for name, combine in combiners.items():
+            values = [result[name] for result in results if result[name] is not None]
+            combined[name] = combine(values) if values else None
+        return combined
+
+
+#
+# 進捗クエリセット
+# ------------------------------------------------------------------------------
+class ProgressQuerySet(UserShardedQuerySet):
+    def delete(self):
+        # 削除した分を進捗サマリ・学習統計・変更履歴へまとめて反映する（行ごとの削除シグナルは発行しない）
+        from .bulk import delete_progress  # bulk は models を読み込むため、ここで読み込む
+        return delete_progress(self)
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def _status_rows(self):
+        # (user, lesson, -date, -id) の順に読み、レッスンごとの先頭行が最新になるようにする
+        return self.order_by('lesson_id', '-date', '-id').values_list('lesson_id', 'status')
+
+    def latest_statuses(self):
+        # 絞り込んだ進捗から {lesson_id: 最新ステータス} の辞書を作る
+        statuses = {}
+        for lesson_id, status in self._status_rows():
+            statuses.setdefault(lesson_id, status)
+        return statuses
+
+    async def alatest_statuses(self):
+        # latest_statuses() の非同期版
+        statuses = {}
+        async for lesson_id, status in self._status_rows():
+            statuses.setdefault(lesson_id, status)
+        return statuses
+
+    def date_buckets(self, field, kind):
+        """
+        field の値が存在する年・月・日（kind）の一覧を昇順で返す（管理画面の日付階層用）。
+
+        QuerySet.dates() は DISTINCT のために対象の全行を走査するため、
+        「前の区切りの次の期間以降の最小値」をインデックスで1件ずつ引く（区切りの数 + 1 クエリ）。
+        """
+        queryset = self.order_by()
+        later = self.model._default_manager.using(self.db)
+        if queryset.query.distinct:
+            later = later.distinct()
+        buckets = []
+        current = queryset.aggregate(first=Min(field))['first']
+        while current is not None:
+            if kind == 'year':
+                bucket, following = current.replace(month=1, day=1), date(current.year + 1, 1, 1)
+            elif kind == 'month':
+                bucket = current.replace(day=1)
+                following = date(bucket.year + bucket.month // 12, bucket.month % 12 + 1, 1)
+            else:
+                bucket, following = current, current + timedelta(days=1)
+            buckets.append(bucket)
+            # 既に日付で絞り込まれている場合も新しい下限で索引を引くよう、条件の先頭に置く
+            # （SQLite は同じ列の下限が複数あると最初の条件を索引の範囲に使う）
+            following_rows = later.filter(**{f'{field}__gte': following}) & queryset
+            current = following_rows.aggregate(first=Min(field))['first']
+        return buckets
+
+
 #
 # 進捗モデル：ユーザーがどのレッスンをどこまで学習したかを記録
 # ------------------------------------------------------------------------------
@@ -51,26 +253,218 @@ class Progress(models.Model):
         ("done", "完了"),
     ]
 
+    # 進捗はシャード（別のDB）に置けるため、ユーザー・レッスンへの外部キー制約は、シャーディングが有効な状態で
+    # マイグレーションした DB には作らない（migrations/0012。削除時の連鎖削除は ORM と signals.py で行う）
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,       # ユーザーが削除されたら進捗も削除
         related_name="progresses",      # user.progresses でアクセス可能
         verbose_name="ユーザー",
-        null=False
+        null=False,
+        db_index=False,                 # Meta.indexes の (user, lesson, ...) 複合インデックスで代替
+        db_constraint=False,
     )
     lesson = models.ForeignKey(
         Lesson,
         on_delete=models.CASCADE,       # レッスンが削除されたら進捗も削除
         related_name="progresses",      # lesson.progresses でアクセス可能
-        verbose_name="レッスン"
+        verbose_name="レッスン",
+        db_index=False,                 # Meta.indexes の (lesson, status) 複合インデックスで代替
+        db_constraint=False,
     )
-    date = models.DateField("記録日", auto_now_add=True)  # 進捗の記録日（自動設定）
+    # 進捗の記録日（既定は登録日。一括インポートでは移行元の日付を保持できるよう auto_now_add は使わない）
+    date = models.DateField("記録日", default=timezone.localdate, editable=False)
     status = models.CharField("学習ステータス", max_length=20, choices=STATUS_CHOICES)  # 学習状況を選択肢から指定
 
+    objects = ProgressQuerySet.as_manager()  # 最新ステータス集計用メソッドを持つマネージャ
+
     class Meta:
         verbose_name = "進捗"             # 管理画面での単数形表示
         verbose_name_plural = "進捗一覧"  # 管理画面での複数形表示
+        indexes = [
+            # 「このユーザーのこのレッスンの最新状況」を索引の先頭1件で引けるようにする
+            # （LessonQuerySet.with_latest_status の並び順 -date, -id と一致させている）
+            models.Index(fields=['user', 'lesson', '-date', '-id'], name='progress_user_lesson_date_idx'),
+            # レッスン単位のステータス集計（完了者数など）用
+            models.Index(fields=['lesson', 'status'], name='progress_lesson_status_idx'),
+            # 管理画面のステータス・日付での絞り込み用
+            models.Index(fields=['status', 'date'], name='progress_status_date_idx'),
+            # 管理画面の日付階層・日付の新しい順の一覧用（絞り込みなしの場合）
+            models.Index(fields=['date'], name='progress_date_idx'),
+        ]
+        constraints = [
+            # 選択肢以外のステータスが一括登録などで紛れ込まないようにDB側でも制約する
+            models.CheckConstraint(
+                condition=models.Q(status__in=['not_started', 'in_progress', 'done']),
+                name='progress_status_valid',
+            ),
+        ]
+
+    def delete(self, using=None, keep_parents=False):
+        # 1件の削除も QuerySet.delete() と同じく、サマリ等への反映をまとめて行う処理を通す
+        return Progress.objects.using(using or self._state.db).filter(pk=self.pk).delete()
 
     def __str__(self):
         # 例: 「Python入門 > レッスン: 条件分岐 の進捗 - 学習中（2025-07-27）」
         return f"{self.lesson} の進捗 - {self.get_status_display()}（{self.date}）"
+
+
+#
+# 進捗サマリモデル：ユーザー×教材ごとの進捗集計を保持する非正規化テーブル
+# ------------------------------------------------------------------------------
+# Progress の登録やレッスンの追加・削除に合わせて signals.py から差分更新される。
+# 各ステータスの件数は「そのステータスが最新となっているレッスン数」を表す。
+# 不整合が疑われる場合は manage.py rebuild_progress_summaries で再構築できる。
+class ProgressSummary(models.Model):
+    # 進捗と同じシャードに置くため、シャードでは外部キー制約を作らない（Progress と同様）
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,           # ユーザーが削除されたらサマリも削除
+        related_name="progress_summaries",  # user.progress_summaries でアクセス可能
+        verbose_name="ユーザー",
+        db_constraint=False,
+    )
+    material = models.ForeignKey(
+        Material,
+        on_delete=models.CASCADE,           # 教材が削除されたらサマリも削除
+        related_name="progress_summaries",  # material.progress_summaries でアクセス可能
+        verbose_name="教材",
+        db_constraint=False,
+    )
+    lesson_count = models.PositiveIntegerField("レッスン数", default=0)         # 教材内の全レッスン数
+    not_started_count = models.PositiveIntegerField("未開始", default=0)        # 最新が「未開始」のレッスン数
+    in_progress_count = models.PositiveIntegerField("学習中", default=0)        # 最新が「学習中」のレッスン数
+    done_count = models.PositiveIntegerField("完了", default=0)                 # 最新が「完了」のレッスン数
+    last_activity = models.DateField("最終学習日", null=True, blank=True)       # 最後に進捗を記録した日
+
+    objects = UserShardedQuerySet.as_manager()  # シャードを指定して読むためのマネージャ
+
+    class Meta:
+        verbose_name = "進捗サマリ"             # 管理画面での単数形表示
+        verbose_name_plural = "進捗サマリ一覧"  # 管理画面での複数形表示
+        constraints = [
+            # ユーザー×教材で1行に限定（差分更新の対象を一意に特定するため）
+            models.UniqueConstraint(fields=['user', 'material'], name='progress_summary_user_material_uniq'),
+        ]
+
+    def __str__(self):
+        # 例: 「Python入門: 3 / 10 完了」
+        return f"{self.material.title}: {self.done_count} / {self.lesson_count} 完了"
+
+
+#
+# 学習統計モデル：ホーム画面（ダッシュボード）用にユーザーごとの統計を事前計算して保持する
+# ------------------------------------------------------------------------------
+# Progress の登録時に signals.py から差分更新される（再構築は rebuild_progress_summaries）。
+# ステータス別の件数や教材ごとの完了率は ProgressSummary から求める。
+class LearningStats(models.Model):
+    # 進捗と同じシャードに置くため、シャードでは外部キー制約を作らない（Progress と同様）
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,        # ユーザーが削除されたら統計も削除
+        related_name="learning_stats",   # user.learning_stats でアクセス可能
+        verbose_name="ユーザー",
+        db_constraint=False,
+    )
+    total_records = models.PositiveIntegerField("記録数", default=0)           # これまでの進捗記録の件数
+    current_streak = models.PositiveIntegerField("連続学習日数", default=0)    # 最終学習日まで続いている連続日数
+    longest_streak = models.PositiveIntegerField("最長連続学習日数", default=0)
+    last_study_date = models.DateField("最終学習日", null=True, blank=True)
+    recent_activity = models.JSONField("最近の記録", default=list, blank=True)  # 新しい順の記録（表示用のタイトル付き）
+
+    objects = UserShardedQuerySet.as_manager()  # シャードを指定して読むためのマネージャ
+
+    class Meta:
+        verbose_name = "学習統計"             # 管理画面での単数形表示
+        verbose_name_plural = "学習統計一覧"  # 管理画面での複数形表示
+
+    def __str__(self):
+        return f"{self.user} の学習統計"
+
+    @property
+    def active_streak(self):
+        # 前日までに記録が途切れていれば、連続記録は 0 日として表示する
+        if self.last_study_date and self.last_study_date >= timezone.localdate() - timedelta(days=1):
+            return self.current_streak
+        return 0
+
+
+#
+# 変更履歴モデル：オフライン対応クライアントの差分同期（/api/sync/）用の変更フィード
+# ------------------------------------------------------------------------------
+# 教材・レッスン・進捗の登録・更新・削除のたびに1行追記され、id がそのまま単調増加の変更番号になる。
+# クライアントは前回受け取った番号より後の行だけを取得し、変更のあった行の最新内容と削除（tombstone）を受け取る。
+# 記録は changelog.py（シグナル・一括登録処理から呼び出し）で行い、古い行は prune_changelog で削除する。
+class ChangeLogEntry(models.Model):
+    KIND_MATERIAL = 'material'
+    KIND_LESSON = 'lesson'
+    KIND_PROGRESS = 'progress'
+    KIND_CHOICES = [
+        (KIND_MATERIAL, '教材'),
+        (KIND_LESSON, 'レッスン'),
+        (KIND_PROGRESS, '進捗'),
+    ]
+
+    kind = models.CharField("対象", max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField("対象ID")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,   # ユーザーが削除されたら、そのユーザーの進捗の履歴も削除
+        null=True, blank=True,      # 教材・レッスンは全員に共通のため NULL
+        related_name="+",
+        verbose_name="ユーザー",
+        db_index=False,             # Meta.indexes の (user, id) 複合インデックスで代替
+    )
+    deleted = models.BooleanField("削除", default=False)
+    recorded_at = models.DateTimeField("記録日時", default=timezone.now)
+
+    class Meta:
+        verbose_name = "変更履歴"
+        verbose_name_plural = "変更履歴一覧"
+        indexes = [
+            # 同期は全員に共通の履歴（user IS NULL）と自分の履歴を、それぞれ「id > 変更番号」の範囲で読む
+            models.Index(fields=['user', 'id'], name='changelog_user_id_idx'),
+        ]
+
+    def __str__(self):
+        action = "削除" if self.deleted else "更新"
+        return f"#{self.pk} {self.get_kind_display()} {self.object_id} {action}"
+
+
+#
+# 検索用エントリモデル：教材・レッスンの全文検索インデックスの元データ
+# ------------------------------------------------------------------------------
+# 教材（lesson が NULL）・レッスンごとに1行。タイトル・説明を search.to_terms() で
+# 単語・2文字ずつの語（bi-gram）に分割した文字列を保持し、SQLite では FTS5 の仮想テーブル、
+# PostgreSQL では GIN インデックスで検索する（migrations/0010_search_entries.py）。
+# 教材・レッスンの保存時に signals.py から更新される（再構築は rebuild_search_index）。
+class SearchEntry(models.Model):
+    material = models.ForeignKey(
+        Material,
+        on_delete=models.CASCADE,   # 教材が削除されたらエントリも削除
+        related_name="+",
+        verbose_name="教材"
+    )
+    lesson = models.ForeignKey(
+        Lesson,
+        on_delete=models.CASCADE,   # レッスンが削除されたらエントリも削除
+        null=True, blank=True,      # 教材自体のエントリは NULL
+        related_name="+",
+        verbose_name="レッスン",
+        db_index=False,             # 一意制約のインデックスで代用できるため作成しない
+    )
+    title_terms = models.TextField("タイトルの検索語")
+    body_terms = models.TextField("本文の検索語", blank=True)
+
+    class Meta:
+        verbose_name = "検索用エントリ"
+        verbose_name_plural = "検索用エントリ一覧"
+        constraints = [
+            models.UniqueConstraint(fields=['lesson'], name='search_entry_lesson_uniq'),
+            models.UniqueConstraint(
+                fields=['material'], condition=Q(lesson__isnull=True), name='search_entry_material_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.material_id}/{self.lesson_id or '-'}: {self.title_terms[:40]}"
@@ -0,0 +1,107 @@
+# apps/lessons/ordering.py
+
+'''
+教材内のレッスンの並べ替え。
+
+Lesson.order には間隔（LESSON_ORDER_GAP、既定 1024）を空けた値を振っておき、
+移動するレッスンには移動先の前後のレッスンの中間の値を割り当てる。
+500件のレッスンの途中へ挿入しても更新するのは移動した1行だけで済み、
+中間に整数の空きがなくなった場合だけ、その教材のレッスンを振り直す（rebalance）。
+移動・振り直しは教材の行をロックしてから行い（Material.objects.lock()）、同じ教材への同時の移動・追加が
+同じ値を採番しないようにする。
+'''
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Min
+
+from . import caching, changelog
+from .models import Lesson, Material
+
+
+class OrderingError(ValueError):
+    pass
+
+
+def order_gap():
+    return getattr(settings, 'LESSON_ORDER_GAP', 1024)
+
+
+def move_lesson(lesson, *, after=None, before=None):
+    """
+    lesson を同じ教材内のレッスン after の直後（または before の直前）へ移動し、新しい表示順序を返す。
+    """
+    if (after is None) == (before is None):
+        raise OrderingError('移動先は after / before のどちらか一方で指定してください。')
+    anchor = after if after is not None else before
+    if anchor.pk == lesson.pk:
+        raise OrderingError('移動先に自分自身は指定できません。')
+    if anchor.material_id != lesson.material_id:
+        raise OrderingError('別の教材のレッスンの前後には移動できません。')
+
+    with transaction.atomic():
+        # ロックを取得するまでに他の移動・振り直しで移動先の表示順序が変わっている場合があるため、読み直す
+        Material.objects.lock(lesson.material_id)
+        anchor.refresh_from_db(fields=['order'])
+        order = _between(*_neighbors(lesson, after=after, before=before))
+        if order is None:
+            # 前後のレッスンの間に空きがないため、振り直してから再計算する（振り直し後は必ず空きがある）
+            rebalance(lesson.material_id)
+            anchor.refresh_from_db(fields=['order'])
+            lesson.refresh_from_db(fields=['order', 'version'])
+            order = _between(*_neighbors(lesson, after=after, before=before))
+        lesson.order = order
+        # save() 経由で version を進め、キャッシュの無効化・変更履歴の記録（signals.py）も行う
+        lesson.save(update_fields=['order'])
+    return order
+
+
+def _neighbors(lesson, *, after=None, before=None):
+    # 移動先の直前・直後のレッスンの表示順序（端の場合は None）
+    siblings = Lesson.objects.filter(material_id=lesson.material_id).exclude(pk=lesson.pk)
+    if after is not None:
+        high = siblings.filter(order__gt=after.order).aggregate(order=Min('order'))['order']
+        return after.order, high
+    low = siblings.filter(order__lt=before.order).aggregate(order=Max('order'))['order']
+    return low, before.order
+
+
+def _between(low, high):
+    # low と high の中間の整数（空きがなければ None）
+    if low is None:
+        return high - order_gap()
+    if high is None:
+        return low + order_gap()
+    if high - low < 2:
+        return None
+    return (low + high) // 2
+
+
+def rebalance(material_id, batch_size=500):
+    """
+    教材のレッスンの表示順序を、現在の並び順のまま間隔 LESSON_ORDER_GAP ずつの値に振り直す。
+
+    一意制約 (material, order) に途中で抵触しないよう、
+    1. 全行を現在の値とも振り直し後の値とも重ならない範囲へ1文で退避し（同時に version を進める）
+    2. 振り直し後の値を batch_size 件ずつ bulk_update で書き込む
+    の2段階で更新する。
+    """
+    gap = order_gap()
+    lessons = Lesson.objects.filter(material_id=material_id)
+    with transaction.atomic():
+        Material.objects.lock(material_id)
+        ids = list(lessons.select_for_update().order_by('order', 'pk').values_list('pk', flat=True))
+        if not ids:
+            return 0
+        bounds = lessons.aggregate(low=Min('order'), high=Max('order'))
+        shift = max(bounds['high'], gap * len(ids)) - bounds['low'] + 1
+        lessons.update(order=F('order') + shift, version=F('version') + 1)
+        Lesson.objects.bulk_update(
+            [Lesson(pk=pk, order=gap * (index + 1)) for index, pk in enumerate(ids)],
+            ['order'],
+            batch_size=batch_size,
+        )
+        # QuerySet.update() / bulk_update() はシグナルを発行しないため、キャッシュの無効化と変更履歴の記録を行う
+        caching.bump_material_version(material_id)
+        changelog.record_many(changelog.LESSON, ids)
+    return len(ids)
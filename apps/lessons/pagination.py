@@ -0,0 +1,175 @@
+# apps/lessons/pagination.py
+
+'''
+キーセット（カーソル）方式のページネーション。
+
+OFFSET 方式はページが後ろになるほど読み飛ばす行数が増えるため、
+主キー（id）を境界値としてインデックスで直接目的の位置へ移動する方式を採用する。
+1ページの取得コストはテーブル全体の件数に依存せず、常に「ページサイズ + 1 件」の読み取りで済む。
+'''
+
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+from apps.shards.routers import sharded_models, sharding_enabled
+
+
+#
+# ページ情報：取得した行と前後ページへのカーソルを保持する
+# ------------------------------------------------------------------------------
+class KeysetPage:
+    def __init__(self, items, *, has_next, has_previous, key):
+        self.items = items                # 現在ページの行（id 昇順）
+        self.has_next = has_next          # 次ページが存在するか
+        self.has_previous = has_previous  # 前ページが存在するか
+        self._key = key                   # 行からカーソル値（id）を取り出す関数
+
+    @property
+    def next_cursor(self):
+        # 次ページは「現在ページ末尾の id より大きい行」
+        if self.has_next and self.items:
+            return self._key(self.items[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        # 前ページは「現在ページ先頭の id より小さい行」
+        if self.has_previous and self.items:
+            return self._key(self.items[0])
+        return None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def parse_cursor(value):
+    """
+    クエリパラメータのカーソル値を整数に変換する。
+    不正な値（数値以外・負数）は「カーソルなし」として扱い、先頭ページを返す。
+    """
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor >= 0 else None
+
+
+def get_page_size(request, default, maximum, param='size'):
+    """
+    リクエストからページサイズを取得し、1 〜 maximum の範囲に丸める。
+    上限を設けることで、巨大なページ指定による負荷を防ぐ。
+    """
+    try:
+        size = int(request.GET.get(param, default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def _page_queryset(queryset, page_size, after, before):
+    # ページサイズ + 1 件を取得するクエリ（「前へ」は降順で取得してから並べ直す）
+    if before is not None:
+        return queryset.filter(pk__lt=before).order_by('-pk')[:page_size + 1]
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    return queryset.order_by('pk')[:page_size + 1]
+
+
+def _make_page(rows, page_size, after, before, key):
+    # 余分な1件の有無で続きのページがあるかを判定する
+    if before is not None:
+        return KeysetPage(rows[:page_size][::-1], has_next=True, has_previous=len(rows) > page_size, key=key)
+    return KeysetPage(rows[:page_size], has_next=len(rows) > page_size, has_previous=after is not None, key=key)
+
+
+def keyset_paginate(queryset, *, page_size, after=None, before=None, key=attrgetter('pk')):
+    """
+    queryset を主キー昇順のキーセット方式でページ分割する。
+
+    - after  : この id より後ろのページを取得（次へ）
+    - before : この id より前のページを取得（前へ）
+
+    ページサイズ + 1 件を取得し、余分な1件の有無で続きのページがあるかを判定する。
+    """
+    rows = list(_page_queryset(queryset, page_size, after, before))
+    return _make_page(rows, page_size, after, before, key)
+
+
+async def akeyset_paginate(queryset, *, page_size, after=None, before=None, key=attrgetter('pk')):
+    """
+    keyset_paginate() の非同期版（非同期ビューから利用する）。
+    """
+    rows = [row async for row in _page_queryset(queryset, page_size, after, before)]
+    return _make_page(rows, page_size, after, before, key)
+
+
+#
+# 件数の推定：管理画面の一覧で、巨大なテーブルの COUNT(*) による全件走査を避ける
+# ------------------------------------------------------------------------------
+def estimate_row_count(model, using='default'):
+    """
+    テーブルの行数の推定値を返す（推定できなければ None）。
+    - PostgreSQL: 統計情報（pg_class.reltuples。VACUUM / ANALYZE 時に更新）
+    - MySQL     : information_schema.TABLES.TABLE_ROWS
+    - SQLite    : 統計情報（sqlite_stat1。ANALYZE 時に作成・更新）
+    - その他    : 主キーの最大値（整数の自動採番で、削除が少なければ行数に近い。主キーのインデックスで即座に求まる）
+    シャード化したモデルは、シャードごとに主キーの採番範囲をずらしている（apps/shards/signals.py）ため、
+    主キーの最大値は行数と無関係になる。統計情報がなければ None を返し、件数の上限まで数えさせる。
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0]
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [table],
+            )
+            row = cursor.fetchone()
+            if row and row[0]:
+                return row[0]
+        elif connection.vendor == 'sqlite':
+            # stat 列の先頭の数値がテーブルの行数（ANALYZE を一度も実行していなければ sqlite_stat1 自体がない）
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+                if row and row[0]:
+                    return int(row[0].split()[0])
+    if sharding_enabled() and model._meta.label in sharded_models():
+        return None
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField', 'SmallAutoField'):
+        return model._default_manager.using(using).aggregate(last=Max('pk'))['last'] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    件数の多いテーブル向けのページネータ（管理画面の ModelAdmin.paginator に指定する）。
+
+    - 絞り込みなし: テーブルの推定行数が ADMIN_EXACT_COUNT_LIMIT を超えれば推定値を件数とする
+    - 絞り込みあり: ADMIN_EXACT_COUNT_LIMIT + 1 件まで数えた時点で打ち切る（「それ以上」を表す）
+    どちらも件数に関係なく一定時間で求まる。件数が上限以下なら正確な件数になる。
+    """
+
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10_000)
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit + 1].count()
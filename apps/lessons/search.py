@@ -0,0 +1,236 @@
+# apps/lessons/search.py
+
+'''
+教材（タイトル・説明）とレッスン（タイトル）の全文検索。
+
+日本語は単語の区切りがないため、漢字・かなの連続は2文字ずつの語（bi-gram）に、
+英数字は単語ごとに分割した文字列（to_terms()）を SearchEntry に保存し、DB の全文検索インデックスで引く。
+  - SQLite     : FTS5 の仮想テーブル（外部コンテンツ。SearchEntry へのトリガーで自動的に同期）
+  - PostgreSQL : to_tsvector('simple', ...) の式に対する GIN インデックス
+  - その他の DB: LIKE による部分一致（インデックスなし）
+検索語も同じ規則で分割し、語の並びが連続しているもの（フレーズ）を探すため、
+「条件分岐」は「条件 件分 分岐」の並びとして一致する（部分文字列の検索と同じ結果になる）。
+1文字の漢字・かなの検索語は、その文字で終わる bi-gram（「第一条」の「一条」）をインデックスで引けないため、
+保存した文字列の部分一致（LIKE）で探す。
+'''
+
+import re
+import unicodedata
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Lesson, Material, SearchEntry
+
+# 漢字・ひらがな・カタカナ（長音記号を含む）の連続、またはそれ以外の単語の連続
+_CJK = r'\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[^\W{_CJK}_]+')
+
+# SQLite の FTS5 仮想テーブル名（migrations/0010_search_entries.py で作成）
+FTS_TABLE = 'lessons_searchentry_fts'
+# PostgreSQL の GIN インデックスと同じ式（インデックスを使うため、検索時も同じ式で比較する）
+PG_VECTOR = (
+    "(setweight(to_tsvector('simple', title_terms), 'A') || "
+    "setweight(to_tsvector('simple', body_terms), 'B'))"
+)
+# タイトルの一致を説明の一致より上位にするための重み（SQLite の bm25()）
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+
+def tokenize(text):
+    """
+    文字列を検索語のリストに分割する（全角英数字・大文字は NFKC 正規化と小文字化で揃える）。
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall(unicodedata.normalize('NFKC', text or '').lower()):
+        if re.match(rf'[{_CJK}]', run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def to_terms(text):
+    # SearchEntry に保存する形式（検索語を空白で連結した文字列）
+    return ' '.join(tokenize(text))
+
+
+def parse_query(query):
+    """
+    検索語（空白区切りで AND 検索）を、語ごとの検索語のリストに分割する。
+    """
+    return [terms for terms in (tokenize(word) for word in (query or '').split()) if terms]
+
+
+def _split_words(words):
+    """
+    parse_query() の結果を (インデックスで引く語のリスト, 部分一致で探す1文字の漢字・かなのリスト) に分ける。
+    """
+    indexed, chars = [], []
+    for terms in words:
+        if len(terms) == 1 and len(terms[0]) == 1 and re.match(rf'[{_CJK}]', terms[0]):
+            chars.append(terms[0])
+        else:
+            indexed.append(terms)
+    return indexed, chars
+
+
+# ----------------------------------------
+# インデックスの更新
+# ----------------------------------------
+def index_material(material):
+    SearchEntry.objects.update_or_create(
+        material_id=material.pk, lesson=None,
+        defaults={'title_terms': to_terms(material.title), 'body_terms': to_terms(material.description)},
+    )
+
+
+def index_lesson(lesson):
+    SearchEntry.objects.update_or_create(
+        lesson_id=lesson.pk,
+        defaults={'material_id': lesson.material_id, 'title_terms': to_terms(lesson.title), 'body_terms': ''},
+    )
+
+
+def index_new_lessons(lessons):
+    # bulk_create したレッスン（主キー設定済み・未登録のもの）の検索用エントリをまとめて登録する
+    SearchEntry.objects.bulk_create(
+        [SearchEntry(material_id=lesson.material_id, lesson_id=lesson.pk, title_terms=to_terms(lesson.title)) for lesson in lessons]
+    )
+
+
+def rebuild_index(chunk_size=5000, *, using=DEFAULT_DB_ALIAS, apps=global_apps):
+    """
+    全ての教材・レッスンの検索用エントリを作り直し、登録した件数を返す。
+    主キー順に chunk_size 件ずつ読み出して bulk_create するため、件数に関係なくメモリ使用量は一定。
+    マイグレーションから呼ぶ場合は、apps に履歴上のモデルの取得元を、using に適用先の DB を渡す。
+    """
+    material_model = apps.get_model('lessons', 'Material')
+    lesson_model = apps.get_model('lessons', 'Lesson')
+    entries = apps.get_model('lessons', 'SearchEntry').objects.using(using)
+    with transaction.atomic(using=using):
+        entries.all().delete()
+        count = 0
+        materials = material_model.objects.using(using).order_by('pk').values_list('pk', 'title', 'description')
+        lessons = lesson_model.objects.using(using).order_by('pk').values_list('pk', 'material_id', 'title')
+        batch = []
+        for pk, title, description in materials.iterator(chunk_size=chunk_size):
+            batch.append(entries.model(material_id=pk, title_terms=to_terms(title), body_terms=to_terms(description)))
+            if len(batch) >= chunk_size:
+                count += _flush(entries, batch)
+        for pk, material_id, title in lessons.iterator(chunk_size=chunk_size):
+            batch.append(entries.model(material_id=material_id, lesson_id=pk, title_terms=to_terms(title)))
+            if len(batch) >= chunk_size:
+                count += _flush(entries, batch)
+        count += _flush(entries, batch)
+        if connections[using].vendor == 'sqlite':
+            # 一括登録後にインデックスの内部構造を統合し、検索時に読むページ数を減らす
+            with connections[using].cursor() as cursor:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return count
+
+
+def _flush(entries, batch):
+    entries.bulk_create(batch)
+    count = len(batch)
+    batch.clear()
+    return count
+
+
+# ----------------------------------------
+# 検索
+# ----------------------------------------
+def _fts_expression(words):
+    # FTS5 の検索式：語ごとにフレーズ（"条件 件分 分岐"）として AND で結合する
+    # 1語だけの英数字は前方一致（"pyth"* → python）にする
+    phrases = []
+    for terms in words:
+        phrase = '"' + ' '.join(term.replace('"', '""') for term in terms) + '"'
+        phrases.append(phrase + '*' if len(terms) == 1 else phrase)
+    return ' AND '.join(phrases)
+
+
+def matching_entries(query):
+    """
+    検索語に一致する SearchEntry のクエリセット（並び順は未定）。
+    管理画面の検索のように、一致する教材・レッスンで絞り込むサブクエリとして使う。
+    """
+    words, chars = _split_words(parse_query(query))
+    if not words and not chars:
+        return SearchEntry.objects.none()
+    entries = SearchEntry.objects.all()
+    for char in chars:
+        entries = entries.filter(Q(title_terms__contains=char) | Q(body_terms__contains=char))
+    if not words:
+        return entries
+    if connection.vendor == 'sqlite':
+        return entries.filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [_fts_expression(words)]))
+    if connection.vendor == 'postgresql':
+        tsquery = ' && '.join(["phraseto_tsquery('simple', %s)"] * len(words))
+        matched = RawSQL(f'{PG_VECTOR} @@ ({tsquery})', [' '.join(terms) for terms in words], output_field=BooleanField())
+        return entries.annotate(matched=matched).filter(matched=True)
+    for terms in words:
+        phrase = ' '.join(terms)
+        entries = entries.filter(Q(title_terms__contains=phrase) | Q(body_terms__contains=phrase))
+    return entries
+
+
+def search(query, *, offset=0, limit=20):
+    """
+    検索語に一致する教材・レッスンを関連度の高い順に offset から limit 件返す。
+    戻り値は (結果のリスト, 続きがあるか)。結果は {'material': Material, 'lesson': Lesson or None, 'score': float}。
+    1文字の漢字・かなを含む検索（部分一致で探す）は関連度を求めず、タイトルに含む結果を先に並べる。
+    """
+    words, chars = _split_words(parse_query(query))
+    if not words and not chars:
+        return [], False
+
+    if connection.vendor == 'sqlite' and not chars:
+        # FTS5 の rank 列（bm25() に重みを指定）で並べ、表示するページ分だけを SearchEntry と結合する
+        # （bm25() は小さいほど関連度が高い負の値のため、符号を反転してスコアにする）
+        # 結合する候補は関連度の高い順に SEARCH_RANK_CANDIDATES 件までに絞る
+        # （ORDER BY rank なしの LIMIT は rowid の順に切り詰めるため、最も関連度の高い行が漏れる）
+        candidates = getattr(settings, 'SEARCH_RANK_CANDIDATES', 5000)
+        inner = f'SELECT rowid, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rank MATCH %s ORDER BY rank'
+        params = [_fts_expression(words), f'bm25({TITLE_WEIGHT}, {BODY_WEIGHT})']
+        if candidates:
+            inner += ' LIMIT %s'
+            params.append(candidates)
+        sql = (
+            f'SELECT e.material_id, e.lesson_id, -f.rank FROM ({inner}) f '
+            f'JOIN {SearchEntry._meta.db_table} e ON e.id = f.rowid ORDER BY f.rank LIMIT %s OFFSET %s'
+        )
+        params += [limit + 1, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+    else:
+        entries = matching_entries(query)
+        if chars:
+            in_title = Q(*(Q(title_terms__contains=char) for char in chars))
+            score = Case(When(in_title, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+        elif connection.vendor == 'postgresql':
+            tsquery = ' && '.join(["phraseto_tsquery('simple', %s)"] * len(words))
+            score = RawSQL(f'ts_rank({PG_VECTOR}, {tsquery})', [' '.join(terms) for terms in words], output_field=FloatField())
+        else:
+            score = Value(0.0, output_field=FloatField())
+        rows = list(
+            entries.annotate(score=score).order_by('-score', 'pk')
+            .values_list('material_id', 'lesson_id', 'score')[offset:offset + limit + 1]
+        )
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    # 表示用の教材・レッスンを種別ごとに1クエリでまとめて読み込む
+    materials = Material.objects.in_bulk({material_id for material_id, _, _ in rows})
+    lessons = Lesson.objects.in_bulk({lesson_id for _, lesson_id, _ in rows if lesson_id})
+    results = [
+        {'material': materials[material_id], 'lesson': lessons.get(lesson_id), 'score': score}
+        for material_id, lesson_id, score in rows
+        if material_id in materials and (lesson_id is None or lesson_id in lessons)
+    ]
+    return results, has_more
@@ -0,0 +1,149 @@
+# apps/lessons/signals.py
+
+'''
+モデルの保存・削除に連動して派生データ（進捗サマリ・学習統計・ページキャッシュ・変更履歴・検索インデックスなど）を更新するシグナルハンドラ。
+LessonsConfig.ready() で読み込まれることで登録される。
+
+※ bulk_create / QuerySet.update はシグナルを発行しないため、
+  一括処理を行う側で summaries.rebuild_summaries() / rebuild_learning_stats() と changelog の記録を呼び出すこと。
+※ 進捗の削除は Progress.delete() / ProgressQuerySet.delete()（bulk.delete_progress）でまとめて反映する。
+  進捗に削除シグナルのハンドラを登録すると、レッスン・ユーザーの削除時の連鎖削除が1行ずつの処理になるため登録しない。
+※ シャーディング（apps.shards）が有効な場合、シャード上の進捗・サマリ・学習統計は default の CASCADE では
+  削除されないため、ユーザー・教材・レッスンの削除時にここで各シャードから削除する。
+'''
+
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.shards.routers import sharding_enabled
+
+from . import caching, changelog, search, summaries
+from .models import LearningStats, Lesson, Material, Progress, ProgressSummary
+
+
+def _deleted_directly(origin, model):
+    # 削除の起点が model 自身（インスタンスまたはクエリセット）かどうかを判定する
+    # （親モデルの削除に伴う連鎖削除の場合は False）
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model)
+
+
+def _after_commit(using, func, *args, **kwargs):
+    # 変更履歴の記録は、保存した行のトランザクションのコミット後に行う（ロールバックされた変更を記録しないように）
+    transaction.on_commit(partial(func, *args, **kwargs), using=using)
+
+
+def _delete_from_shards(queryset):
+    # CASCADE の代わりに、各シャードの該当行をまとめて削除する（連鎖削除と同様、行ごとのシグナルは発行しない）
+    if not sharding_enabled():
+        return
+    for shard_queryset in queryset.per_shard():
+        shard_queryset._raw_delete(shard_queryset.db)
+
+
+# ----------------------------------------
+# 進捗（Progress）の登録
+# ----------------------------------------
+@receiver(post_save, sender=Progress)
+def progress_saved(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    _after_commit(using, changelog.record, changelog.PROGRESS, instance.pk, user_id=instance.user_id)
+    # 既存行の更新（管理画面での修正）はサマリの対象外（進捗は追記型の履歴）
+    if not created:
+        return
+    summaries.apply_progress(instance, summaries.previous_status(instance))
+    summaries.apply_learning_stats(instance)
+
+
+# ----------------------------------------
+# レッスン（Lesson）の追加・移動・削除
+# ----------------------------------------
+@receiver(pre_save, sender=Lesson)
+def lesson_pre_save(sender, instance, raw=False, **kwargs):
+    # 所属教材の変更を検知するため、保存前の教材IDを控えておく
+    instance._previous_material_id = None
+    if not raw and instance.pk:
+        instance._previous_material_id = (
+            Lesson.objects.filter(pk=instance.pk).values_list('material_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, created, raw=False, update_fields=None, using=None, **kwargs):
+    if raw:
+        return
+    # 並べ替え（order のみの更新）では検索対象の項目が変わらないため、検索インデックスは更新しない
+    if update_fields is None or {'title', 'material'} & set(update_fields):
+        search.index_lesson(instance)
+    # 教材詳細・レッスン詳細のキャッシュを（コミット後に）無効化
+    caching.bump_material_version(instance.material_id, using=using)
+    _after_commit(using, changelog.record, changelog.LESSON, instance.pk)
+    if created:
+        # 新しいレッスンは誰も未記録のため、分母（レッスン数）だけを増やす
+        summaries.adjust_lesson_count(instance.material_id, 1)
+        # 教材のレッスン数が変わるため、教材も変更として記録する
+        _after_commit(using, changelog.record, changelog.MATERIAL, instance.material_id)
+        return
+    previous = getattr(instance, '_previous_material_id', None)
+    if previous is not None and previous != instance.material_id:
+        # 別の教材へ移動した場合は、移動元のキャッシュも無効化し、このレッスンの分だけ両方のサマリを移し替える
+        caching.bump_material_version(previous, using=using)
+        _after_commit(using, changelog.record_many, changelog.MATERIAL, [previous, instance.material_id])
+        caching.forget_lesson(instance.pk, using=using)
+        summaries.move_lesson(instance.pk, previous, instance.material_id)
+
+
+@receiver(pre_delete, sender=Lesson)
+def lesson_pre_delete(sender, instance, origin=None, **kwargs):
+    # 進捗は連鎖削除で先に消えるため、サマリから差し引く最新ステータスを削除前に読んでおく
+    instance._latest_statuses = None
+    if _deleted_directly(origin, Lesson):
+        instance._latest_statuses = summaries.lesson_statuses(instance.pk)
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted(sender, instance, origin=None, using=None, **kwargs):
+    caching.bump_material_version(instance.material_id, using=using)
+    caching.forget_lesson(instance.pk, using=using)
+    _delete_from_shards(Progress.objects.filter(lesson_id=instance.pk))
+    # 教材ごと削除された場合はサマリも CASCADE で消えるため差し引かない（変更履歴も教材の削除だけを記録する）
+    if not _deleted_directly(origin, Lesson):
+        return
+    _after_commit(using, changelog.record, changelog.LESSON, instance.pk, deleted=True)
+    _after_commit(using, changelog.record, changelog.MATERIAL, instance.material_id)
+    summaries.remove_lesson(instance.material_id, getattr(instance, '_latest_statuses', None) or {})
+
+
+# ----------------------------------------
+# 教材（Material）の更新・削除
+# ----------------------------------------
+@receiver(post_save, sender=Material)
+@receiver(post_delete, sender=Material)
+def material_changed(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        caching.bump_material_version(instance.pk, using=using)
+        deleted = kwargs['signal'] is post_delete
+        _after_commit(using, changelog.record, changelog.MATERIAL, instance.pk, deleted=deleted)
+        # 削除時の検索用エントリは CASCADE で削除される
+        if not deleted:
+            search.index_material(instance)
+        else:
+            # レッスンの進捗は lesson_deleted() で削除される
+            _delete_from_shards(ProgressSummary.objects.filter(material_id=instance.pk))
+
+
+# ----------------------------------------
+# ユーザーの削除
+# ----------------------------------------
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    if not sharding_enabled():
+        return
+    for model in (Progress, ProgressSummary, LearningStats):
+        rows = model.objects.for_user(instance.pk)
+        rows._raw_delete(rows.db)
@@ -0,0 +1,91 @@
+// apps/lessons/static/lessons/admin/lesson_reorder.js
+
+// 教材の編集画面のレッスン一覧（LessonInline）をドラッグ＆ドロップで並べ替える。
+// ドロップのたびに移動したレッスンだけを /api/lessons/<pk>/move/ で更新する（直後のレッスンの前、または直前のレッスンの後ろ）。
+'use strict';
+(function() {
+    function csrfToken() {
+        const input = document.querySelector('input[name=csrfmiddlewaretoken]');
+        return input ? input.value : '';
+    }
+
+    function lessonId(row) {
+        const handle = row && row.querySelector('.lesson-drag-handle');
+        return handle ? handle.dataset.lessonId : null;
+    }
+
+    function neighbor(row, direction) {
+        // 保存済みのレッスンの行だけを対象に、前後の行を探す
+        let sibling = row[direction];
+        while (sibling && !lessonId(sibling)) {
+            sibling = sibling[direction];
+        }
+        return sibling;
+    }
+
+    function save(row) {
+        const handle = row.querySelector('.lesson-drag-handle');
+        const previous = neighbor(row, 'previousElementSibling');
+        const next = neighbor(row, 'nextElementSibling');
+        if (!previous && !next) {
+            return;
+        }
+        const body = previous ? {after: Number(lessonId(previous))} : {before: Number(lessonId(next))};
+        fetch(handle.dataset.moveUrl, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken()},
+            body: JSON.stringify(body),
+        }).then(function(response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.json();
+        }).then(function(lesson) {
+            const cell = row.querySelector('td.field-order p');
+            if (cell) {
+                cell.textContent = lesson.order;
+            }
+        }).catch(function() {
+            // 失敗した場合は保存されている並び順で表示し直す
+            alert('表示順序を保存できませんでした。画面を再読み込みします。');
+            window.location.reload();
+        });
+    }
+
+    function init() {
+        let dragged = null;
+        let origin = null;  // ドラッグ開始時の直後の行（位置が変わっていなければ保存しない）
+        document.querySelectorAll('.lesson-drag-handle').forEach(function(handle) {
+            const row = handle.closest('tr');
+            row.draggable = true;
+            row.addEventListener('dragstart', function(event) {
+                dragged = row;
+                origin = row.nextElementSibling;
+                event.dataTransfer.effectAllowed = 'move';
+            });
+            row.addEventListener('dragover', function(event) {
+                if (!dragged || dragged === row || dragged.parentNode !== row.parentNode) {
+                    return;
+                }
+                event.preventDefault();
+                // 行の上半分なら前へ、下半分なら後ろへ挿入する
+                const rect = row.getBoundingClientRect();
+                const after = event.clientY > rect.top + rect.height / 2;
+                row.parentNode.insertBefore(dragged, after ? row.nextSibling : row);
+            });
+            row.addEventListener('dragend', function() {
+                if (dragged && dragged.nextElementSibling !== origin) {
+                    save(dragged);
+                }
+                dragged = null;
+            });
+        });
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', init);
+    } else {
+        init();
+    }
+})();
@@ -0,0 +1,125 @@
+// apps/lessons/static/lessons/js/material_picker.js
+
+// 教材の選択欄（widgets.MaterialPicker）。
+// 入力した語で教材一覧 API（/api/materials/?q=）を呼び出して候補を表示し、「さらに表示」で次のページを読み込む。
+// 候補を選ぶと hidden の入力欄に教材の主キーを設定する（入力し直した場合は選択を解除する）。
+'use strict';
+(function() {
+    const DELAY = 250;  // 入力が止まってから検索するまでの待ち時間（ミリ秒）
+
+    function setup(picker) {
+        const value = picker.querySelector('.material-picker-value');
+        const input = picker.querySelector('input[type=search]');
+        const results = picker.querySelector('.material-picker-results');
+        let timer = null;
+        let request = 0;  // 古い応答で新しい結果を上書きしないための連番
+
+        function close() {
+            results.hidden = true;
+            input.setAttribute('aria-expanded', 'false');
+        }
+
+        function item(text, className) {
+            const button = document.createElement('button');
+            button.type = 'button';
+            button.className = 'list-group-item list-group-item-action ' + (className || '');
+            button.textContent = text;
+            return button;
+        }
+
+        function load(after) {
+            const params = new URLSearchParams({fields: 'id,title', size: picker.dataset.pageSize});
+            if (input.value.trim()) {
+                params.set('q', input.value.trim());
+            }
+            if (after) {
+                params.set('after', after);
+            }
+            const current = ++request;
+            fetch(picker.dataset.lookupUrl + '?' + params, {credentials: 'same-origin'})
+                .then(function(response) {
+                    if (!response.ok) {
+                        throw new Error(response.status);
+                    }
+                    return response.json();
+                })
+                .then(function(page) {
+                    if (current !== request) {
+                        return;
+                    }
+                    render(page, Boolean(after));
+                })
+                .catch(function() {
+                    if (current === request) {
+                        results.replaceChildren(item('候補を取得できませんでした。', 'disabled'));
+                        results.hidden = false;
+                    }
+                });
+        }
+
+        function render(page, append) {
+            const more = results.querySelector('.material-picker-more');
+            if (more) {
+                more.remove();
+            }
+            if (!append) {
+                results.replaceChildren();
+            }
+            page.results.forEach(function(material) {
+                const button = item(material.title);
+                button.addEventListener('click', function() {
+                    value.value = material.id;
+                    input.value = material.title;
+                    close();
+                });
+                results.appendChild(button);
+            });
+            if (!results.children.length) {
+                results.appendChild(item('該当する教材がありません。', 'disabled'));
+            }
+            if (page.next) {
+                const button = item('さらに表示', 'material-picker-more text-primary');
+                button.addEventListener('click', function() {
+                    load(page.next);
+                });
+                results.appendChild(button);
+            }
+            results.hidden = false;
+            input.setAttribute('aria-expanded', 'true');
+        }
+
+        input.addEventListener('input', function() {
+            // 入力し直した場合は、候補から選ぶまで未選択にする
+            value.value = '';
+            clearTimeout(timer);
+            timer = setTimeout(function() {
+                load(null);
+            }, DELAY);
+        });
+        input.addEventListener('focus', function() {
+            if (!value.value) {
+                load(null);
+            }
+        });
+        input.addEventListener('keydown', function(event) {
+            if (event.key === 'Escape') {
+                close();
+            }
+        });
+        document.addEventListener('click', function(event) {
+            if (!picker.contains(event.target)) {
+                close();
+            }
+        });
+    }
+
+    function init() {
+        document.querySelectorAll('.material-picker').forEach(setup);
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', init);
+    } else {
+        init();
+    }
+})();
@@ -0,0 +1,431 @@
+# apps/lessons/summaries.py
+
+'''
+進捗サマリ（ProgressSummary）・学習統計（LearningStats）の差分更新と再構築。
+
+ダッシュボード等で「X / Y レッスン完了」や連続学習日数を表示する際に Progress 全体を集計しなくて済むよう、
+ユーザー×教材ごと・ユーザーごとの集計値を保持しておき、進捗の登録時には該当行だけを更新する。
+
+サマリ・統計は進捗と同じシャード（apps.shards）に置き、シャードごとに更新・再構築する。
+シャード上の進捗からはレッスン・教材を JOIN できないため、教材ID・タイトルは別のクエリで読み込んで対応付ける。
+'''
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from apps.shards.routers import by_shard, shard_aliases
+
+from .exports import chunked
+from .models import LearningStats, Lesson, Progress, ProgressSummary
+
+# ステータス値と、サマリ上の件数フィールドとの対応
+STATUS_FIELDS = {
+    'not_started': 'not_started_count',
+    'in_progress': 'in_progress_count',
+    'done': 'done_count',
+}
+
+
+def previous_status(progress):
+    """
+    progress を除いた、同じユーザー×レッスンの直前の最新ステータスを返す（記録がなければ None）。
+    (user, lesson, -date, -id) の複合インデックスにより先頭1件の読み取りで済む。
+    """
+    return (
+        Progress.objects.for_user(progress.user_id).filter(lesson_id=progress.lesson_id)
+        .exclude(pk=progress.pk)
+        .order_by('-date', '-id')
+        .values_list('status', flat=True)
+        .first()
+    )
+
+
+def apply_progress(progress, previous):
+    """
+    新しく登録された進捗1件をサマリへ反映する。
+    previous は登録前の最新ステータス（初回記録なら None）。
+    """
+    material_id = progress.lesson.material_id
+    summaries = ProgressSummary.objects.in_shard_of(progress.user_id)
+    with transaction.atomic(using=summaries.db):
+        summary, created = summaries.get_or_create(
+            user_id=progress.user_id,
+            material_id=material_id,
+            defaults={'lesson_count': Lesson.objects.filter(material_id=material_id).count()},
+        )
+        changes = {'last_activity': progress.date}
+        if previous != progress.status:
+            # 最新ステータスが変わった場合のみ件数を移し替える（F式で同時更新にも安全）
+            changes[STATUS_FIELDS[progress.status]] = F(STATUS_FIELDS[progress.status]) + 1
+            if previous is not None:
+                changes[STATUS_FIELDS[previous]] = F(STATUS_FIELDS[previous]) - 1
+        summaries.filter(pk=summary.pk).update(**changes)
+
+
+def adjust_lesson_count(material_id, delta):
+    """
+    教材のレッスン数の増減を、その教材の全ユーザー分のサマリへ（シャードごとに）1クエリで反映する。
+    """
+    for summaries in ProgressSummary.objects.filter(material_id=material_id).per_shard():
+        summaries.update(lesson_count=F('lesson_count') + delta)
+
+
+def latest_statuses(alias, pairs):
+    """
+    シャード alias の進捗から、(user_id, lesson_id) の組ごとの最新ステータスを {組: ステータス} で返す
+    （進捗が残っていない組は含まない）。
+    """
+    user_ids = sorted({user_id for user_id, _ in pairs})
+    lesson_ids = sorted({lesson_id for _, lesson_id in pairs})
+    rows = (
+        Progress.objects.using(alias)
+        .filter(user_id__in=user_ids, lesson_id__in=lesson_ids)
+        .order_by('user_id', 'lesson_id', '-date', '-id')
+        .values_list('user_id', 'lesson_id', 'status')
+    )
+    statuses = {}
+    for user_id, lesson_id, status in rows.iterator():
+        if (user_id, lesson_id) in pairs:
+            statuses.setdefault((user_id, lesson_id), status)
+    return statuses
+
+
+def lesson_statuses(lesson_id):
+    """
+    レッスン lesson_id を記録したユーザーごとの (最新ステータス, 最終記録日) を、
+    シャードごとに {alias: {user_id: (status, date)}} で返す（レッスンの削除・移動の差分更新用）。
+    """
+    statuses = {}
+    for progresses in Progress.objects.filter(lesson_id=lesson_id).per_shard():
+        latest = statuses[progresses.db] = {}
+        for user_id, status, date in progresses.order_by('user_id', '-date', '-id').values_list(
+            'user_id', 'status', 'date'
+        ).iterator():
+            latest.setdefault(user_id, (status, date))
+    return statuses
+
+
+def apply_status_changes(alias, changes, chunk_size=5000):
+    """
+    最新ステータスの変化 (user_id, material_id, 変化前, 変化後) の並びを、シャード alias のサマリへ反映する
+    （変化前・変化後の None は「記録なし」）。
+    ユーザー×教材ごとに件数の増減を合算し、教材と増減の組み合わせが同じユーザーをまとめて
+    1つの UPDATE（F式）で書き込むため、クエリ数は対象の行数ではなく組み合わせの種類の数で決まる。
+    """
+    deltas = {}  # {(user_id, material_id): Counter({件数フィールド: 増減})}
+    for user_id, material_id, before, after in changes:
+        if before == after:
+            continue
+        delta = deltas.setdefault((user_id, material_id), Counter())
+        if before is not None:
+            delta[STATUS_FIELDS[before]] -= 1
+        if after is not None:
+            delta[STATUS_FIELDS[after]] += 1
+
+    groups = {}  # {(material_id, ((件数フィールド, 増減), ...)): [user_id, ...]}
+    for (user_id, material_id), delta in deltas.items():
+        key = tuple(sorted((field, value) for field, value in delta.items() if value))
+        if key:
+            groups.setdefault((material_id, key), []).append(user_id)
+
+    summaries = ProgressSummary.objects.using(alias)
+    for (material_id, key), user_ids in groups.items():
+        for chunk in chunked(sorted(user_ids), chunk_size):
+            summaries.filter(material_id=material_id, user_id__in=chunk).update(
+                **{field: F(field) + value for field, value in key}
+            )
+
+
+def remove_lesson(material_id, statuses):
+    """
+    教材 material_id から削除したレッスンの分をサマリから差し引く。
+    statuses は削除前に lesson_statuses() で読んだ、そのレッスンを記録したユーザーの最新ステータス。
+    学習統計（記録数・連続日数）は差し引けないため、そのユーザーの分だけ作り直す。
+    """
+    adjust_lesson_count(material_id, -1)
+    for alias, latest in statuses.items():
+        with transaction.atomic(using=alias):
+            apply_status_changes(
+                alias, [(user_id, material_id, status, None) for user_id, (status, _) in latest.items()]
+            )
+    user_ids = sorted({user_id for latest in statuses.values() for user_id in latest})
+    if user_ids:
+        rebuild_learning_stats(user_ids=user_ids)
+
+
+def move_lesson(lesson_id, previous_material_id, material_id):
+    """
+    レッスンの教材の付け替えを、移動元・移動先のサマリへ反映する。
+    教材全体を作り直さず、レッスン数を1つずつ移し、そのレッスンを記録したユーザーの件数だけを移し替える。
+    ※ 移動元の最終学習日は戻さない（正確な値が必要なら rebuild_summaries() で作り直す）
+    """
+    adjust_lesson_count(previous_material_id, -1)
+    adjust_lesson_count(material_id, 1)
+    lesson_count = Lesson.objects.filter(material_id=material_id).count()
+    for alias, latest in lesson_statuses(lesson_id).items():
+        summaries = ProgressSummary.objects.using(alias)
+        with transaction.atomic(using=alias):
+            # 移動先の教材を初めて記録したことになるユーザーの行を用意する（既にある行はそのまま）
+            summaries.bulk_create(
+                [
+                    ProgressSummary(user_id=user_id, material_id=material_id, lesson_count=lesson_count,
+                                    last_activity=date)
+                    for user_id, (_, date) in latest.items()
+                ],
+                batch_size=5000,
+                ignore_conflicts=True,
+            )
+            apply_status_changes(alias, [
+                change
+                for user_id, (status, _) in latest.items()
+                for change in ((user_id, previous_material_id, status, None), (user_id, material_id, None, status))
+            ])
+
+
+def shard_targets(user_ids):
+    # 再構築の対象の (シャード, そのシャードのユーザーIDのリスト) の組（ユーザーを絞り込まなければ全シャード）
+    if user_ids is None:
+        return [(alias, None) for alias in shard_aliases()]
+    return list(by_shard(user_ids).items())
+
+
+def rebuild_summaries(user_ids=None, material_ids=None, chunk_size=5000):
+    """
+    Progress からサマリを作り直す（対象を絞り込まなければ全件）。
+
+    進捗を (user, lesson, -date, -id) の順で流し読みし、ユーザー×レッスンごとの先頭行を
+    最新ステータスとして数える。ユーザー単位で書き出すため、メモリ使用量は1ユーザー分で済む。
+    サマリの行は削除せずに数え直すため、進捗のない受講登録（provision_users が作成する行）も残る。
+    戻り値は進捗から集計したサマリの件数。
+    """
+    # レッスンの教材ID（進捗の集計先）と、教材ごとのレッスン数は先にまとめて取得しておく
+    lessons = Lesson.objects.all()
+    if material_ids is not None:
+        lessons = lessons.filter(material_id__in=material_ids)
+    lesson_materials = dict(lessons.values_list('pk', 'material_id'))
+    lesson_counts = Counter(lesson_materials.values())
+
+    created = 0
+    for alias, shard_user_ids in shard_targets(user_ids):
+        created += _rebuild_summaries(alias, shard_user_ids, material_ids, lesson_materials, lesson_counts, chunk_size)
+    return created
+
+
+def _rebuild_summaries(alias, user_ids, material_ids, lesson_materials, lesson_counts, chunk_size):
+    # 1つのシャードのサマリを作り直す
+    progresses = Progress.objects.using(alias).order_by('user_id', 'lesson_id', '-date', '-id')
+    summaries = ProgressSummary.objects.using(alias)
+    if user_ids is not None:
+        progresses = progresses.filter(user_id__in=user_ids)
+        summaries = summaries.filter(user_id__in=user_ids)
+    if material_ids is not None:
+        progresses = progresses.filter(lesson_id__in=list(lesson_materials))
+        summaries = summaries.filter(material_id__in=material_ids)
+
+    created = 0
+    with transaction.atomic(using=alias):
+        # 受講登録だけの（進捗のない）行を残すため、削除はせずに件数を0に戻し、レッスン数だけを設定し直す
+        summaries.update(lesson_count=0, not_started_count=0, in_progress_count=0, done_count=0, last_activity=None)
+        for count, material_chunk in _materials_by_lesson_count(lesson_counts):
+            summaries.filter(material_id__in=material_chunk).update(lesson_count=count)
+
+        rows = {}            # 処理中ユーザーの {material_id: ProgressSummary}
+        current_user = None
+        last_key = None
+        batch = []
+        for user_id, lesson_id, status, date in progresses.values_list(
+            'user_id', 'lesson_id', 'status', 'date'
+        ).iterator(chunk_size=chunk_size):
+            material_id = lesson_materials.get(lesson_id)
+            if material_id is None:
+                # 削除済みのレッスンの進捗（シャード上の行の削除が済むまでの間）は数えない
+                continue
+            if user_id != current_user:
+                # ユーザーが切り替わったら前ユーザーの集計を書き出し待ちへ
+                batch.extend(rows.values())
+                rows = {}
+                current_user = user_id
+                if len(batch) >= chunk_size:
+                    created += _write_summaries(alias, batch)
+                    batch = []
+
+            summary = rows.get(material_id)
+            if summary is None:
+                summary = rows[material_id] = ProgressSummary(
+                    user_id=user_id,
+                    material_id=material_id,
+                    lesson_count=lesson_counts.get(material_id, 0),
+                )
+            if summary.last_activity is None or date > summary.last_activity:
+                summary.last_activity = date
+
+            # 並び順により、ユーザー×レッスンごとの最初の行が最新の記録
+            if (user_id, lesson_id) != last_key:
+                last_key = (user_id, lesson_id)
+                field = STATUS_FIELDS[status]
+                setattr(summary, field, getattr(summary, field) + 1)
+
+        batch.extend(rows.values())
+        created += _write_summaries(alias, batch, chunk_size)
+    return created
+
+
+def _materials_by_lesson_count(lesson_counts, chunk_size=5000):
+    # レッスン数ごとの教材IDのリスト（レッスン数の種類の数だけの UPDATE でサマリのレッスン数を設定し直すため）
+    materials = {}
+    for material_id, count in lesson_counts.items():
+        materials.setdefault(count, []).append(material_id)
+    for count, material_ids in materials.items():
+        for chunk in chunked(sorted(material_ids), chunk_size):
+            yield count, chunk
+
+
+def _write_summaries(alias, batch, chunk_size=None):
+    # 集計したサマリを登録する（受講登録などで既に行があれば、その行の件数を上書きする）
+    ProgressSummary.objects.using(alias).bulk_create(
+        batch,
+        batch_size=chunk_size,
+        update_conflicts=True,
+        unique_fields=['user', 'material'],
+        update_fields=['lesson_count', *STATUS_FIELDS.values(), 'last_activity'],
+    )
+    return len(batch)
+
+
+# ----------------------------------------
+# 学習統計（LearningStats）
+# ----------------------------------------
+def recent_limit():
+    # ダッシュボードに表示する「最近の記録」の件数
+    return getattr(settings, 'LEARNING_STATS_RECENT_LIMIT', 10)
+
+
+def activity_entry(lesson_id, lesson_title, material_id, material_title, status, date):
+    # 「最近の記録」の1件分（表示に必要なタイトルも含めて保持し、表示時の JOIN を不要にする）
+    return {
+        'lesson_id': lesson_id,
+        'lesson_title': lesson_title,
+        'material_id': material_id,
+        'material_title': material_title,
+        'status': status,
+        'date': date.isoformat(),
+    }
+
+
+def apply_learning_stats(progress):
+    """
+    新しく登録された進捗1件を学習統計へ反映する（記録数・連続学習日数・最近の記録）。
+    """
+    lesson = progress.lesson
+    stats_rows = LearningStats.objects.in_shard_of(progress.user_id)
+    with transaction.atomic(using=stats_rows.db):
+        stats, _ = stats_rows.select_for_update().get_or_create(user_id=progress.user_id)
+        day = progress.date
+        last = stats.last_study_date
+        if last is None or day > last:
+            # 前日から続いていれば連続日数を伸ばし、間が空いていれば1日目からやり直す
+            stats.current_streak = stats.current_streak + 1 if last == day - timedelta(days=1) else 1
+            stats.last_study_date = day
+        # 過去日付の記録（インポート等）は連続日数に影響させない（必要なら再構築で反映）
+        stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+        stats.total_records += 1
+        entry = activity_entry(
+            lesson.pk, lesson.title, lesson.material_id, lesson.material.title, progress.status, day
+        )
+        stats.recent_activity = [entry, *stats.recent_activity][:recent_limit()]
+        stats.save()
+
+
+def rebuild_learning_stats(user_ids=None, chunk_size=5000):
+    """
+    Progress から学習統計を作り直す（対象を絞り込まなければ全件）。
+
+    進捗をユーザーごとに新しい順で流し読みし、先頭から「最近の記録」を、
+    記録日の並びから連続学習日数を求める。戻り値は作成した統計の件数。
+    """
+    return sum(
+        _rebuild_learning_stats(alias, shard_user_ids, chunk_size)
+        for alias, shard_user_ids in shard_targets(user_ids)
+    )
+
+
+def _rebuild_learning_stats(alias, user_ids, chunk_size):
+    # 1つのシャードの学習統計を作り直す
+    progresses = Progress.objects.using(alias).order_by('user_id', '-date', '-id')
+    stats_rows = LearningStats.objects.using(alias)
+    if user_ids is not None:
+        progresses = progresses.filter(user_id__in=user_ids)
+        stats_rows = stats_rows.filter(user_id__in=user_ids)
+    limit = recent_limit()
+
+    created = 0
+    with transaction.atomic(using=alias):
+        stats_rows.delete()
+
+        batch = []
+        stats = None
+        run = 0             # 現在数えている連続日数
+        previous = None     # 直前に見た記録日
+        latest_run = True   # 最終学習日から続く連続期間を数えている最中か
+        for user_id, lesson_id, status, date in progresses.values_list(
+            'user_id', 'lesson_id', 'status', 'date'
+        ).iterator(chunk_size=chunk_size):
+            if stats is None or stats.user_id != user_id:
+                # ユーザーが切り替わったら前ユーザーの統計を書き出し待ちへ
+                if stats is not None:
+                    batch.append(stats)
+                stats = LearningStats(user_id=user_id, last_study_date=date, recent_activity=[])
+                run, previous, latest_run = 0, None, True
+                if len(batch) >= chunk_size:
+                    created += _write_learning_stats(alias, batch)
+                    batch = []
+
+            stats.total_records += 1
+            if len(stats.recent_activity) < limit:
+                # タイトルは書き出す前に _write_learning_stats() でまとめて付与する
+                stats.recent_activity.append((lesson_id, status, date))
+
+            if date != previous:
+                # 新しい順に見ているため、前日分が続けば連続日数を伸ばし、間が空けば数え直す
+                if previous is not None and previous - timedelta(days=1) == date:
+                    run += 1
+                else:
+                    latest_run = previous is None
+                    run = 1
+                previous = date
+                stats.longest_streak = max(stats.longest_streak, run)
+                if latest_run:
+                    stats.current_streak = run
+
+        if stats is not None:
+            batch.append(stats)
+        created += _write_learning_stats(alias, batch, chunk_size)
+    return created
+
+
+def _write_learning_stats(alias, batch, chunk_size=None):
+    """
+    「最近の記録」の (レッスンID, ステータス, 記録日) にレッスン・教材のタイトルを付与して一括登録する。
+    タイトルは全進捗ではなく、書き出す統計の「最近の記録」に含まれるレッスンの分だけを読み込む。
+    """
+    lesson_ids = {lesson_id for stats in batch for lesson_id, _, _ in stats.recent_activity}
+    lessons = {}
+    for chunk in chunked(sorted(lesson_ids), 5000):
+        lessons.update(
+            (pk, (title, material_id, material_title))
+            for pk, title, material_id, material_title in Lesson.objects.filter(pk__in=chunk).values_list(
+                'pk', 'title', 'material_id', 'material__title'
+            )
+        )
+    for stats in batch:
+        stats.recent_activity = [
+            activity_entry(lesson_id, *lessons[lesson_id], status, date)
+            for lesson_id, status, date in stats.recent_activity
+            if lesson_id in lessons  # 削除済みのレッスンは表示しない
+        ]
+    LearningStats.objects.using(alias).bulk_create(batch, batch_size=chunk_size)
+    return len(batch)
@@ -0,0 +1,73 @@
+# apps/lessons/tasks.py
+
+'''
+バックグラウンドジョブ（apps.jobs）で実行する、時間のかかる処理。
+リクエストの中で実行するとワーカー（Web サーバーのプロセス）を長時間占有するものを、enqueue() で登録して実行する。
+
+- lessons.export_progress    : 学習履歴のエクスポート（ファイルに書き出し、ジョブの状態ページからダウンロード）
+- lessons.update_progress    : 管理画面の進捗の一括変更（ステータス変更・レッスンの付け替え）
+- lessons.duplicate_material : 管理画面の教材の複製
+- lessons.rebuild_summaries  : 進捗サマリ・学習統計の再構築
+'''
+
+from django.contrib.auth import get_user_model
+
+from apps.jobs.queue import result_path, thaw_selection
+from apps.jobs.registry import task
+
+from .bulk import duplicate_material, update_progress
+from .exports import CONTENT_TYPES, progress_rows, serialize
+from .models import Material
+from .summaries import rebuild_learning_stats, rebuild_summaries
+
+# 処理済みの件数をジョブに記録する間隔（件数）
+REPORT_EVERY = 10_000
+
+
+@task('lessons.export_progress', label='学習履歴のエクスポート')
+def export_progress(job, user_id, fmt='csv', chunk_size=2000):
+    # ユーザーの進捗をファイルに書き出す（再実行時は同じファイルを最初から書き直す）
+    user = get_user_model().objects.get(pk=user_id)
+    _, extension = CONTENT_TYPES[fmt]
+    path = result_path(job, extension)
+    exported = 0
+
+    def counted(rows):
+        nonlocal exported
+        for row in rows:
+            exported += 1
+            if exported % REPORT_EVERY == 0:
+                job.report_progress(exported)
+            yield row
+
+    with open(path, 'w', newline='', encoding='utf-8') as stream:
+        for chunk in serialize(counted(progress_rows(user.progresses.all(), chunk_size=chunk_size)), fmt):
+            stream.write(chunk)
+    job.report_progress(exported)
+    return {'file': path.name, 'filename': f'progress.{extension}', 'rows': exported}
+
+
+@task('lessons.update_progress', label='進捗の一括変更')
+def update_progress_task(job, selection, values):
+    # 管理画面で選択した進捗（freeze_selection() で保存したもの）をまとめて更新する（再実行しても結果は同じ）
+    updated = update_progress(thaw_selection(selection, job.user), progress=job.report_progress, **values)
+    return {'updated': updated}
+
+
+@task('lessons.duplicate_material', label='教材の複製', max_attempts=1)
+def duplicate_material_task(job, material_id):
+    # 失敗時に再実行すると、最初の試行がコミット済みだった場合に複製が2つできるため、再実行しない
+    material = Material.objects.get(pk=material_id)
+    copy, lessons = duplicate_material(material, progress=job.report_progress)
+    return {'material': copy.pk, 'lessons': lessons}
+
+
+@task('lessons.rebuild_summaries', label='進捗サマリの再構築')
+def rebuild_summaries_task(job, user_ids=None, material_ids=None, chunk_size=5000):
+    summaries = rebuild_summaries(user_ids=user_ids, material_ids=material_ids, chunk_size=chunk_size)
+    job.report_progress(summaries)
+    result = {'summaries': summaries}
+    if material_ids is None:
+        # 学習統計はユーザー単位のため、教材を絞り込んだ場合は対象外
+        result['learning_stats'] = rebuild_learning_stats(user_ids=user_ids, chunk_size=chunk_size)
+    return result
@@ -0,0 +1,103 @@
+# apps/lessons/tests/test_admin_actions.py
+
+'''
+進捗の管理画面の一括操作：対象の行をリクエストの中では読まずにジョブを登録し、ジョブの実行時に一覧と同じ条件で更新することと、
+「すべて選択」の件数の上限・警告を確認する。
+'''
+
+from django.contrib import messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.jobs import queue
+from apps.jobs.models import Job
+from apps.lessons.models import Lesson, Material, Progress
+
+
+@override_settings(JOBS_RUN_INLINE=False)
+class ProgressActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        cls.learner = User.objects.create_user(username='alice', email='alice@example.com', password='password')
+        cls.lesson = Lesson.objects.create(material=Material.objects.create(title='Python入門'), title='変数', order=0)
+        Progress.objects.bulk_create(
+            Progress(user=cls.learner, lesson=cls.lesson, status='not_started' if i % 2 else 'in_progress')
+            for i in range(20)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def run_action(self, query, data):
+        url = reverse('admin:lessons_progress_changelist') + query
+        with CaptureQueriesContext(connections['default']) as captured:
+            response = self.client.post(url, {'index': 0, **data})
+        self.assertEqual(response.status_code, 302)
+        return captured
+
+    def levels(self):
+        return [message.level for message in messages.get_messages(self.client.get('/').wsgi_request)]
+
+    def run_job(self):
+        job = Job.objects.get(task='lessons.update_progress')
+        self.assertEqual(queue.claim('worker-a', 1), [job.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            queue.execute(job.pk, 'worker-a')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        return job
+
+    def test_select_across_enqueues_without_reading_selected_rows(self):
+        pk = Progress.objects.filter(status='not_started').values_list('pk', flat=True).first()
+        captured = self.run_action('?status__exact=not_started', {
+            'action': 'mark_done', 'select_across': '1', ACTION_CHECKBOX_NAME: [pk],
+        })
+        # 一覧の1ページ分・上限付きの件数と、主キーの最大値以外に進捗を読むクエリはない
+        table = Progress._meta.db_table
+        for query in captured:
+            if table in query['sql']:
+                self.assertTrue('LIMIT' in query['sql'] or 'MAX(' in query['sql'], query['sql'])
+
+        selection = Job.objects.get().kwargs['selection']
+        self.assertEqual(selection['query'], 'status__exact=not_started')
+        self.assertEqual(selection['max_pk'], Progress.objects.order_by('-pk').first().pk)
+        self.assertNotIn('pks', selection)
+
+        # 登録後に追加された行は対象に含まれない
+        late = Progress.objects.create(user=self.learner, lesson=self.lesson, status='not_started')
+        self.assertEqual(self.run_job().result, {'updated': 10})
+        self.assertEqual(Progress.objects.filter(status='done').count(), 10)
+        self.assertEqual(Progress.objects.filter(status='in_progress').count(), 10)
+        late.refresh_from_db()
+        self.assertEqual(late.status, 'not_started')
+
+    def test_page_selection_stores_selected_pks(self):
+        pks = list(Progress.objects.order_by('pk').values_list('pk', flat=True)[:3])
+        self.run_action('', {'action': 'reset_progress', ACTION_CHECKBOX_NAME: pks})
+        self.assertEqual(Job.objects.get().kwargs['selection']['pks'], pks)
+        self.run_job()
+        self.assertEqual(Progress.objects.filter(pk__in=pks, status='not_started').count(), 3)
+
+    def test_page_selection_is_limited_to_page_size(self):
+        self.run_action('', {'action': 'mark_done', ACTION_CHECKBOX_NAME: list(range(1, 300))})
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=5, ADMIN_BULK_SELECT_ACROSS_LIMIT=10)
+    def test_select_across_is_capped_without_filters(self):
+        pk = Progress.objects.values_list('pk', flat=True).first()
+        self.run_action('', {'action': 'mark_done', 'select_across': '1', ACTION_CHECKBOX_NAME: [pk]})
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(self.levels(), [messages.ERROR])
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=5, ADMIN_BULK_SELECT_ACROSS_LIMIT=10)
+    def test_select_across_warns_on_large_filtered_selection(self):
+        pk = Progress.objects.filter(status='not_started').values_list('pk', flat=True).first()
+        self.run_action('?status__exact=not_started', {'action': 'mark_done', 'select_across': '1', ACTION_CHECKBOX_NAME: [pk]})
+        self.assertTrue(Job.objects.exists())
+        self.assertEqual(self.levels(), [messages.SUCCESS, messages.WARNING])
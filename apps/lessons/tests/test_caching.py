@@ -0,0 +1,66 @@
+# apps/lessons/tests/test_caching.py
+
+'''
+教材・レッスンのページ共通部分のキャッシュ（caching.py）：DB から読んだ後・保存する前にコミットされた変更の前の内容を、
+新しいバージョンで保存しないことを確認する。
+'''
+
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.test import TestCase
+
+from apps.lessons import caching
+from apps.lessons.models import Lesson, Material
+
+
+class LessonSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.material = Material.objects.create(title='Python入門')
+        cls.lesson = Lesson.objects.create(material=cls.material, title='変数', order=0)
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def build_then_commit_rename(self):
+        # DB から読んだ直後（保存する前）に、他のリクエストの変更がコミットされてバージョンが進んだ状態を作る
+        build = caching._build_lesson_snapshot
+
+        def interleaved(lesson):
+            snapshot = build(lesson)
+            Lesson.objects.filter(pk=lesson.pk).update(title='変数と型')
+            caching._bump_material_version(lesson.material_id)
+            return snapshot
+        return mock.patch('apps.lessons.caching._build_lesson_snapshot', interleaved)
+
+    def test_bump_between_read_and_store(self):
+        for cached_material in (False, True):
+            with self.subTest(cached_material=cached_material):
+                caches['default'].clear()
+                Lesson.objects.filter(pk=self.lesson.pk).update(title='変数')
+                if cached_material:
+                    caches['default'].set(caching._lesson_material_key(self.lesson.pk), self.material.pk)
+                with self.build_then_commit_rename():
+                    self.assertEqual(caching.lesson_snapshot(self.lesson.pk)['title'], '変数')
+                self.assertEqual(caching.lesson_snapshot(self.lesson.pk)['title'], '変数と型')
+
+    def test_async_bump_between_read_and_store(self):
+        # 非同期版では DB の更新を挟めないため、バージョンだけを進め、読んだ内容が新しいバージョンで保存されないことを確認する
+        build = caching._build_lesson_snapshot
+
+        def interleaved(lesson):
+            snapshot = build(lesson)
+            caching._bump_material_version(lesson.material_id)
+            return snapshot
+
+        with mock.patch('apps.lessons.caching._build_lesson_snapshot', interleaved):
+            async_to_sync(caching.alesson_snapshot)(self.lesson.pk)
+        key = caching._lesson_snapshot_key(self.lesson.pk, caching.material_version(self.material.pk))
+        self.assertIsNone(caches['default'].get(key))
+
+    def test_snapshot_is_cached(self):
+        caching.lesson_snapshot(self.lesson.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(caching.lesson_snapshot(self.lesson.pk)['material_title'], 'Python入門')
@@ -0,0 +1,117 @@
+# apps/lessons/tests/test_changelog.py
+
+'''
+差分同期用の変更履歴（changelog.py）の記録・読み出しと、/api/sync/ の応答を確認する。
+'''
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.lessons import changelog
+from apps.lessons.models import ChangeLogEntry, Lesson, Material, Progress
+
+
+@override_settings(CHANGELOG_SYNC_DELAY=0)
+class ChangeLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.alice = User.objects.create_user(username='alice', email='alice@example.com', password='password')
+        cls.bob = User.objects.create_user(username='bob', email='bob@example.com', password='password')
+        cls.material = Material.objects.create(title='Python入門')
+        cls.lesson = Lesson.objects.create(material=cls.material, title='変数', order=0)
+
+    def record(self, user, status='done'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Progress.objects.in_shard_of(user).create(user=user, lesson=self.lesson, status=status)
+
+    def test_records_after_commit(self):
+        # ロールバックされた変更は記録されない
+        token = changelog.current_token()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Material.objects.create(title='取り消す教材')
+                transaction.set_rollback(True)
+        self.assertEqual(changelog.current_token(), token)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            material = Material.objects.create(title='Django入門')
+        self.assertTrue(ChangeLogEntry.objects.filter(kind=changelog.MATERIAL, object_id=material.pk).exists())
+
+    def test_bulk_records_wait_for_commit(self):
+        # 一括登録・更新の長いトランザクションの中では採番せず、コミット後に登録する
+        token = changelog.current_token()
+        last_id = Progress.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                [progress] = Progress.objects.bulk_create([Progress(user=self.alice, lesson=self.lesson, status='done')])
+                changelog.record_progress([progress])
+                changelog.record_progress_rows([(progress.pk, self.alice.pk)])
+                changelog.record_progress_since(last_id)
+                self.assertEqual(changelog.current_token(), token)
+        self.assertEqual(changelog.current_token(), token)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(
+            ChangeLogEntry.objects.filter(pk__gt=token, kind=changelog.PROGRESS, object_id=progress.pk).count(), 3
+        )
+
+    def test_changes_since_returns_shared_and_own_rows(self):
+        token = changelog.current_token()
+        own = self.record(self.alice)
+        other = self.record(self.bob)
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.filter(pk=self.lesson.pk).first().delete()
+
+        next_token, has_more, latest = changelog.changes_since(self.alice, token, limit=100)
+        self.assertFalse(has_more)
+        self.assertEqual(next_token, changelog.current_token())
+        self.assertEqual(latest[changelog.PROGRESS], {own.pk: False})
+        self.assertNotIn(other.pk, latest[changelog.PROGRESS])
+        self.assertEqual(latest[changelog.LESSON], {self.lesson.pk: True})
+
+    def test_changes_since_pages_by_limit(self):
+        token = changelog.current_token()
+        progresses = [self.record(self.alice) for _ in range(3)]
+        next_token, has_more, latest = changelog.changes_since(self.alice, token, limit=2)
+        self.assertTrue(has_more)
+        self.assertEqual(list(latest[changelog.PROGRESS]), [p.pk for p in progresses[:2]])
+        next_token, has_more, latest = changelog.changes_since(self.alice, next_token, limit=2)
+        self.assertFalse(has_more)
+        self.assertEqual(list(latest[changelog.PROGRESS]), [progresses[2].pk])
+
+    def test_safe_token_skips_recent_entries(self):
+        token = changelog.current_token()
+        self.record(self.alice)
+        with override_settings(CHANGELOG_SYNC_DELAY=60):
+            # 記録から CHANGELOG_SYNC_DELAY 秒以内の履歴はまだ渡さない
+            self.assertEqual(changelog.safe_token(), token)
+            self.assertEqual(changelog.changes_since(self.alice, token, limit=100)[0], token)
+        self.assertEqual(changelog.safe_token(), changelog.current_token())
+
+    def test_prune_keeps_latest_entry(self):
+        self.record(self.alice)
+        self.record(self.alice)
+        ChangeLogEntry.objects.update(recorded_at=timezone.now() - timedelta(days=60))
+        latest = changelog.current_token()
+        changelog.prune(days=30)
+        self.assertEqual(list(ChangeLogEntry.objects.values_list('pk', flat=True)), [latest])
+        self.assertTrue(changelog.is_expired(0))
+        self.assertFalse(changelog.is_expired(latest - 1))
+
+    def test_sync_api(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('api:sync'))
+        self.assertEqual(response.json(), {'reset': True, 'token': changelog.safe_token()})
+
+        progress = self.record(self.alice)
+        response = self.client.get(reverse('api:sync'), {'since': response.json()['token']})
+        payload = response.json()
+        self.assertFalse(payload['reset'])
+        self.assertEqual([row['id'] for row in payload['progress']['updated']], [progress.pk])
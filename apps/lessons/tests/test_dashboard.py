@@ -0,0 +1,56 @@
+# apps/lessons/tests/test_dashboard.py
+
+'''
+ホーム（ダッシュボード）が、学習統計と進捗サマリだけから表示され、
+教材数・記録数に関係なく一定のクエリ数（check_query_budgets の予算）に収まることを確認する。
+'''
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from apps.lessons.management.commands.check_query_budgets import AUTH_QUERIES, BUDGETS
+from apps.lessons.models import Lesson, Material, Progress
+
+# ホームのクエリ数の予算（学習統計 + 進捗サマリ一覧）
+HOME_BUDGET = next(budget.queries for budget in BUDGETS if budget.name == 'lessons:home')
+
+
+class DashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add_material(self, title, statuses):
+        # 教材を作成し、レッスンごとに statuses のステータスで進捗を記録する（サマリ・統計はシグナルで更新）
+        material = Material.objects.create(title=title)
+        for order, status in enumerate(statuses):
+            lesson = Lesson.objects.create(material=material, title=f'{title} {order}', order=order)
+            with self.captureOnCommitCallbacks(execute=True):
+                Progress.objects.in_shard_of(self.user).create(user=self.user, lesson=lesson, status=status)
+
+    def get_home(self):
+        with self.assertNumQueries(AUTH_QUERIES + HOME_BUDGET):
+            response = self.client.get(reverse('lessons:home'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_budget_without_records(self):
+        response = self.get_home()
+        self.assertIsNone(response.context['stats'])
+        self.assertEqual(response.context['summaries'], [])
+
+    def test_budget_does_not_grow_with_materials(self):
+        self.add_material('Python入門', ['done', 'in_progress'])
+        self.get_home()
+        for i in range(5):
+            self.add_material(f'教材{i}', ['done', 'not_started', 'done'])
+        response = self.get_home()
+
+        self.assertEqual(len(response.context['summaries']), 6)
+        self.assertEqual(response.context['stats'].total_records, 17)
+        breakdown = {row['status']: row['count'] for row in response.context['status_breakdown']}
+        self.assertEqual(breakdown, {'not_started': 5, 'in_progress': 1, 'done': 11})
@@ -0,0 +1,64 @@
+# apps/lessons/tests/test_import_progress.py
+
+'''
+進捗の一括インポート（import_progress）で、不正な行が行番号付きで読み飛ばされることを確認する。
+'''
+
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from apps.lessons.models import Lesson, Material, Progress
+
+
+class ImportProgressTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='password')
+        cls.lesson = Lesson.objects.create(material=Material.objects.create(title='Python入門'), title='変数', order=0)
+
+    def run_import(self, suffix, content):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, encoding='utf-8', delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.unlink, file.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_progress', file.name, '--skip-summaries', stdout=stdout, stderr=stderr)
+        return stderr.getvalue()
+
+    def row(self, **values):
+        return json.dumps({'user_email': 'Alice@example.com', 'lesson_id': self.lesson.pk, 'status': 'done', **values})
+
+    def test_jsonl_skips_malformed_lines(self):
+        lines = [
+            self.row(date='2024-01-02'),
+            '{"user_email": ',          # JSON として読めない
+            '',
+            '[1, 2]',                   # オブジェクトではない
+            self.row(date=20240102),    # 文字列以外の日付
+            self.row(date='2024-13-01'),
+            self.row(status=['done']),
+            self.row(),
+        ]
+        errors = self.run_import('.jsonl', '\n'.join(lines) + '\n')
+        for number in (2, 4, 5, 6, 7):
+            self.assertIn(f'{number} 行目をスキップ', errors)
+        self.assertNotIn('1 行目をスキップ', errors)
+        self.assertEqual(Progress.objects.filter(user=self.user).count(), 2)
+
+    def test_csv_reports_line_numbers(self):
+        lesson_id = self.lesson.pk
+        content = (
+            'user_email,lesson_id,status,date\n'
+            f'alice@example.com,{lesson_id},done,2024-01-02\n'
+            f'alice@example.com,{lesson_id},done,2024/01/02\n'
+            f'bob@example.com,{lesson_id},done,\n'
+        )
+        errors = self.run_import('.csv', content)
+        self.assertIn("3 行目をスキップ: date が不正です: '2024/01/02'", errors)
+        self.assertIn('4 行目をスキップ: ユーザーが見つかりません', errors)
+        self.assertEqual(Progress.objects.filter(user=self.user).count(), 1)
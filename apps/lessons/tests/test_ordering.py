@@ -0,0 +1,75 @@
+# apps/lessons/tests/test_ordering.py
+
+'''
+レッスンの並べ替え（ordering.py）と、同時の更新で一意制約 (material, order) に抵触した場合の API の応答を確認する。
+'''
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.lessons.models import Lesson, Material
+from apps.lessons.ordering import OrderingError, move_lesson
+
+
+@override_settings(LESSON_ORDER_GAP=4)
+class OrderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='password')
+        cls.material = Material.objects.create(title='Python入門')
+        cls.lessons = [Lesson.objects.create(material=cls.material, title=f'レッスン{i}') for i in range(3)]
+
+    def titles(self):
+        return list(Lesson.objects.filter(material=self.material).values_list('title', flat=True))
+
+    def test_append_uses_next_order(self):
+        self.assertEqual([lesson.order for lesson in self.lessons], [4, 8, 12])
+
+    def test_move_updates_only_moved_lesson(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = move_lesson(self.lessons[2], after=self.lessons[0])
+        self.assertEqual(order, 6)
+        self.assertEqual(self.titles(), ['レッスン0', 'レッスン2', 'レッスン1'])
+        self.assertEqual(Lesson.objects.get(pk=self.lessons[1].pk).version, 1)
+
+    def test_move_rebalances_when_no_gap_is_left(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                move_lesson(Lesson.objects.get(title='レッスン2'), before=Lesson.objects.get(title='レッスン1'))
+                move_lesson(Lesson.objects.get(title='レッスン1'), before=Lesson.objects.get(title='レッスン2'))
+        self.assertEqual(self.titles(), ['レッスン0', 'レッスン1', 'レッスン2'])
+
+    def test_move_uses_current_anchor_order(self):
+        # 移動先を読んだ後に振り直された場合も、ロック後に読み直した値で移動する
+        stale = Lesson.objects.get(pk=self.lessons[0].pk)
+        Lesson.objects.filter(pk=stale.pk).update(order=10)
+        move_lesson(self.lessons[1], after=stale)
+        self.assertEqual(self.titles(), ['レッスン0', 'レッスン1', 'レッスン2'])
+
+    def test_invalid_targets(self):
+        other = Lesson.objects.create(material=Material.objects.create(title='Django入門'), title='ビュー')
+        with self.assertRaises(OrderingError):
+            move_lesson(self.lessons[0], after=self.lessons[0])
+        with self.assertRaises(OrderingError):
+            move_lesson(self.lessons[0], after=other)
+
+    def test_api_returns_conflict_on_concurrent_update(self):
+        self.client.force_login(self.user)
+        with mock.patch('apps.lessons.api.move_lesson', side_effect=IntegrityError):
+            response = self.client.post(
+                reverse('api:lesson_move', kwargs={'pk': self.lessons[2].pk}),
+                {'after': self.lessons[0].pk}, content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 409)
+
+    def test_api_rejects_non_integer_anchor(self):
+        self.client.force_login(self.user)
+        url = reverse('api:lesson_move', kwargs={'pk': self.lessons[2].pk})
+        for value in (self.lessons[0].pk + 0.5, str(self.lessons[0].pk), True):
+            response = self.client.post(url, {'after': value}, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.titles(), ['レッスン0', 'レッスン1', 'レッスン2'])
@@ -0,0 +1,87 @@
+# apps/lessons/tests/test_query_budgets.py
+
+'''
+画面・API ごとのクエリ数の予算（check_query_budgets の BUDGETS）を、テストとして検証する。
+
+p95 応答時間は実運用に近い量のデータが必要なため check_query_budgets で計測し、
+ここでは少量のデータでクエリ数だけを確認する（manage.py test で N+1 の混入を検知する）。
+'''
+
+from django.core.cache import caches
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.lessons.benchmarking import seed_dataset
+from apps.lessons.management.commands.check_query_budgets import AUTH_QUERIES, BUDGETS, PASSWORD, Command
+from apps.lessons.models import Lesson, Material
+
+
+@override_settings(LOGIN_THROTTLE_ENABLED=False, JOBS_RUN_INLINE=False, CHANGELOG_SYNC_DELAY=0)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_dataset(users=5, materials=5, lessons_per_material=10, progress_per_user=30, password=PASSWORD)
+        material = Material.objects.order_by('-pk').first()
+        lessons = Lesson.objects.filter(material=material).order_by('order')
+        cls.data = {
+            'user': cls.users[0],
+            'material': material,
+            'lesson': lessons.first(),
+            'last_lesson': lessons.last(),
+        }
+
+    def setUp(self):
+        # キャッシュが空の初回リクエスト（最大のクエリ数）で判定する
+        caches['default'].clear()
+
+    def request(self, budget):
+        # budget のリクエストを送り、ビュー自身が発行したクエリ数（コミット後の処理を含む）を返す
+        client = Client()
+        if budget.login:
+            client.force_login(self.data['user'])
+        url = reverse(budget.name, kwargs=budget.kwargs(self.data) if budget.kwargs else None)
+        with CaptureQueriesContext(connections['default']) as captured:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = budget.request(client, url, self.data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, budget.status)
+        return len(captured) - (AUTH_QUERIES if budget.login else 0)
+
+    def test_every_url_has_budget(self):
+        self.assertEqual(Command().check_coverage(), [])
+
+    def test_budgets(self):
+        for budget in BUDGETS:
+            with self.subTest(budget.label):
+                self.assertLessEqual(self.request(budget), budget.queries)
+
+    def test_lists_do_not_grow_with_page_size(self):
+        # 一覧のクエリ数はページ内の件数によらず一定（行ごとの追加クエリがない）
+        client = Client()
+        client.force_login(self.data['user'])
+        for name in ('api:material_list', 'api:lesson_list', 'api:progress_list'):
+            for size in (1, 50):
+                with self.subTest(name, size=size), self.assertNumQueries(AUTH_QUERIES + 1):
+                    response = client.get(reverse(name), {'size': size})
+                    self.assertEqual(response.status_code, 200)
+
+    def test_material_detail_is_cached(self):
+        # 2回目以降の教材詳細は、キャッシュ済みの教材・レッスン一覧を使い進捗だけを読む
+        client = Client()
+        client.force_login(self.data['user'])
+        url = reverse('lessons:material_detail', kwargs={'pk': self.data['material'].pk})
+        client.get(url)
+        with self.assertNumQueries(AUTH_QUERIES + 1):
+            self.assertEqual(client.get(url).status_code, 200)
+
+    def test_not_modified(self):
+        # If-None-Match が一致すれば本文を作らずに 304 を返す（クエリは ETag の計算分だけ）
+        client = Client()
+        client.force_login(self.data['user'])
+        url = reverse('api:lesson_detail', kwargs={'pk': self.data['lesson'].pk})
+        etag = client.get(url).headers['ETag']
+        with self.assertNumQueries(AUTH_QUERIES + 1):
+            self.assertEqual(client.get(url, headers={'If-None-Match': etag}).status_code, 304)
@@ -0,0 +1,70 @@
+# apps/lessons/tests/test_search.py
+
+'''
+教材・レッスンの全文検索（search.py）：検索語の分割、フレーズ・前方一致・AND 検索、
+1文字の漢字・かな（bi-gram の途中・末尾の文字を含む）の検索を確認する。
+'''
+
+from django.test import TestCase
+
+from apps.lessons import search
+from apps.lessons.models import Lesson, Material
+
+
+class TokenizeTests(TestCase):
+    def test_tokenize(self):
+        self.assertEqual(search.tokenize('Python の条件分岐'), ['python', 'の条', '条件', '件分', '分岐'])
+        # 全角英数字・大文字は揃える
+        self.assertEqual(search.tokenize('ＰＹＴＨＯＮ３'), ['python3'])
+        self.assertEqual(search.tokenize('条'), ['条'])
+
+    def test_parse_query(self):
+        self.assertEqual(search.parse_query(' 条件分岐  django '), [['条件', '件分', '分岐'], ['django']])
+        self.assertEqual(search.parse_query('  '), [])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # 検索用エントリは保存時のシグナルで登録される
+        cls.python = Material.objects.create(title='Python入門', description='条件分岐と繰り返しを学ぶ')
+        cls.law = Material.objects.create(title='憲法', description='')
+        cls.article = Lesson.objects.create(material=cls.law, title='第一条', order=0)
+        cls.loop = Lesson.objects.create(material=cls.python, title='繰り返し', order=0)
+
+    def found(self, query):
+        results, _ = search.search(query)
+        return [(result['material'].title, result['lesson'].title if result['lesson'] else None) for result in results]
+
+    def test_phrase(self):
+        self.assertEqual(self.found('条件分岐'), [('Python入門', None)])
+        # 文字が揃っていても並びが違えば一致しない
+        self.assertEqual(self.found('分岐条件'), [])
+
+    def test_prefix_for_single_word(self):
+        self.assertEqual(self.found('pyth'), [('Python入門', None)])
+
+    def test_and_search(self):
+        self.assertEqual(self.found('python 繰り返し'), [('Python入門', None)])
+        self.assertEqual(self.found('python 第一条'), [])
+
+    def test_title_ranks_above_body(self):
+        self.assertEqual(self.found('繰り返し'), [('Python入門', '繰り返し'), ('Python入門', None)])
+
+    def test_single_character(self):
+        # 「条」は「第一条」では bi-gram「一条」の末尾にしか現れない
+        self.assertEqual(self.found('条'), [('憲法', '第一条'), ('Python入門', None)])
+        self.assertEqual(self.found('一'), [('憲法', '第一条')])
+        self.assertEqual(self.found('条 python'), [('Python入門', None)])
+        self.assertEqual(
+            set(search.matching_entries('条').values_list('material_id', 'lesson_id')),
+            {(self.law.pk, self.article.pk), (self.python.pk, None)},
+        )
+
+    def test_index_follows_updates(self):
+        self.article.title = '第二条'
+        self.article.save()
+        self.assertEqual(self.found('第一条'), [])
+        self.assertEqual(self.found('第二条'), [('憲法', '第二条')])
+        self.article.delete()
+        self.assertEqual(self.found('第二条'), [])
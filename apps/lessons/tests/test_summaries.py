@@ -0,0 +1,116 @@
+# apps/lessons/tests/test_summaries.py
+
+'''
+進捗サマリ・学習統計の差分更新（signals.py / summaries.py / bulk.delete_progress）が、
+rebuild_summaries() / rebuild_learning_stats() で作り直した結果と一致することを確認する。
+'''
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.lessons.models import LearningStats, Lesson, Material, Progress, ProgressSummary
+from apps.lessons.summaries import rebuild_learning_stats, rebuild_summaries
+
+# 差分更新では戻さない列（summaries.move_lesson() を参照）を除いた比較対象
+SUMMARY_FIELDS = ('user_id', 'material_id', 'lesson_count', 'not_started_count', 'in_progress_count', 'done_count')
+STATS_FIELDS = ('user_id', 'total_records', 'current_streak', 'longest_streak', 'last_study_date')
+
+
+class SummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.alice = User.objects.create_user(username='alice', email='alice@example.com', password='password')
+        cls.bob = User.objects.create_user(username='bob', email='bob@example.com', password='password')
+        cls.python = Material.objects.create(title='Python入門')
+        cls.django = Material.objects.create(title='Django入門')
+        cls.lessons = [Lesson.objects.create(material=cls.python, title=f'レッスン{i}', order=i) for i in range(3)]
+        cls.other = Lesson.objects.create(material=cls.django, title='ビュー', order=0)
+
+    def record(self, user, lesson, status, days_ago=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            progress = Progress(user=user, lesson=lesson, status=status)
+            progress.date = timezone.localdate() - timedelta(days=days_ago)
+            progress.save()
+        return progress
+
+    def snapshot(self):
+        return (
+            sorted(ProgressSummary.objects.values_list(*SUMMARY_FIELDS)),
+            sorted(LearningStats.objects.values_list(*STATS_FIELDS)),
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        rebuild_summaries()
+        rebuild_learning_stats()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_latest_status_is_counted_once(self):
+        self.record(self.alice, self.lessons[0], 'in_progress', days_ago=1)
+        self.record(self.alice, self.lessons[0], 'done')
+        self.record(self.alice, self.lessons[1], 'in_progress')
+        summary = ProgressSummary.objects.get(user=self.alice, material=self.python)
+        self.assertEqual(
+            (summary.lesson_count, summary.not_started_count, summary.in_progress_count, summary.done_count),
+            (3, 0, 1, 1),
+        )
+        self.assertEqual(LearningStats.objects.get(user=self.alice).total_records, 3)
+        self.assertMatchesRebuild()
+
+    def test_new_lesson_increments_lesson_count(self):
+        self.record(self.alice, self.lessons[0], 'done')
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(material=self.python, title='追加のレッスン', order=10)
+        self.assertEqual(ProgressSummary.objects.get(user=self.alice, material=self.python).lesson_count, 4)
+        self.assertMatchesRebuild()
+
+    def test_delete_progress(self):
+        self.record(self.alice, self.lessons[0], 'in_progress', days_ago=2)
+        latest = self.record(self.alice, self.lessons[0], 'done', days_ago=1)
+        self.record(self.alice, self.lessons[1], 'done')
+        self.record(self.bob, self.lessons[0], 'in_progress')
+        with self.captureOnCommitCallbacks(execute=True):
+            latest.delete()
+        # 最新の記録を削除すると、1つ前の記録が最新ステータスに戻る
+        summary = ProgressSummary.objects.get(user=self.alice, material=self.python)
+        self.assertEqual((summary.in_progress_count, summary.done_count), (1, 1))
+        self.assertMatchesRebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted, by_model = Progress.objects.filter(user=self.alice).delete()
+        self.assertEqual((deleted, by_model), (2, {'lessons.Progress': 2}))
+        self.assertMatchesRebuild()
+
+    def test_move_lesson(self):
+        self.record(self.alice, self.lessons[0], 'done')
+        self.record(self.alice, self.lessons[1], 'in_progress')
+        self.record(self.bob, self.lessons[0], 'in_progress')
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson = Lesson.objects.get(pk=self.lessons[0].pk)
+            lesson.material = self.django
+            lesson.order = 1
+            lesson.save()
+        summary = ProgressSummary.objects.get(user=self.alice, material=self.django)
+        self.assertEqual((summary.lesson_count, summary.done_count), (2, 1))
+        self.assertMatchesRebuild()
+
+    def test_delete_lesson(self):
+        self.record(self.alice, self.lessons[0], 'done')
+        self.record(self.alice, self.lessons[1], 'in_progress')
+        self.record(self.bob, self.lessons[0], 'done')
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.get(pk=self.lessons[0].pk).delete()
+        summary = ProgressSummary.objects.get(user=self.bob, material=self.python)
+        self.assertEqual((summary.lesson_count, summary.done_count), (2, 0))
+        self.assertMatchesRebuild()
+
+    def test_rebuild_keeps_enrollment_rows(self):
+        # 進捗のない受講登録の行は、再構築しても削除されずに数え直される
+        ProgressSummary.objects.create(user=self.bob, material=self.django, lesson_count=0)
+        rebuild_summaries()
+        summary = ProgressSummary.objects.get(user=self.bob, material=self.django)
+        self.assertEqual((summary.lesson_count, summary.done_count), (1, 0))
@@ -1,19 +1,27 @@
 # apps/lessons/urls.py
 
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# 閲覧系ビュー（ホーム・教材一覧・教材詳細・レッスン詳細）の実装を選択する
+# settings.LESSONS_ASYNC_VIEWS = True なら非同期版（ASGI 向け）、False なら同期版（WSGI 向け）
+if getattr(settings, 'LESSONS_ASYNC_VIEWS', False):
+    from . import async_views as read_views
+else:
+    read_views = views
+
 app_name = 'lessons'  # URL名前空間を設定。テンプレートで {% url 'lessons:home' %} のように使うための識別子
 
 urlpatterns = [
     # ルートURL（空文字）で home ビューを呼び出し。トップページとして利用
-    path('', views.home, name='home'),
+    path('', read_views.home, name='home'),
 
     # 教材一覧ページ。Materialの一覧表示ビュー
-    path('materials/', views.material_list_view, name='material_list'),
+    path('materials/', read_views.material_list_view, name='material_list'),
 
     # 教材詳細ページ。pkで指定された教材の詳細表示ビュー
-    path('materials/<int:pk>/', views.material_detail_view, name='material_detail'),
+    path('materials/<int:pk>/', read_views.material_detail_view, name='material_detail'),
 
     # 教材作成ページ。新規教材登録用フォーム表示・送信
     path('materials/create/', views.material_create, name='material_create'),
@@ -25,8 +33,17 @@ urlpatterns = [
     path('materials/<int:material_pk>/lessons/create/', views.lesson_create_view, name='lesson_create_with_material'),
 
     # レッスン詳細ページ。pkで指定されたレッスン詳細を表示
-    path('lessons/<int:pk>/', views.lesson_detail_view, name='lesson_detail'),
+    path('lessons/<int:pk>/', read_views.lesson_detail_view, name='lesson_detail'),
 
     # レッスンに対する進捗登録ページ。lesson_pkでレッスンを指定して進捗作成フォーム表示
     path('lessons/<int:lesson_pk>/progress/create/', views.progress_create_view, name='progress_create'),
+
+    # 教材・レッスンの検索。?q= の検索語に一致するものを関連度順に表示
+    path('search/', views.search_view, name='search'),
+
+    # 学習履歴のダウンロード。?format=csv（既定）または ?format=ndjson でストリーミング出力
+    path('progress/export/', views.progress_export_view, name='progress_export'),
+
+    # 学習履歴のファイル作成をバックグラウンドジョブとして登録（POST）し、ジョブの状態ページへ移動
+    path('progress/export/job/', views.progress_export_job_view, name='progress_export_job'),
 ]
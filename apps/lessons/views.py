@@ -1,22 +1,79 @@
 # apps/lessons/views.py
 
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from .models import Material, Lesson  # モデルから教材（Material）とレッスン（Lesson）をインポート
+from django.views.decorators.http import require_POST
+from apps.jobs.queue import enqueue
+from apps.shards.routers import sharding_enabled
+from .models import LearningStats, Material, Lesson, Progress, ProgressSummary  # モデルから教材（Material）とレッスン（Lesson）をインポート
 from .forms import MaterialForm, LessonForm, ProgressForm  # フォームもインポート
+from .caching import lesson_snapshot, material_snapshot
+from .exports import CONTENT_TYPES, buffered, progress_rows, serialize
+from .pagination import get_page_size, keyset_paginate, parse_cursor
+from .search import search
+from .summaries import STATUS_FIELDS
 
 # ----------------------------------------
 # 教材一覧を表示するビュー（関数ベースビュー）
 # ----------------------------------------
 # @login_required デコレータでログイン済みユーザーのみアクセス許可
-# Materialモデルの全件取得し、教材一覧ページのテンプレートに渡す
+# 教材を id のキーセット方式でページ分割し、レッスン数とログインユーザーの完了数を
+# 同じクエリ内で集計して渡す（教材数に関係なく1ページあたりのクエリ数は一定）
 @login_required
 def material_list_view(request):
-    materials = Material.objects.all()  # 教材テーブルの全レコードを取得
+    page_size = material_list_page_size(request)
+    page = keyset_paginate(
+        material_list_queryset(request.user),
+        page_size=page_size,
+        after=parse_cursor(request.GET.get('after')),    # 「次へ」のカーソル
+        before=parse_cursor(request.GET.get('before')),  # 「前へ」のカーソル
+    )
+    done_counts = done_count_rows(request.user, page.items)
+    if done_counts is not None:
+        apply_done_counts(page.items, done_counts)
     return render(request, 'material_list.html', {
-        'materials': materials  # テンプレートで 'materials' 変数として利用可能
+        'materials': page.items,  # テンプレートで 'materials' 変数として利用可能
+        'page': page,             # 前後ページへのリンク生成用
+        'page_size': page_size,
     })
 
+
+def material_list_page_size(request):
+    return get_page_size(
+        request,
+        default=getattr(settings, 'MATERIAL_LIST_PAGE_SIZE', 20),
+        maximum=getattr(settings, 'MATERIAL_LIST_MAX_PAGE_SIZE', 100),
+    )
+
+
+def material_list_queryset(user):
+    queryset = (
+        Material.objects.only('id', 'title')  # 一覧に不要な説明文は読み込まない
+        .with_lesson_counts()
+    )
+    # 進捗サマリがシャード（別のDB）にある場合はサブクエリにできないため、done_count_rows() で後から読み込む
+    return queryset if sharding_enabled() else queryset.with_done_counts(user)
+
+
+def done_count_rows(user, materials):
+    # シャード化している場合に、ページ内の教材ごとの完了数 (教材ID, 完了数) を読み込むクエリ（していなければ None）
+    if not sharding_enabled():
+        return None
+    return (
+        ProgressSummary.objects.for_user(user)
+        .filter(material_id__in=[material.pk for material in materials])
+        .values_list('material_id', 'done_count')
+    )
+
+
+def apply_done_counts(materials, rows):
+    done = dict(rows)
+    for material in materials:
+        material.done_count = done.get(material.pk, 0)
+
 # ----------------------------------------
 # 教材を新規登録するビュー
 # ----------------------------------------
@@ -39,26 +96,49 @@ def material_create(request):
 # ----------------------------------------
 # 指定教材の詳細表示ビュー
 # ----------------------------------------
-# pkで指定されたMaterialインスタンスを取得（存在しなければ404）
-# その教材に紐づくLessonの一覧も取得してテンプレートへ渡す
+# 教材とレッスン一覧（全ユーザー共通の部分）はバージョン付きキャッシュから取得し、
+# ログインユーザーの最新ステータスだけを1クエリで重ねて表示する
+# （キャッシュが有効な間は教材・レッスンのテーブルにはアクセスしない）
 @login_required
 def material_detail_view(request, pk):
-    material = get_object_or_404(Material, pk=pk)  # 教材を1件取得 or 404
-    lessons = material.lessons.all()  # 外部キーのrelated_name 'lessons' を使い関連レッスン一覧取得
-    return render(request, 'material_detail.html', {
-        'material': material,  # 教材オブジェクト
-        'lessons': lessons     # 教材に紐づくレッスン一覧
-    })
+    snapshot = material_snapshot(pk)  # 教材が存在しなければ404
+    statuses = material_progress(request.user, snapshot).latest_statuses()
+    return render(request, 'material_detail.html', material_detail_context(snapshot, statuses))
+
+
+def material_progress(user, snapshot):
+    # 教材のレッスンに対するユーザーの進捗（シャード上ではレッスンを JOIN できないため、キャッシュ内のレッスンIDで絞り込む）
+    progresses = Progress.objects.for_user(user)
+    if sharding_enabled():
+        return progresses.filter(lesson_id__in=[lesson['pk'] for lesson in snapshot['lessons']])
+    return progresses.filter(lesson__material_id=snapshot['material']['pk'])
+
+
+def material_detail_context(snapshot, statuses):
+    # ステータスの表示名をテンプレート用に付与（キャッシュ内の dict は書き換えない）
+    status_labels = dict(Progress.STATUS_CHOICES)
+    lessons = [
+        {
+            **lesson,
+            'latest_status': statuses.get(lesson['pk']),
+            'latest_status_label': status_labels.get(statuses.get(lesson['pk']), '未記録'),
+        }
+        for lesson in snapshot['lessons']
+    ]
+    return {
+        'material': snapshot['material'],  # 教材（pk / title / description）
+        'lessons': lessons                 # 教材に紐づくレッスン一覧（最新ステータス付き）
+    }
 
 # ----------------------------------------
 # 指定レッスンの詳細表示ビュー
 # ----------------------------------------
-# pkで指定されたLessonを取得しテンプレートに渡す
+# レッスンの表示内容はバージョン付きキャッシュから取得する（存在しなければ404）
 @login_required
 def lesson_detail_view(request, pk):
-    lesson = get_object_or_404(Lesson, pk=pk)  # レッスン1件取得 or 404
+    lesson = lesson_snapshot(pk)  # レッスン（pk / title / material_id / material_title）
     return render(request, 'lesson_detail.html', {
-        'lesson': lesson  # レッスンオブジェクトを渡す
+        'lesson': lesson  # レッスンの情報を渡す
     })
 
 # ----------------------------------------
@@ -94,7 +174,8 @@ def lesson_create_view(request, material_pk=None):
 @login_required
 def progress_create_view(request, lesson_pk):
     # 進捗は特定のレッスンに紐づくためlesson_pkを受け取る
-    lesson = get_object_or_404(Lesson, pk=lesson_pk)
+    # （教材も同時に取得し、保存後の学習統計の更新で追加クエリが発生しないようにする）
+    lesson = get_object_or_404(Lesson.objects.select_related('material'), pk=lesson_pk)
 
     if request.method == 'POST':
         form = ProgressForm(request.POST)
@@ -102,7 +183,7 @@ def progress_create_view(request, lesson_pk):
             progress = form.save(commit=False)  # DB保存前にuserとlessonをセット
             progress.user = request.user  # ログインユーザーに紐付け
             progress.lesson = lesson       # 対象のレッスンに紐付け
-            progress.save()  # 保存
+            progress.save()  # 保存（シャード化している場合、保存先は ShardRouter が user から決める）
             return redirect('lessons:lesson_detail', pk=lesson.pk)  # レッスン詳細へ戻る
     else:
         form = ProgressForm()  # GETは空フォーム
@@ -112,11 +193,101 @@ def progress_create_view(request, lesson_pk):
         'lesson': lesson,  # レッスン情報もテンプレートへ渡す
     })
 
+# ----------------------------------------
+# 学習履歴（進捗）のダウンロードビュー
+# ----------------------------------------
+# ログインユーザー自身の進捗を CSV（?format=csv）または NDJSON（?format=ndjson）で返す
+# 行は .iterator() でDBから分割して読み出し、1行ずつレスポンスへ流すため
+# 履歴が数十万件あってもサーバーのメモリ使用量は増えない
+@login_required
+def progress_export_view(request):
+    fmt = 'jsonl' if request.GET.get('format') in ('ndjson', 'jsonl') else 'csv'
+    content_type, extension = CONTENT_TYPES[fmt]
+    rows = progress_rows(
+        request.user.progresses.all(),
+        chunk_size=getattr(settings, 'PROGRESS_EXPORT_CHUNK_SIZE', 2000),
+    )
+    response = StreamingHttpResponse(buffered(serialize(rows, fmt)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="progress.{extension}"'
+    return response
+
+# ----------------------------------------
+# 学習履歴のファイル作成（バックグラウンドジョブ）
+# ----------------------------------------
+# 履歴が多いユーザー向けに、ダウンロードの間 Web サーバーのワーカーを占有しないよう、
+# ファイルの作成をバックグラウンドジョブ（tasks.export_progress）に任せ、ジョブの状態ページへ移動する
+@login_required
+@require_POST
+def progress_export_job_view(request):
+    fmt = 'jsonl' if request.POST.get('format') in ('ndjson', 'jsonl') else 'csv'
+    job = enqueue('lessons.export_progress', user=request.user, user_id=request.user.pk, fmt=fmt)
+    return redirect('jobs:job_detail', pk=job.pk)
+
+# ----------------------------------------
+# 教材・レッスンの検索ビュー
+# ----------------------------------------
+# 全文検索インデックス（search.py）で一致したものを関連度の高い順に表示する
+# 関連度順のため ?page= によるページ送りとし、深いページの読み飛ばしを防ぐためページ数に上限を設ける
+@login_required
+def search_view(request):
+    query = request.GET.get('q', '').strip()
+    page_size = getattr(settings, 'SEARCH_PAGE_SIZE', 20)
+    max_pages = getattr(settings, 'SEARCH_MAX_PAGES', 50)
+    try:
+        page = max(1, min(int(request.GET.get('page', 1)), max_pages))
+    except ValueError:
+        page = 1
+    results, has_more = search(query, offset=(page - 1) * page_size, limit=page_size)
+    return render(request, 'search.html', {
+        'query': query,
+        'results': results,
+        'page': page,
+        'has_previous': page > 1,
+        'has_next': has_more and page < max_pages,
+    })
+
 # ----------------------------------------
 # ホーム画面表示ビュー
 # ----------------------------------------
-# 認証済みユーザー専用のホームページとして利用
+# 認証済みユーザー専用のホームページ（ダッシュボード）として利用
+# 事前計算済みの学習統計（1クエリ）と教材ごとの進捗サマリ（1クエリ）だけで描画する
 @login_required
 def home(request):
-    # 特に追加情報は渡さず、home.htmlテンプレートを表示するだけ
-    return render(request, 'home.html')
+    stats = LearningStats.objects.for_user(request.user).first()  # 未記録のユーザーは None
+    summaries = list(dashboard_summaries(request.user))
+    return render(request, 'home.html', dashboard_context(stats, summaries))
+
+
+def dashboard_summaries(user):
+    # ダッシュボードに表示する教材ごとの進捗サマリ（教材名は JOIN で同時に取得）
+    summaries = ProgressSummary.objects.for_user(user).order_by('-last_activity', 'material_id')
+    counts = ('lesson_count', 'not_started_count', 'in_progress_count', 'done_count', 'last_activity')
+    if sharding_enabled():
+        # シャード上のサマリからは教材を JOIN できないため、教材名は別のクエリ（1回）でまとめて読み込む
+        return summaries.only('material_id', *counts).prefetch_related(
+            Prefetch('material', queryset=Material.objects.only('id', 'title'))
+        )
+    return summaries.select_related('material').only('material__id', 'material__title', *counts)
+
+
+def dashboard_context(stats, summaries):
+    # ステータス別の内訳は取得済みのサマリを合計する（DBアクセスなし）
+    status_labels = dict(Progress.STATUS_CHOICES)
+    status_breakdown = [
+        {
+            'status': status,
+            'label': status_labels[status],
+            'count': sum(getattr(summary, field) for summary in summaries),
+        }
+        for status, field in STATUS_FIELDS.items()
+    ]
+    recent_activity = [
+        {**entry, 'status_label': status_labels.get(entry['status'], entry['status'])}
+        for entry in (stats.recent_activity if stats else [])
+    ]
+    return {
+        'stats': stats,                        # 連続学習日数・記録数など
+        'recent_activity': recent_activity,    # 最近の記録（新しい順）
+        'summaries': summaries,                # 教材ごとの完了状況
+        'status_breakdown': status_breakdown,  # ステータス別のレッスン数
+    }
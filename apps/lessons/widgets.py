@@ -0,0 +1,36 @@
+# apps/lessons/widgets.py
+
+from django import forms
+from django.conf import settings
+from django.urls import reverse_lazy
+
+from .models import Material
+
+
+# ----------------------------------------
+# 教材の選択欄（検索して選ぶ）
+# <select> に全ての教材を並べる代わりに、入力した語で教材一覧 API（?q=）を呼び出し、候補をページごとに読み込む。
+# 選択した教材は hidden の入力欄で主キーを送信し、描画時に読み込むのは選択済みの教材の1件だけ。
+class MaterialPicker(forms.Widget):
+    template_name = 'widgets/material_picker.html'
+    lookup_url = reverse_lazy('api:material_list')
+
+    class Media:
+        js = ('lessons/js/material_picker.js',)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget'].update({
+            'label': self.selected_label(context['widget']['value']),
+            'lookup_url': self.lookup_url,
+            'page_size': getattr(settings, 'MATERIAL_PICKER_PAGE_SIZE', 20),
+        })
+        return context
+
+    def selected_label(self, value):
+        # 選択済みの教材のタイトル（不正な値・削除済みの場合は空欄）
+        try:
+            pk = int(value)
+        except (TypeError, ValueError):
+            return ''
+        return Material.objects.filter(pk=pk).values_list('title', flat=True).first() or ''
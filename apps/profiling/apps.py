@@ -0,0 +1,9 @@
+# apps/profiling/apps.py
+
+from django.apps import AppConfig
+
+
+class ProfilingConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.profiling'
+    verbose_name = 'パフォーマンス計測'
@@ -0,0 +1,179 @@
+# apps/profiling/middleware.py
+
+'''
+リクエスト単位のパフォーマンス計測ミドルウェア（settings.PROFILING_ENABLED が True の時だけ有効）。
+
+1リクエストごとに次の値を計測し、解決されたビュー名（例: lessons:material_detail）ごとに集計する。
+  - 応答時間（このミドルウェアより内側の処理全体）
+  - DB の実行時間とクエリ数（全DB接続の合計）
+  - 重複クエリ数（SQL もパラメータも同じもの）と類似クエリ数（SQL が同じでパラメータ違い。N+1 の兆候）
+  - テンプレートの描画時間
+集計結果は管理者専用の画面（/profiling/）で確認できる。
+
+settings.PROFILING_CPROFILE_DIR を指定すると各リクエストを cProfile でも計測し、
+応答時間が settings.PROFILING_SLOW_MS を超えたリクエストだけ .prof ファイルとして保存する。
+（cProfile 自体のオーバーヘッドが大きいため、本番では必要な時だけ有効にすること）
+'''
+
+import cProfile
+import functools
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils import timezone
+
+from .stats import store
+
+# 計測中のリクエストのテンプレート描画時間（計測していない時は None）
+_template_timer = ContextVar('profiling_template_timer', default=None)
+
+# cProfile は同時に1つしか有効にできないため、並行リクエストでは先着1件だけを計測する
+_cprofile_lock = threading.Lock()
+
+
+class QueryCollector:
+    """
+    connection.execute_wrapper() に渡し、実行されたクエリの件数・時間・重複を記録する。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()  # {(sql, params): 実行回数}
+        self.shapes = Counter()      # {sql: 実行回数}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[sql] += 1
+            # executemany のパラメータは大きいため、重複判定は SQL のみで行う
+            self.statements[(sql, None if many else repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        return sum(n - 1 for n in self.statements.values() if n > 1)
+
+    @property
+    def similar(self):
+        return sum(n - 1 for n in self.shapes.values() if n > 1)
+
+    @property
+    def top_duplicate(self):
+        # 最も多く繰り返された SQL（繰り返しがなければ None）
+        if not self.shapes:
+            return None
+        sql, n = self.shapes.most_common(1)[0]
+        return sql if n > 1 else None
+
+
+class _TemplateTimer:
+    def __init__(self):
+        self.total = 0.0
+        self.depth = 0  # フォームのウィジェット描画など、入れ子の描画を二重に数えないため
+
+
+def instrument_templates():
+    """
+    Django テンプレートの描画処理をラップし、計測中のリクエストの描画時間を積算する（初回のみ）。
+    """
+    if getattr(DjangoTemplate.render, '_profiling', False):
+        return
+    original = DjangoTemplate.render
+
+    @functools.wraps(original)
+    def render(self, context=None, request=None):
+        timer = _template_timer.get()
+        if timer is None:
+            return original(self, context, request)
+        timer.depth += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            timer.depth -= 1
+            if timer.depth == 0:
+                timer.total += time.perf_counter() - started
+
+    render._profiling = True
+    DjangoTemplate.render = render
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            # 無効時はミドルウェアチェーンから外れ、オーバーヘッドは発生しない
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'PROFILING_SLOW_MS', 500)
+        profile_dir = getattr(settings, 'PROFILING_CPROFILE_DIR', None)
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        instrument_templates()
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        timer = _TemplateTimer()
+        token = _template_timer.set(timer)
+        profiler = None
+        if self.profile_dir and _cprofile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(collector))
+                started = time.perf_counter()
+                if profiler:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler:
+                        profiler.disable()
+                elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            _template_timer.reset(token)
+            if profiler:
+                _cprofile_lock.release()
+
+        view_name = self.view_name(request)
+        if view_name is None:
+            return response
+
+        store.add(view_name, {
+            'wall_ms': elapsed,
+            'db_ms': collector.duration * 1000,
+            'template_ms': timer.total * 1000,
+            'queries': collector.count,
+            'duplicate_queries': collector.duplicates,
+            'similar_queries': collector.similar,
+            'top_duplicate': collector.top_duplicate,
+        })
+        if profiler and elapsed >= self.slow_ms:
+            self.dump_profile(profiler, view_name, elapsed)
+        return response
+
+    def view_name(self, request):
+        # URL が解決できなかったリクエスト（404 など）と、集計画面自体は記録しない
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.namespace == 'profiling':
+            return None
+        return match.view_name
+
+    def dump_profile(self, profiler, view_name, elapsed):
+        # 例: 20260101-120000-lessons.material_detail-812ms.prof（snakeviz 等で閲覧できる）
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        stamp = timezone.localtime().strftime('%Y%m%d-%H%M%S')
+        filename = f"{stamp}-{view_name.replace(':', '.')}-{elapsed:.0f}ms.prof"
+        profiler.dump_stats(self.profile_dir / filename)
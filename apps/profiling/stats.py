@@ -0,0 +1,79 @@
+# apps/profiling/stats.py
+
+'''
+リクエストごとの計測結果を、ビュー名ごとに直近 N 件だけ保持する集計ストア。
+
+計測値はプロセス内のメモリに保持する（ワーカープロセスごとに独立し、再起動で消える）。
+保持件数は settings.PROFILING_WINDOW（既定 1000）で、古いものから順に捨てる。
+'''
+
+import threading
+from collections import deque
+
+from django.conf import settings
+
+# 集計対象の計測項目（ミリ秒の値はパーセンタイルを、件数は平均と最大を出す）
+TIMING_FIELDS = ('wall_ms', 'db_ms', 'template_ms')
+COUNT_FIELDS = ('queries', 'duplicate_queries', 'similar_queries')
+
+
+def percentile(samples, pct):
+    """
+    最近傍法によるパーセンタイル（サンプル数が少なくても必ず実測値を返す）。
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class ProfileStore:
+    def __init__(self, window=None):
+        self.window = window or getattr(settings, 'PROFILING_WINDOW', 1000)
+        self._lock = threading.Lock()
+        self._records = {}  # {view_name: deque[dict]}
+
+    def add(self, view_name, record):
+        with self._lock:
+            records = self._records.get(view_name)
+            if records is None:
+                records = self._records[view_name] = deque(maxlen=self.window)
+            records.append(record)
+
+    def reset(self):
+        with self._lock:
+            self._records.clear()
+
+    def summary(self):
+        """
+        ビューごとの集計結果を p95 応答時間の遅い順に返す。
+        """
+        with self._lock:
+            snapshot = {name: list(records) for name, records in self._records.items()}
+
+        rows = []
+        for name, records in snapshot.items():
+            row = {'view': name, 'count': len(records)}
+            for field in TIMING_FIELDS:
+                samples = [record[field] for record in records]
+                row[field] = {
+                    'p50': percentile(samples, 50),
+                    'p95': percentile(samples, 95),
+                    'p99': percentile(samples, 99),
+                    'max': max(samples),
+                }
+            for field in COUNT_FIELDS:
+                samples = [record[field] for record in records]
+                row[field] = {'mean': sum(samples) / len(samples), 'max': max(samples)}
+            # 重複クエリが最後に検出されたときの SQL（N+1 の調査の手がかり）
+            row['last_duplicate_sql'] = next(
+                (record['top_duplicate'] for record in reversed(records) if record['top_duplicate']), None
+            )
+            rows.append(row)
+        rows.sort(key=lambda row: row['wall_ms']['p95'], reverse=True)
+        return rows
+
+
+# ミドルウェアと集計画面で共有するストア
+store = ProfileStore()
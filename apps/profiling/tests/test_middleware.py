@@ -0,0 +1,81 @@
+# apps/profiling/tests/test_middleware.py
+
+'''
+リクエスト単位の計測ミドルウェア（middleware.py）が、ビューごとの応答時間・クエリ数・重複クエリを記録することと、
+PROFILING_ENABLED が False の場合は何もしない（ミドルウェアチェーンから外れる）ことを確認する。
+'''
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from apps.lessons.management.commands.check_query_budgets import AUTH_QUERIES, BUDGETS
+from apps.lessons.models import Material
+from apps.profiling.middleware import ProfilingMiddleware
+from apps.profiling.stats import store
+
+HOME_QUERIES = AUTH_QUERIES + next(budget.queries for budget in BUDGETS if budget.name == 'lessons:home')
+
+
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='admin', email='admin@example.com', password='password', is_staff=True,
+        )
+        cls.material = Material.objects.create(title='Python入門')
+
+    def setUp(self):
+        store.reset()
+        self.addCleanup(store.reset)
+
+    def rows(self):
+        return {row['view']: row for row in store.summary()}
+
+    @override_settings(PROFILING_ENABLED=True, PROFILING_CPROFILE_DIR=None)
+    def test_records_breakdown_per_view(self):
+        # ミドルウェアは Client の初回リクエストで読み込まれるため、設定を変えた後に Client を使う
+        self.client.force_login(self.user)
+        for _ in range(2):
+            self.client.get(reverse('lessons:home'))
+        self.client.get(reverse('lessons:material_list'))
+
+        rows = self.rows()
+        self.assertEqual(set(rows), {'lessons:home', 'lessons:material_list'})
+        home = rows['lessons:home']
+        self.assertEqual(home['count'], 2)
+        self.assertEqual(home['queries'], {'mean': HOME_QUERIES, 'max': HOME_QUERIES})
+        self.assertEqual(home['duplicate_queries']['max'], 0)
+        for field in ('wall_ms', 'db_ms', 'template_ms'):
+            self.assertGreater(home[field]['p95'], 0, field)
+        self.assertGreaterEqual(home['wall_ms']['p50'], home['db_ms']['p50'])
+
+        # 集計画面自体は記録しない
+        payload = self.client.get(reverse('profiling:stats'), {'format': 'json'}).json()
+        self.assertEqual({row['view'] for row in payload['views']}, {'lessons:home', 'lessons:material_list'})
+
+    @override_settings(PROFILING_ENABLED=True, PROFILING_CPROFILE_DIR=None)
+    def test_counts_duplicate_and_similar_queries(self):
+        def view(request):
+            request.resolver_match = resolve(reverse('lessons:material_list'))
+            for _ in range(3):
+                Material.objects.filter(pk=self.material.pk).first()
+            Material.objects.filter(pk=self.material.pk + 1).first()
+            return HttpResponse()
+
+        ProfilingMiddleware(view)(RequestFactory().get('/'))
+        row = self.rows()['lessons:material_list']
+        self.assertEqual(row['queries']['max'], 4)
+        self.assertEqual(row['duplicate_queries']['max'], 2)
+        self.assertEqual(row['similar_queries']['max'], 3)
+        self.assertIn('lessons_material', row['last_duplicate_sql'])
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: HttpResponse())
+        self.client.force_login(self.user)
+        self.client.get(reverse('lessons:home'))
+        self.assertEqual(store.summary(), [])
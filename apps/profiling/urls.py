@@ -0,0 +1,11 @@
+# apps/profiling/urls.py
+
+from django.urls import path
+from . import views
+
+app_name = 'profiling'
+
+urlpatterns = [
+    # ビューごとの応答時間・クエリ数の集計（管理者のみ）
+    path('', views.profiling_stats_view, name='stats'),
+]
@@ -0,0 +1,31 @@
+# apps/profiling/views.py
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+
+from .stats import store
+
+
+# ----------------------------------------
+# ビューごとの計測結果（管理者のみ）
+# ----------------------------------------
+# GET: 集計結果を表示（?format=json で JSON を返す）
+# POST: 集計結果をリセット
+@staff_member_required
+def profiling_stats_view(request):
+    if request.method == 'POST':
+        store.reset()
+        return redirect('profiling:stats')
+
+    rows = store.summary()
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'window': store.window, 'views': rows})
+    return render(request, 'profiling/stats.html', {
+        'rows': rows,
+        'window': store.window,
+        'enabled': getattr(settings, 'PROFILING_ENABLED', False),
+        'slow_ms': getattr(settings, 'PROFILING_SLOW_MS', 500),
+        'profile_dir': getattr(settings, 'PROFILING_CPROFILE_DIR', None),
+    })
@@ -0,0 +1,9 @@
+# apps/replicas/apps.py
+
+from django.apps import AppConfig
+
+
+class ReplicasConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.replicas'
+    verbose_name = '読み取りレプリカ'
@@ -0,0 +1,52 @@
+# apps/replicas/management/commands/sync_replicas.py
+
+'''
+SQLite の primary（default）の内容を、レプリカ（settings.DB_REPLICAS）のファイルへ複製する管理コマンド。
+
+本番の PostgreSQL ではストリーミングレプリケーションが複製するため不要で、
+ローカルで複数の SQLite ファイルを使って読み取りの振り分けを試すためのもの。
+--interval を指定すると一定間隔で複製を繰り返す（レプリケーションの遅延を模擬できる）。
+
+    DJANGO_DB_REPLICAS=replica1.sqlite3,replica2.sqlite3 python manage.py sync_replicas
+    DJANGO_DB_REPLICAS=replica1.sqlite3 python manage.py sync_replicas --interval 2
+'''
+
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'SQLite の primary の内容をレプリカのファイルへ複製します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None, help='複製を繰り返す間隔（秒）。省略時は1回だけ複製する')
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'DB_REPLICAS', [])
+        if not replicas:
+            raise CommandError('レプリカがありません（環境変数 DJANGO_DB_REPLICAS にファイルパスを指定してください）。')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('複製できるのは SQLite だけです（PostgreSQL はストリーミングレプリケーションを使用してください）。')
+
+        while True:
+            for alias in replicas:
+                self.copy(primary, alias)
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, primary, alias):
+        # SQLite のオンラインバックアップ API で、書き込み中の primary からも一貫した状態を複製する
+        started = time.perf_counter()
+        primary.ensure_connection()
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+        self.stdout.write(f'{alias}: 複製しました（{(time.perf_counter() - started) * 1000:.0f} ms）')
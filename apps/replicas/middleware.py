@@ -0,0 +1,40 @@
+# apps/replicas/middleware.py
+
+'''
+読み取りの振り分け（routers.ReplicaRouter）をリクエスト単位で行うミドルウェア（settings.DB_REPLICAS がある時だけ有効）。
+
+書き込んだリクエストの応答に REPLICA_PIN_SECONDS 秒で期限切れになる Cookie を付け、
+その間の同じブラウザからのリクエストは全ての読み取りを primary から行う（レプリカへの反映の遅れで、
+自分が登録した教材・進捗が直後の画面に表示されない問題を防ぐ）。
+'''
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .routers import begin_request, end_request
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaPinningMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'DB_REPLICAS', None):
+            # レプリカがなければミドルウェアチェーンから外れ、全て primary を使う
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.cookie_name = getattr(settings, 'REPLICA_PIN_COOKIE', 'db_pin')
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+    def __call__(self, request):
+        pinned = request.method not in SAFE_METHODS or self.cookie_name in request.COOKIES
+        token = begin_request(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = end_request(token)
+        if wrote:
+            response.set_cookie(
+                self.cookie_name, '1', max_age=self.pin_seconds,
+                httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
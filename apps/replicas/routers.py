@@ -0,0 +1,79 @@
+# apps/replicas/routers.py
+
+'''
+読み取りを読み取り専用レプリカへ振り分けるDBルーター（settings.DATABASE_ROUTERS に登録）。
+
+- settings.DB_REPLICA_MODELS のモデル（教材・レッスンなど全員に共通のデータ、他のユーザーの情報）の読み取りは、
+  リクエストごとに選んだ1つのレプリカ（settings.DB_REPLICAS）から行う
+- 書き込みと、それ以外のモデル（ログインユーザー自身の進捗・サマリなど）の読み取りは primary（default）から行う
+- 次の場合は、自分の書き込みが直後に見えるよう全ての読み取りを primary から行う（read-your-writes）
+    * GET / HEAD / OPTIONS 以外のリクエスト（フォームの検証などで書き込み直前の状態を読むため）
+    * 同じリクエストの中で既に書き込んだ後
+    * 書き込みから REPLICA_PIN_SECONDS 秒以内のリクエスト（middleware.ReplicaPinningMiddleware の Cookie で判定）
+- リクエストの外（管理コマンド・マイグレーションなど）は常に primary から読む
+'''
+
+import random
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# セッションの保存はログイン中のほぼ全てのリクエストで起こるため、読み取りを primary に固定する書き込みとして扱わない
+PIN_EXEMPT_APPS = {'sessions'}
+
+
+@dataclass
+class RoutingState:
+    replica: str | None   # このリクエストで読み取りに使うレプリカ（None なら primary）
+    wrote: bool = False   # このリクエストで書き込んだか
+
+
+# 処理中のリクエストの振り分け状態（リクエストの外では None）
+_state = ContextVar('replica_routing_state', default=None)
+
+
+def begin_request(pinned):
+    """
+    リクエストの開始時に振り分け状態を作り、終了時に end_request() へ渡すトークンを返す。
+    pinned が True なら、このリクエストの読み取りは全て primary から行う。
+    """
+    replicas = getattr(settings, 'DB_REPLICAS', [])
+    replica = None if pinned or not replicas else random.choice(replicas)
+    return _state.set(RoutingState(replica=replica))
+
+
+def end_request(token):
+    # 振り分け状態を破棄し、リクエスト中に書き込んだかどうかを返す
+    state = _state.get()
+    _state.reset(token)
+    return state.wrote
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # 他の DB から読んだインスタンスの関連の読み取りも含め、振り分け先を必ず明示する
+        # （None を返すと、レプリカから読んだ教材の関連として自分の進捗までレプリカから読んでしまう）
+        state = _state.get()
+        if state is None or state.replica is None or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label not in getattr(settings, 'DB_REPLICA_MODELS', ()):
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.app_label not in PIN_EXEMPT_APPS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # レプリカは primary の複製のため、どの DB から読んだインスタンス同士も関連付けてよい
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # レプリカには primary から複製するため、マイグレーションを適用しない
+        if db in getattr(settings, 'DB_REPLICAS', []):
+            return False
+        return None
@@ -0,0 +1,13 @@
+# apps/shards/apps.py
+
+from django.apps import AppConfig
+
+
+class ShardsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.shards'
+    verbose_name = 'シャーディング'
+
+    def ready(self):
+        # シャードのマイグレーション後に、主キーの採番範囲を割り当てるハンドラを登録
+        from . import signals  # noqa: F401
@@ -0,0 +1,100 @@
+# apps/shards/routers.py
+
+'''
+ユーザー単位の水平分割（シャーディング）の配置の決定と、DBルーター（settings.DATABASE_ROUTERS に登録）。
+
+- settings.DB_SHARDED_MODELS のモデル（進捗と、その派生データである進捗サマリ・学習統計）は、
+  user_id から決まる1つのシャード（settings.DB_SHARDS の DB）に、そのユーザーの行をまとめて置く
+- 教材・レッスン・ユーザーなど全員に共通のデータは default に置く（シャード上の行から JOIN できないため、
+  シャード化した場合は呼び出し側で別のクエリとして読む）
+- settings.DB_SHARDS が空ならシャーディングは無効で、全て default を使う（このルーターは何も判断しない）
+
+配置は jump consistent hash で決めるため、DB_SHARDS の末尾にシャードを追加しても移動するユーザーは
+約 1 / シャード数 で済む（移動は manage.py rebalance_shards で行う。途中のシャードの削除・並べ替えはしないこと）。
+'''
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+
+# settings.DB_SHARDED_MODELS の既定値
+DEFAULT_SHARDED_MODELS = ('lessons.Progress', 'lessons.ProgressSummary', 'lessons.LearningStats')
+
+
+class ShardKeyError(Exception):
+    """
+    シャード化したモデルを、どのユーザーの行か（シャードキー）が分からないまま読もうとした。
+    for_user() / in_shard_of() / per_shard() などでシャードを明示すること。
+    """
+
+
+def sharding_enabled():
+    return bool(getattr(settings, 'DB_SHARDS', None))
+
+
+def sharded_models():
+    return getattr(settings, 'DB_SHARDED_MODELS', DEFAULT_SHARDED_MODELS)
+
+
+def shard_aliases():
+    # 全てのシャードの DB エイリアス（シャーディングが無効なら default だけ）
+    return list(getattr(settings, 'DB_SHARDS', None) or [DEFAULT_DB_ALIAS])
+
+
+def jump_hash(key, buckets):
+    """
+    jump consistent hash（Lamping & Veach, 2014）：整数 key を 0 〜 buckets - 1 に割り当てる。
+    buckets を 1 増やしたときに割り当てが変わる key は約 1 / (buckets + 1) だけで、変わる先は必ず新しいバケット。
+    """
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for_user(user_id):
+    shards = getattr(settings, 'DB_SHARDS', None)
+    if not shards:
+        return DEFAULT_DB_ALIAS
+    return shards[jump_hash(int(user_id), len(shards))]
+
+
+def by_shard(items, key=None):
+    """
+    items をシャードごとに振り分けた {DB エイリアス: [要素, ...]} を返す。
+    key は要素からユーザーIDを取り出す関数（省略時は要素そのものをユーザーIDとみなす）。
+    """
+    groups = {}
+    for item in items:
+        groups.setdefault(shard_for_user(key(item) if key else item), []).append(item)
+    return groups
+
+
+class ShardRouter:
+    def _shard(self, model, hints):
+        if not sharding_enabled() or model._meta.label not in sharded_models():
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if isinstance(instance, model) and not instance._state.adding:
+            # 読み込み済みの行は、読み込んだ DB（移動前の default を含む）へ書き戻す
+            # （新しい行の _state.db は関連の代入時に仮に設定されるため使わない）
+            return instance._state.db
+        # 新しい行の保存（instance.user_id）と、ユーザーからの関連の読み取り（user.progresses など）
+        user_id = instance.pk if isinstance(instance, get_user_model()) else getattr(instance, 'user_id', None)
+        return None if user_id is None else shard_for_user(user_id)
+
+    def db_for_read(self, model, **hints):
+        alias = self._shard(model, hints)
+        if alias is None and sharding_enabled() and model._meta.label in sharded_models():
+            # 黙って default を読むと、シャードにある行が見えないまま処理が進むため、明示を求める
+            raise ShardKeyError(f'{model._meta.label} はシャード化されています。読み取るシャードを指定してください。')
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # シャードキーのない書き込み先の問い合わせ（管理画面がトランザクションを開始する DB など）は、
+        # 次のルーターに任せる（実際の保存は instance のヒント付き、一括処理は using() で明示する）
+        return self._shard(model, hints)
@@ -0,0 +1,60 @@
+# apps/shards/signals.py
+
+'''
+シャードのマイグレーション後に、シャード化したモデルの主キーの採番範囲を割り当てるシグナルハンドラ。
+ShardsConfig.ready() で読み込まれることで登録される。
+
+各シャードは独立して自動採番するため、そのままでは別のシャードの行と主キーが重なる。
+N 番目のシャード（DB_SHARDS の N 番目）は N × DB_SHARD_ID_SPAN から採番するようにして、
+主キーだけで行を特定できるようにする（管理画面の編集画面・差分同期の変更履歴は主キーで行を指す）。
+シャーディング導入前から default にある行は 1 〜 DB_SHARD_ID_SPAN の範囲にある。
+'''
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from .routers import sharded_models
+
+
+def id_span():
+    # 1つのシャードに割り当てる主キーの範囲の大きさ
+    return getattr(settings, 'DB_SHARD_ID_SPAN', 10**12)
+
+
+def reserve_id_range(connection, model, start):
+    """
+    model のテーブルの自動採番を start より後から始める（既に start 以上まで採番済みなら何もしない）。
+    """
+    table = model._meta.db_table
+    column = model._meta.pk.column
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # AUTOINCREMENT の採番済みの最大値は sqlite_sequence に保存される
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, start])
+            elif row[0] < start:
+                cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [start, table])
+        elif connection.vendor == 'postgresql':
+            quote = connection.ops.quote_name
+            cursor.execute(
+                f'SELECT setval(pg_get_serial_sequence(%s, %s), GREATEST(%s, (SELECT COALESCE(MAX({quote(column)}), 0) FROM {quote(table)})))',
+                [table, column, start],
+            )
+        else:
+            raise NotImplementedError(f'{connection.vendor} のシャードの採番範囲の設定には対応していません。')
+
+
+@receiver(post_migrate)
+def shard_migrated(sender, using, apps=None, **kwargs):
+    # マイグレーションを実行したアプリのうち、シャード化したモデルの採番範囲を設定する（何度実行しても同じ結果になる）
+    shards = getattr(settings, 'DB_SHARDS', [])
+    if using not in shards:
+        return
+    start = (shards.index(using) + 1) * id_span()
+    for model in sender.get_models():
+        if model._meta.label in sharded_models():
+            reserve_id_range(connections[using], model, start)
@@ -0,0 +1,75 @@
+# apps/shards/tests/test_routers.py
+
+'''
+シャードの配置（jump_hash / shard_for_user / by_shard）とルーターの振り分けを確認する。
+DB への接続は行わない（ルーターの判断だけを確認する）。
+'''
+
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+
+from apps.lessons.models import Material, Progress
+from apps.shards.routers import ShardKeyError, ShardRouter, by_shard, jump_hash, shard_aliases, shard_for_user
+
+SHARDS = ['default', 'shard1', 'shard2']
+
+
+class JumpHashTests(SimpleTestCase):
+    def test_range_and_balance(self):
+        counts = Counter(jump_hash(key, 4) for key in range(10_000))
+        self.assertEqual(set(counts), {0, 1, 2, 3})
+        self.assertLess(max(counts.values()) - min(counts.values()), 500)
+
+    def test_adding_bucket_moves_keys_only_to_new_bucket(self):
+        moved = 0
+        for key in range(10_000):
+            before, after = jump_hash(key, 3), jump_hash(key, 4)
+            if before != after:
+                self.assertEqual(after, 3)
+                moved += 1
+        # 移動するのは約 1 / 4
+        self.assertAlmostEqual(moved / 10_000, 0.25, delta=0.03)
+
+
+class ShardPlacementTests(SimpleTestCase):
+    def test_disabled(self):
+        self.assertEqual(shard_aliases(), ['default'])
+        self.assertEqual(shard_for_user(42), 'default')
+        self.assertEqual(by_shard([1, 2, 3]), {'default': [1, 2, 3]})
+
+    @override_settings(DB_SHARDS=SHARDS)
+    def test_by_shard_groups_by_user(self):
+        groups = by_shard([{'user_id': user_id} for user_id in range(30)], key=lambda item: item['user_id'])
+        self.assertEqual(sum(len(items) for items in groups.values()), 30)
+        for alias, items in groups.items():
+            self.assertIn(alias, SHARDS)
+            self.assertTrue(all(shard_for_user(item['user_id']) == alias for item in items))
+
+
+@override_settings(DB_SHARDS=SHARDS)
+class ShardRouterTests(SimpleTestCase):
+    router = ShardRouter()
+
+    def test_new_row_goes_to_users_shard(self):
+        progress = Progress(user_id=7, lesson_id=1, status='done')
+        self.assertEqual(self.router.db_for_write(Progress, instance=progress), shard_for_user(7))
+
+    def test_related_reads_use_users_shard(self):
+        user = get_user_model()(pk=7)
+        self.assertEqual(self.router.db_for_read(Progress, instance=user), shard_for_user(7))
+
+    def test_loaded_row_is_written_back_where_it_was_read(self):
+        progress = Progress(pk=1, user_id=7, lesson_id=1, status='done')
+        progress._state.adding = False
+        progress._state.db = 'default'
+        self.assertEqual(self.router.db_for_write(Progress, instance=progress), 'default')
+
+    def test_read_without_shard_key_fails(self):
+        with self.assertRaises(ShardKeyError):
+            self.router.db_for_read(Progress)
+
+    def test_unsharded_models_are_left_to_next_router(self):
+        self.assertIsNone(self.router.db_for_read(Material))
+        self.assertIsNone(self.router.db_for_write(Progress))
@@ -47,9 +47,18 @@ INSTALLED_APPS = [
 
     # 変更後（AppConfig 経由で verbose_name を有効化）
     'apps.lessons.apps.LessonsConfig',
+    'apps.profiling.apps.ProfilingConfig',
+    'apps.replicas.apps.ReplicasConfig',
+    'apps.shards.apps.ShardsConfig',
+    'apps.jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    # リクエスト単位のパフォーマンス計測（PROFILING_ENABLED が False なら自動的に外れる）
+    # 他のミドルウェアの処理時間も含めて計測するため先頭に置く
+    'apps.profiling.middleware.ProfilingMiddleware',
+    # 読み取りのレプリカへの振り分けと、書き込み直後の primary への固定（DB_REPLICAS がなければ自動的に外れる）
+    'apps.replicas.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,13 +90,136 @@ WSGI_APPLICATION = 'learning_task_tracker.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# 環境変数 DJANGO_DB_PROFILE で切り替え
+#   'development'：SQLite の既定設定（既定。リクエストごとに接続し直す）
+#   'production' ：SQLite を複数ワーカー（gunicorn 等）からの同時書き込み向けに調整し、接続を使い回す
+#   'postgresql' ：PostgreSQL（接続先は DJANGO_DB_NAME / DJANGO_DB_USER / DJANGO_DB_PASSWORD / DJANGO_DB_HOST / DJANGO_DB_PORT）
+
+DB_PROFILE = os.environ.get('DJANGO_DB_PROFILE', 'development')
+# 接続を使い回す秒数（production / postgresql。0 でリクエストごとに接続し直す）
+DB_CONN_MAX_AGE = int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', '600'))
+
+# production の SQLite の接続オプション（init_command の PRAGMA は接続ごとに実行される）
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode = WAL;'             # 読み取りが書き込みを待たない（書き込みは同時に1つ）
+        'PRAGMA synchronous = NORMAL;'           # WAL ではコミットごとの fsync を省いても壊れない（電源断時は直近のコミットが失われうる）
+        'PRAGMA mmap_size = 268435456;'          # 256MB までメモリマップで読む（読み取り時のコピーを省く）
+        'PRAGMA cache_size = -65536;'            # 接続ごとのページキャッシュ 64MB（負の値は KiB 単位）
+        'PRAGMA temp_store = MEMORY;'            # 並べ替え等の一時データをメモリに置く
+        'PRAGMA journal_size_limit = 67108864;'  # チェックポイント後に WAL ファイルを 64MB まで切り詰める
+    ),
+    # 他の接続が書き込み中の場合は最大20秒待つ（busy timeout）
+    'timeout': 20,
+    # トランザクションの開始時に書き込みロックを取る（既定の DEFERRED では、読み取りから書き込みへ移る時点で
+    # 他の書き込みと競合すると busy timeout を待たずに "database is locked" になる）
+    'transaction_mode': 'IMMEDIATE',
+}
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+if DB_PROFILE == 'production':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': SQLITE_PRODUCTION_OPTIONS,
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+elif DB_PROFILE == 'postgresql':
+    # 接続プールは DJANGO_DB_POOL で選択
+    #   'app'   ：psycopg のプロセス内プール（既定。psycopg[pool] が必要）
+    #   'server'：pgbouncer 等のサーバー側プール（transaction モード）経由で接続する
+    #   'none'  ：プールなし（CONN_MAX_AGE による持続的接続のみ）
+    DB_POOL = os.environ.get('DJANGO_DB_POOL', 'app')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DJANGO_DB_NAME', 'learning_task_tracker'),
+            'USER': os.environ.get('DJANGO_DB_USER', ''),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DJANGO_DB_HOST', ''),
+            'PORT': os.environ.get('DJANGO_DB_PORT', ''),
+            'OPTIONS': {},
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if DB_POOL == 'app':
+        # プールが接続を保持するため、持続的接続（CONN_MAX_AGE）は使わない（併用はエラーになる）
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DJANGO_DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DJANGO_DB_POOL_MAX_SIZE', '10')),
+            'timeout': 10,  # 空き接続を待つ秒数
+        }
+    elif DB_POOL == 'server':
+        # transaction モードではトランザクションごとにサーバー側の接続が変わるため、
+        # トランザクションをまたいで使うサーバー側カーソル（QuerySet.iterator()）を無効にする
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+
+# 読み取り専用レプリカ（apps.replicas.routers.ReplicaRouter が教材・レッスン等の読み取りを振り分ける）
+# 環境変数 DJANGO_DB_REPLICAS にカンマ区切りで指定（SQLite はファイルパス、PostgreSQL はホスト名。他の接続設定は default と同じ）
+# ローカルでは SQLite のファイルを python manage.py sync_replicas で primary から複製して試せる
+DB_REPLICAS = []
+for _index, _location in enumerate(filter(None, os.environ.get('DJANGO_DB_REPLICAS', '').split(',')), start=1):
+    _replica = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+        'TEST': {'MIRROR': 'default'},  # テストでは default と同じDBを読む
+    }
+    _replica['NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'HOST'] = _location.strip()
+    DATABASES[f'replica{_index}'] = _replica
+    DB_REPLICAS.append(f'replica{_index}')
+
+# 進捗のシャード（apps.shards.routers.ShardRouter がユーザーごとに振り分ける。既定は無効で全て default）
+# 環境変数 DJANGO_DB_SHARDS にカンマ区切りで指定（SQLite はファイルパス、PostgreSQL はホスト名。他の接続設定は default と同じ）
+# 各シャードは python manage.py migrate --database shard1 で作成し、既存の進捗は python manage.py rebalance_shards で移す
+# シャードを増やす場合は末尾に追加すること（途中の削除・並べ替えは配置が大きく変わる）
+DB_SHARDS = []
+for _index, _location in enumerate(filter(None, os.environ.get('DJANGO_DB_SHARDS', '').split(',')), start=1):
+    _shard = {**DATABASES['default'], 'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {}))}
+    _shard['NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'HOST'] = _location.strip()
+    DATABASES[f'shard{_index}'] = _shard
+    DB_SHARDS.append(f'shard{_index}')
+
+DATABASE_ROUTERS = ['apps.shards.routers.ShardRouter', 'apps.replicas.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 環境変数 DJANGO_CACHE_BACKEND で切り替え（'locmem'：プロセス内メモリ（既定）/ 'file'：ファイル / 'redis'：Redis互換サーバー）
+
+CACHE_BACKEND = os.environ.get('DJANGO_CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', str(BASE_DIR / '.cache')),
+        }
+    }
+elif CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'redis://127.0.0.1:6379/0'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 
 # Password validation
@@ -151,3 +283,107 @@ AUTH_METHOD = 'email'  # デフォルトでメールアドレス認証を使用
 AUTHENTICATION_BACKENDS = [
     'apps.accounts.backends.FlexibleAuthBackend',
 ]
+
+# ログイン試行回数の制限（apps/accounts/throttling.py）
+# 直近 WINDOW 秒間の試行回数が、ログインIDごと・接続元IPごとの上限を超えるとパスワード検証前に拒否する
+LOGIN_THROTTLE_ENABLED = True
+LOGIN_THROTTLE_WINDOW = 5 * 60
+LOGIN_THROTTLE_IDENTIFIER_LIMIT = 5
+LOGIN_THROTTLE_IP_LIMIT = 30
+# 試行記録の保存先（複数プロセスで共有する場合は 'apps.accounts.throttling.CacheThrottleStore'）
+LOGIN_THROTTLE_STORE = 'apps.accounts.throttling.MemoryThrottleStore'
+LOGIN_THROTTLE_CACHE_ALIAS = 'default'
+
+# 教材一覧ページの1ページあたりの表示件数（?size= で上書き可能、上限は MAX）
+MATERIAL_LIST_PAGE_SIZE = 20
+MATERIAL_LIST_MAX_PAGE_SIZE = 100
+
+# 学習履歴ダウンロード時に DB から一度に読み出す件数（サーバー側カーソルのチャンクサイズ）
+PROGRESS_EXPORT_CHUNK_SIZE = 2000
+
+# 教材詳細・レッスン詳細ページの共通部分のキャッシュ設定
+# 使用するキャッシュ（CACHES のエイリアス）と有効期限（秒）。内容の更新時はバージョン番号で即時無効化される
+LESSONS_CACHE_ALIAS = 'default'
+LESSONS_CACHE_TIMEOUT = 60 * 60
+
+# ホーム画面（ダッシュボード）に表示する「最近の記録」の件数
+LEARNING_STATS_RECENT_LIMIT = 10
+
+# リクエスト単位のパフォーマンス計測（apps.profiling）
+# 環境変数 DJANGO_PROFILING=1 で有効化。結果は管理者専用の /profiling/ で確認できる
+PROFILING_ENABLED = os.environ.get('DJANGO_PROFILING') == '1'
+# ビューごとに保持する直近のリクエスト数
+PROFILING_WINDOW = 1000
+# cProfile の出力先（None なら cProfile は使わない）と、保存対象とする応答時間のしきい値（ミリ秒）
+PROFILING_CPROFILE_DIR = os.environ.get('DJANGO_PROFILING_CPROFILE_DIR') or None
+PROFILING_SLOW_MS = 500
+
+# 閲覧系ビュー（ホーム・教材一覧・教材詳細・レッスン詳細）を非同期版（apps/lessons/async_views.py）にする
+# ASGI（uvicorn 等）で動かす場合に有効化する。環境変数 DJANGO_ASYNC_VIEWS=1 でも切り替え可能
+LESSONS_ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS') == '1'
+
+# JSON API（/api/）の一覧の1ページあたりの件数（?size= で上書き可能、上限は MAX）と、進捗の一括登録の上限件数
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+API_PROGRESS_BATCH_LIMIT = 500
+
+# 差分同期（/api/sync/）で1回に返す変更履歴の件数（?limit= で上書き可能、上限は MAX）と、履歴の保存日数
+# 保存日数を過ぎた履歴は prune_changelog コマンドで削除する（それより古い token のクライアントは全件を取得し直す）
+SYNC_PAGE_SIZE = 1000
+SYNC_MAX_PAGE_SIZE = 5000
+CHANGELOG_RETENTION_DAYS = 30
+
+# レッスンの表示順序の間隔（新規追加時は末尾 + 間隔。並べ替えでは前後の中間の値を使い、空きがなくなれば振り直す）
+LESSON_ORDER_GAP = 1024
+
+# 教材・レッスンの検索結果の1ページあたりの件数と、ページ送りの上限（関連度順のため深いページは読み飛ばしが重くなる）
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGES = 50
+# 表示用に結合する候補の上限（SQLite）。関連度の高い順にこの件数までを候補とする（0 で無制限）
+SEARCH_RANK_CANDIDATES = 5000
+
+# 管理画面の一覧で正確に数える件数の上限（超える場合、絞り込みなしはテーブルの推定行数、絞り込みありは「上限 + 1 件」と表示する）
+ADMIN_EXACT_COUNT_LIMIT = 10_000
+
+# 管理画面の一括操作（進捗のステータス変更・付け替え、教材の複製）で1トランザクションに書き込む件数
+ADMIN_BULK_CHUNK_SIZE = 5000
+# 管理画面の一括操作で「すべて選択」できる件数の上限（絞り込みなしの場合にテーブルの推定行数で判定する。絞り込んでから実行してもらう）
+ADMIN_BULK_SELECT_ACROSS_LIMIT = 1_000_000
+
+# レッスンの登録画面の教材選択欄で、1回に読み込む候補の件数
+MATERIAL_PICKER_PAGE_SIZE = 20
+
+# レプリカから読むモデル（全員に共通のデータと、他のユーザーの情報。ログインユーザー自身の進捗などは常に primary）
+DB_REPLICA_MODELS = ['lessons.Material', 'lessons.Lesson', 'lessons.SearchEntry', 'accounts.CustomUser']
+# 書き込んだブラウザの読み取りを primary に固定する秒数（レプリカへの反映の遅れより長くする）と、その Cookie 名
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'db_pin'
+
+# シャードに分割するモデル（user 列でユーザーごとに配置する。教材・レッスン・ユーザーは default に置く）
+DB_SHARDED_MODELS = ['lessons.Progress', 'lessons.ProgressSummary', 'lessons.LearningStats']
+# シャードごとの主キーの採番範囲の大きさ（N 番目のシャードは N × この値から採番し、シャード間で主キーが重ならない）
+DB_SHARD_ID_SPAN = 10**12
+
+# バックグラウンドジョブ（apps.jobs）のワーカー（manage.py run_worker）の既定の同時実行数と、待機中のジョブを確認する間隔（秒）
+JOB_WORKER_CONCURRENCY = int(os.environ.get('DJANGO_JOB_WORKER_CONCURRENCY', '2'))
+JOB_POLL_INTERVAL = 1.0
+# 失敗したジョブの最大試行回数と、再実行までの待ち時間（JOB_RETRY_BACKOFF 秒から試行ごとに2倍、JOB_RETRY_BACKOFF_MAX 秒まで）
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF = 10
+JOB_RETRY_BACKOFF_MAX = 3600
+# この秒数以上ワーカーから応答のない実行中のジョブは、ワーカーが異常終了したものとして再実行する
+JOB_LOCK_TIMEOUT = 600
+# 実行中のジョブの応答（locked_at）を記録する間隔（秒）。JOB_LOCK_TIMEOUT より十分に短くすること
+JOB_HEARTBEAT_INTERVAL = 60
+# ジョブが作成したファイル（エクスポートなど）の保存先と、終了したジョブを残す日数（prune_jobs で削除）
+JOB_RESULT_DIR = BASE_DIR / 'job_results'
+JOB_RETENTION_DAYS = 7
+# 状態ページに表示するジョブの件数と、実行中のジョブの詳細画面を自動で更新する間隔（秒）
+JOB_LIST_LIMIT = 50
+JOB_STATUS_REFRESH_SECONDS = 3
+# ワーカーを起動せずに、登録したジョブをその場（リクエストの中）で実行する（ワーカーを起動しない開発環境用）
+JOBS_RUN_INLINE = os.environ.get('DJANGO_JOBS_INLINE', '0') == '1'
+# 差分同期（/api/sync/）で返す変更番号を、この秒数より前に記録した変更履歴までにする
+# （採番の後にコミットされる履歴を通り過ぎないように。履歴は変更のコミット後に短いトランザクションで登録するため、
+#   一括登録などの書き込みのトランザクションの長さには依存しない）
+CHANGELOG_SYNC_DELAY = 10
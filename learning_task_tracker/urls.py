@@ -14,5 +14,8 @@ urlpatterns = [
     # 管理サイト（/admin/）
     path('admin/', admin.site.urls),
     path('accounts/', include('apps.accounts.urls')),
+    path('api/', include('apps.lessons.api_urls')),  # クライアントアプリ向けの JSON API
+    path('profiling/', include('apps.profiling.urls')),  # パフォーマンス計測結果（管理者のみ）
+    path('jobs/', include('apps.jobs.urls')),  # バックグラウンドジョブの状態
     path('', include('apps.lessons.urls', namespace='lessons')),  # ルートは lessons が担当
 ]